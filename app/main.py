@@ -1,38 +1,118 @@
+import asyncio
+import io
+from contextlib import asynccontextmanager
 import logging
 import time
 import sys
 from pathlib import Path
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Header, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, UploadFile, File, HTTPException, Header, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 import uuid
 import os
-from starlette.concurrency import run_in_threadpool
 import json
+from datetime import datetime
 
 from src.ws_manager import manager
 from app.services.s3_service import upload_image_to_s3
+from app.services.render_service import render_and_store_preview, shutdown_render_pool
+from app.services.pipeline_workers import (
+    run_full_pipeline, run_wireframe_regen,
+    start_pipeline_pool, shutdown_pipeline_pool,
+)
+from app.services.scheduler import scheduler, SchedulerFull, PRIORITY_CLASSES
+from app.services import dedup, health
+from app.services.dedup import content_hash, KeyReused, IDEMPOTENCY_TTL_HOURS, IDEMPOTENCY_KEY_MAX_LENGTH
 from app.services.database import (
     create_evaluation_document, complete_evaluation,
-    fail_evaluation, save_hitl_response,
+    fail_evaluation, cancel_evaluation, save_hitl_response,
+    find_by_idempotency_key, DuplicateSubmission, ensure_indexes,
+    save_checkpoint, get_checkpoints, restart_evaluation,
     update_wireframe, get_evaluation,
     get_user_evaluations, get_evaluations_for_analysis,
+    iter_evaluations_for_analysis, decode_cursor,
+    get_hitl_metrics, HITL_ACTIONS,
 )
-
-logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+from app.services.export_service import stream_ndjson, stream_csv
+from app.services.metrics_service import observe_run, render_latest
+from src.utils.stage_metrics import start_run, stage
+from src.utils import cancellation, checkpoint
+from src.utils.checkpoint import first_missing
+from src.utils.cancellation import EvaluationCancelled, CANCEL_ON_DISCONNECT, CANCEL_GRACE_SECONDS
+from src.utils.tracing import setup_tracing, shutdown_tracing, server_span, bind_evaluation
+from src.utils.log_config import configure_logging, stop_logging
+
+configure_logging()
 logger = logging.getLogger(__name__)
 
 ROOT_DIR = Path(__file__).resolve().parent.parent
 SRC_DIR  = ROOT_DIR / "src"
 sys.path.append(str(SRC_DIR))
 
-from ux_feedback_crew.crew_pipeline import run_full_ux_pipeline_raw, run_wireframe_regen_raw
+# Index creation retries with backoff up to this interval until it succeeds
+INDEX_RETRY_MAX_SECONDS = float(os.getenv("INDEX_RETRY_MAX_SECONDS", "300"))
+
+
+async def _ensure_indexes():
+    # Deferred from database import; a Mongo outage here must not keep the API from starting.
+    # Until it succeeds /readyz reports it (the Idempotency-Key dedup relies on a unique index)
+    delay = 5.0
+    while True:
+        try:
+            await run_in_threadpool(ensure_indexes)
+            health.set_indexes(None)
+            logger.info("[DB] Indexes ensured")
+            return
+        except Exception as e:
+            health.set_indexes(f"{type(e).__name__}: {e}")
+            logger.error("[DB] Ensuring indexes failed, retrying in %.0fs: %s", delay, e)
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, INDEX_RETRY_MAX_SECONDS)
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    start_pipeline_pool()
+    indexes = asyncio.create_task(_ensure_indexes())
+    # Binds the loop crew threads schedule sends on, and subscribes to the progress bus
+    manager.on_control("cancel", lambda event: cancellation.cancel(event["evaluation_id"], event["reason"]))
+    manager.on_control("cancel_client", lambda event: cancellation.cancel_client(event["client_id"], event["reason"]))
+    manager.on_client_connected(_stop_disconnect_timer)
+    await manager.start()
+    try:
+        yield
+    finally:
+        indexes.cancel()
+        await manager.stop()
+        shutdown_pipeline_pool()
+        shutdown_render_pool()
+        shutdown_tracing()
+        stop_logging()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True,
                    allow_methods=["*"], allow_headers=["*"])
 os.makedirs("outputs", exist_ok=True)
 OUTPUT_DIR = Path("data/outputs")
+setup_tracing()
+checkpoint.set_sink(save_checkpoint)
+
+
+@app.middleware("http")
+async def _trace_requests(request: Request, call_next):
+    with server_span(request.method, request.url.path, request.headers) as current:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        if route is not None:
+            # Low-cardinality name: the route template, not the concrete path
+            current.update_name(f"{request.method} {route.path}")
+            current.set_attribute("http.route", route.path)
+        current.set_attribute("http.response.status_code", response.status_code)
+        return response
+
 
 def _load_feedback_json(evaluation_id: str) -> dict | None:
     """
@@ -40,15 +120,61 @@ def _load_feedback_json(evaluation_id: str) -> dict | None:
     """
     json_path = OUTPUT_DIR / f"feedback_{evaluation_id}.json"
     if not json_path.exists():
-        logger.warning(f"[FEEDBACK JSON] File not found: {json_path}")
+        logger.warning("[FEEDBACK JSON] File not found: %s", json_path)
         return None
 
     try:
         with open(json_path, "r", encoding="utf-8") as f:
             return json.load(f)
     except Exception as e:
-        logger.error(f"[FEEDBACK JSON] Failed to read {json_path}: {e}")
+        logger.error("[FEEDBACK JSON] Failed to read %s: %s", json_path, e)
+        return None
+
+
+# Preview renders run detached from the request: a shielded run outlives the request that
+# started it, and its BackgroundTasks would never run after a timeout or disconnect
+_preview_tasks: set[asyncio.Task] = set()
+
+
+def _schedule_preview(evaluation_id: str, html: str):
+    task = asyncio.create_task(render_and_store_preview(evaluation_id, html))
+    _preview_tasks.add(task)
+    task.add_done_callback(_preview_tasks.discard)
+
+
+# client_id → its pending disconnect timer; a reconnect to any worker stops it
+_disconnect_timers: dict[str, asyncio.Task] = {}
+
+
+async def _cancel_if_gone(client_id: str):
+    """Cancels the client's runs if no worker holds a socket of it after the grace period."""
+    await asyncio.sleep(CANCEL_GRACE_SECONDS)
+    if not manager.is_connected(client_id):
+        # Published: the runs may belong to another worker
+        await manager.publish_control("cancel_client", client_id=client_id, reason="client disconnected")
+
+
+def _stop_disconnect_timer(client_id: str):
+    timer = _disconnect_timers.pop(client_id, None)
+    if timer is not None:
+        timer.cancel()
+
+
+def _start_disconnect_timer(client_id: str):
+    # One timer per client: the grace period counts from the latest disconnect
+    _stop_disconnect_timer(client_id)
+    timer = asyncio.create_task(_cancel_if_gone(client_id))
+    _disconnect_timers[client_id] = timer
+    timer.add_done_callback(
+        lambda done: _disconnect_timers.pop(client_id, None) if _disconnect_timers.get(client_id) is done else None
+    )
+
+
+def _parse_sections(sections: str | None) -> list | None:
+    """Comma-separated ai_results sections query param → list."""
+    if not sections:
         return None
+    return [s.strip() for s in sections.split(",") if s.strip()]
 
 
 # Models
@@ -70,24 +196,124 @@ class WireframeRegenRequest(BaseModel):
 
 @app.post("/analyze-and-wireframe-s3/{client_id}")
 async def analyze_and_wireframe_s3(
-    background_tasks: BackgroundTasks,
+    response: Response,
     file: UploadFile = File(...),
     client_id: str = "",
     x_user_id: str = Header(default="anonymous"),
+    x_priority: str = Header(default="interactive"),
+    idempotency_key: str | None = Header(default=None),
 ):
+    """
+    X-Priority: interactive (default) | batch — batch runs only get the capacity left by interactive ones.
+    Idempotency-Key: retries with the same key get the same evaluation instead of a new run;
+    resubmitting the same image while it is running attaches to that run (app.services.dedup).
+    """
+    if x_priority not in PRIORITY_CLASSES:
+        raise HTTPException(status_code=400, detail=f"X-Priority must be: {' | '.join(PRIORITY_CLASSES)}")
+    if idempotency_key is not None and not 0 < len(idempotency_key) <= IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1-{IDEMPOTENCY_KEY_MAX_LENGTH} characters")
+
+    data = await file.read()
+    digest = content_hash(data)
+    try:
+        job = dedup.find(x_user_id, idempotency_key, digest)
+    except KeyReused as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if job is None and idempotency_key:
+        doc = find_by_idempotency_key(x_user_id, idempotency_key, IDEMPOTENCY_TTL_HOURS)
+        if doc is not None:
+            return _replay_evaluation(doc, digest, response)
+
+    if job is not None:
+        response.headers["Idempotent-Replayed"] = "true"
+        logger.info("[DEDUP] Submission of %s attached to its running evaluation", x_user_id)
+    else:
+        # The run owns a copy of the upload: FastAPI closes `file` when this request ends
+        upload = UploadFile(io.BytesIO(data), filename=file.filename, headers=file.headers)
+        job = dedup.start(x_user_id, idempotency_key, digest, _run_analysis(
+            upload, client_id, x_user_id, x_priority, idempotency_key, digest,
+        ))
+    return await asyncio.shield(job)
+
+
+def _replay_evaluation(doc: dict, digest: str, response: Response) -> dict:
+    """Response of a stored evaluation for a retried Idempotency-Key."""
+    stored_hash = doc["input"].get("content_hash")
+    if stored_hash and stored_hash != digest:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different image")
+    if doc["status"] not in ("completed", "regenerated"):
+        # Running on another API worker; follow it over the websocket or GET /evaluation/{id}
+        raise HTTPException(status_code=409, detail={
+            "message": "Evaluation with this Idempotency-Key is still processing",
+            "evaluation_id": doc["evaluation_id"],
+        })
+
+    response.headers["Idempotent-Replayed"] = "true"
+    ai = doc.get("ai_results") or {}
+    feedback = ai.get("feedback_report") or {}
+    return {
+        "evaluation_id": doc["evaluation_id"],
+        "image_url": doc["input"].get("screenshot_url"),
+        "feedback": feedback.get("markdown") or feedback.get("raw_text", ""),
+        "feedback_json": _load_feedback_json(doc["evaluation_id"]),
+        "wireframe": (ai.get("improved_design") or {}).get("html_code", ""),
+    }
+
+
+async def _run_analysis(
+    file: UploadFile,
+    client_id: str,
+    x_user_id: str,
+    x_priority: str,
+    idempotency_key: str | None,
+    digest: str,
+) -> dict:
     job_id = str(uuid.uuid4())
+
+    async def prepare() -> str:
+        await manager.send_progress(client_id, "Uploading image to S3...", 5, evaluation_id=job_id)
+        with stage("upload"):
+            image_url = await upload_image_to_s3(file)
+        with stage("db"):
+            create_evaluation_document(evaluation_id=job_id, user_id=x_user_id, screenshot_url=image_url,
+                                       idempotency_key=idempotency_key, content_hash=digest)
+        return image_url
+
+    logger.info("[JOB START] %s | user: %s", job_id, x_user_id)
+    return await _evaluate(job_id, client_id, x_user_id, x_priority, prepare)
+
+
+async def _evaluate(
+    job_id: str,
+    client_id: str,
+    x_user_id: str,
+    x_priority: str,
+    prepare,
+    restored: dict | None = None,
+) -> dict:
+    """
+    Runs evaluation `job_id` through the pipeline and stores the outcome.
+    `prepare()` readies the evaluation document and returns the screenshot URL;
+    `restored` holds the checkpoints of an earlier attempt being resumed.
+    """
     pipeline_start = time.time()
+    metrics = start_run(job_id)
+    bind_evaluation(job_id)
+    cancel_token = cancellation.register(job_id, client_id)
     try:
-        logger.info(f"[JOB START] {job_id} | user: {x_user_id}")
-        await manager.send_progress(client_id, "Uploading image to S3...", 5)
-        image_url = await upload_image_to_s3(file)
-        create_evaluation_document(evaluation_id=job_id, user_id=x_user_id, screenshot_url=image_url)
-        await manager.send_progress(client_id, "Initializing Agents...", 10)
-        result = await run_in_threadpool(run_full_ux_pipeline_raw, image_url, client_id, job_id)
+        image_url = await prepare()
+        await manager.send_progress(client_id, "Initializing Agents...", 10, evaluation_id=job_id)
+        async with scheduler.slot(x_user_id, x_priority, cancel_token):
+            result = await run_full_pipeline(image_url, client_id, job_id, restored)
         duration = time.time() - pipeline_start
-        logger.info(f"[PIPELINE] Completed in {duration:.2f}s")
-        complete_evaluation(evaluation_id=job_id, tasks_output=result.tasks_output, pipeline_duration_seconds=duration)
-        await manager.send_progress(client_id, "Pipeline Complete", 100)
+        logger.info("[PIPELINE] Completed in %.2fs", duration)
+        # The stored breakdown can't include its own write; Prometheus gets the full db time
+        with stage("db"):
+            complete_evaluation(evaluation_id=job_id, tasks_output=result.tasks_output,
+                                pipeline_duration_seconds=duration, metrics=metrics.to_dict())
+        observe_run(metrics.to_dict(), duration)
+        _schedule_preview(job_id, str(result.tasks_output[3].raw))
+        await manager.send_progress(client_id, "Pipeline Complete", 100, evaluation_id=job_id, status="completed")
 
         # tasks_output[2].raw is the markdown string returned directly by generate_feedback
         feedback_md = str(result.tasks_output[2].raw)
@@ -100,12 +326,85 @@ async def analyze_and_wireframe_s3(
             "feedback_json": feedback_json,   
             "wireframe": str(result.tasks_output[3].raw),
         }
-    
+
+    except EvaluationCancelled:
+        cancel_evaluation(job_id, cancel_token.reason, metrics=metrics.to_dict())
+        observe_run(metrics.to_dict(), time.time() - pipeline_start, status="cancelled")
+        logger.info("[CANCELLED] %s: %s", job_id, cancel_token.reason)
+        await manager.send_progress(client_id, "Pipeline Cancelled", 100, evaluation_id=job_id, status="cancelled")
+        raise HTTPException(status_code=409, detail=f"Evaluation cancelled ({cancel_token.reason})")
+
+    except DuplicateSubmission:
+        # Another API worker took the key between our lookup and insert
+        raise HTTPException(status_code=409, detail="Evaluation with this Idempotency-Key is still processing")
+
+    except SchedulerFull as e:
+        fail_evaluation(job_id, f"Rejected: {e}", metrics=metrics.to_dict())
+        observe_run(metrics.to_dict(), time.time() - pipeline_start, status="rejected")
+        logger.warning("[SCHEDULER] Rejected %s: %s", job_id, e)
+        await manager.send_progress(client_id, "Server busy, try again later", 100, evaluation_id=job_id,
+                                    status="failed")
+        raise HTTPException(status_code=429, detail="Too many evaluations waiting, try again later")
+
     except Exception as e:
-        fail_evaluation(job_id, str(e))
-        logger.error(f"[ERROR] {job_id}: {e}")
+        fail_evaluation(job_id, str(e), metrics=metrics.to_dict())
+        observe_run(metrics.to_dict(), time.time() - pipeline_start, status="failed")
+        logger.error("[ERROR] %s: %s", job_id, e)
+        await manager.send_progress(client_id, "Pipeline Failed", 100, evaluation_id=job_id, status="failed")
         raise HTTPException(status_code=500, detail=str(e))
 
+    finally:
+        cancellation.release(job_id)
+
+
+@app.post("/evaluations/{evaluation_id}/resume/{client_id}")
+async def resume_evaluation(
+    evaluation_id: str,
+    client_id: str,
+    x_user_id: str = Header(default="anonymous"),
+    x_priority: str = Header(default="interactive"),
+):
+    """
+    Reruns a failed or cancelled evaluation from its first stage without a
+    checkpoint. Stages that completed before are restored, not rerun.
+    Responds like /analyze-and-wireframe-s3.
+    """
+    if x_priority not in PRIORITY_CLASSES:
+        raise HTTPException(status_code=400, detail=f"X-Priority must be: {' | '.join(PRIORITY_CLASSES)}")
+    doc = get_evaluation(evaluation_id, view="summary")
+    if not doc:
+        raise HTTPException(status_code=404, detail="Evaluation not found")
+    if not restart_evaluation(evaluation_id):
+        raise HTTPException(status_code=409, detail=f"Evaluation is {doc.get('status')}, only failed or cancelled ones resume")
+
+    restored = get_checkpoints(evaluation_id)
+    image_url = doc["input"]["screenshot_url"]
+    logger.info("[RESUME] %s from stage %s (%d restored)",
+                evaluation_id, first_missing(restored) or "none", len(restored))
+
+    async def prepare() -> str:
+        return image_url
+
+    return await _evaluate(evaluation_id, client_id, x_user_id, x_priority, prepare, restored)
+
+
+@app.post("/evaluations/{evaluation_id}/cancel", status_code=202)
+async def cancel_running_evaluation(evaluation_id: str, x_user_id: str = Header()):
+    """
+    Stops a processing evaluation before its next stage; the model call in
+    flight finishes. The run ends with status `cancelled`. Only the user who
+    started it (X-User-Id) may cancel it.
+    """
+    doc = get_evaluation(evaluation_id, view="summary")
+    if not doc:
+        raise HTTPException(status_code=404, detail="Evaluation not found")
+    if doc.get("user_id") != x_user_id:
+        raise HTTPException(status_code=403, detail="Evaluation belongs to another user")
+    if doc.get("status") != "processing":
+        raise HTTPException(status_code=409, detail=f"Evaluation is {doc.get('status')}")
+    await manager.publish_control("cancel", evaluation_id=evaluation_id, reason="requested")
+    return {"evaluation_id": evaluation_id, "status": "cancelling"}
+
 
 # Wireframe Regeneration 
 
@@ -123,11 +422,14 @@ async def regenerate_wireframe(
     Uses cached vision + heuristic + original feedback from MongoDB.
     Passes user's comments on both agents as context for improvement.
     """
-    doc = get_evaluation(evaluation_id)
+    doc = get_evaluation(
+        evaluation_id,
+        sections=["vision_analysis", "heuristic_evaluation", "feedback_report"],
+    )
     if not doc:
         raise HTTPException(status_code=404, detail="Evaluation not found")
 
-    ai = doc.get("ai_results", {})
+    ai = doc.get("ai_results") or {}
     vision_analysis      = ai.get("vision_analysis", "")
     heuristic_evaluation = ai.get("heuristic_evaluation", {}).get("raw_text", "")
     original_feedback = ai.get("feedback_report", {}).get("markdown", "") \
@@ -137,39 +439,54 @@ async def regenerate_wireframe(
     if not vision_analysis:
         raise HTTPException(status_code=400, detail="Vision analysis missing from evaluation")
 
-    logger.info(f"[REGEN] Starting wireframe regen for {evaluation_id}")
-    await manager.send_progress(client_id, "Regenerating wireframe...", 10)
+    logger.info("[REGEN] Starting wireframe regen for %s", evaluation_id)
+    await manager.send_progress(client_id, "Regenerating wireframe...", 10, evaluation_id=evaluation_id)
+    regen_start = time.time()
+    metrics = start_run(evaluation_id)
+    bind_evaluation(evaluation_id)
 
     try:
-        result = await run_in_threadpool(
-            run_wireframe_regen_raw,
-            client_id,
-            evaluation_id,
-            vision_analysis,
-            heuristic_evaluation,
-            original_feedback,
-            body.feedback_user_comment,
-            body.wireframe_user_comment,
-        )
+        async with scheduler.slot(x_user_id, "interactive"):
+            result = await run_wireframe_regen(
+                client_id,
+                evaluation_id,
+                image_url,
+                vision_analysis,
+                heuristic_evaluation,
+                original_feedback,
+                body.feedback_user_comment,
+                body.wireframe_user_comment,
+            )
 
         new_wireframe = str(result.tasks_output[0].raw)
 
         # Update wireframe in MongoDB
-        update_wireframe(
-            evaluation_id=evaluation_id,
-            new_wireframe=new_wireframe,
-            feedback_comment=body.feedback_user_comment,
-            wireframe_comment=body.wireframe_user_comment,
-            regenerated_by=x_user_id,
-        )
-
-        await manager.send_progress(client_id, "Wireframe Regenerated", 100)
-        logger.info(f"[REGEN] Done for {evaluation_id}")
+        with stage("db"):
+            update_wireframe(
+                evaluation_id=evaluation_id,
+                new_wireframe=new_wireframe,
+                feedback_comment=body.feedback_user_comment,
+                wireframe_comment=body.wireframe_user_comment,
+                regenerated_by=x_user_id,
+                metrics=metrics.to_dict(),
+            )
+        observe_run(metrics.to_dict(), time.time() - regen_start, kind="regenerate")
+        _schedule_preview(evaluation_id, new_wireframe)
+
+        await manager.send_progress(client_id, "Wireframe Regenerated", 100, evaluation_id=evaluation_id,
+                                    status="completed")
+        logger.info("[REGEN] Done for %s", evaluation_id)
 
         return {"evaluation_id": evaluation_id, "wireframe": new_wireframe}
 
+    except SchedulerFull as e:
+        observe_run(metrics.to_dict(), time.time() - regen_start, kind="regenerate", status="rejected")
+        logger.warning("[SCHEDULER] Rejected regen of %s: %s", evaluation_id, e)
+        raise HTTPException(status_code=429, detail="Too many evaluations waiting, try again later")
+
     except Exception as e:
-        logger.error(f"[REGEN ERROR] {evaluation_id}: {e}")
+        observe_run(metrics.to_dict(), time.time() - regen_start, kind="regenerate", status="failed")
+        logger.error("[REGEN ERROR] %s: %s", evaluation_id, e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -181,7 +498,7 @@ async def submit_hitl_feedback(
     x_user_id: str = Header(default="anonymous"),
 ):
     """Saves user review to MongoDB. No pipeline blocking."""
-    if body.user_action not in ["agree", "disagree", "modify"]:
+    if body.user_action not in HITL_ACTIONS:
         raise HTTPException(status_code=400, detail="user_action must be: agree | disagree | modify")
     save_hitl_response(
         evaluation_id=body.evaluation_id,
@@ -191,35 +508,148 @@ async def submit_hitl_feedback(
         user_modified_suggestion=body.user_modified_suggestion,
         reviewed_by=x_user_id,
     )
-    logger.info(f"[HITL] {body.agent_name} | {body.user_action} | {body.evaluation_id}")
+    logger.info("[HITL] %s | %s | %s", body.agent_name, body.user_action, body.evaluation_id)
     return {"message": "Feedback saved", "evaluation_id": body.evaluation_id}
 
 
 # Fetch 
 
 @app.get("/evaluation/{evaluation_id}")
-async def get_single_evaluation(evaluation_id: str):
-    doc = get_evaluation(evaluation_id)
+async def get_single_evaluation(
+    evaluation_id: str,
+    view: str = "full",
+    sections: str | None = None,
+):
+    """
+    view=summary returns history-card fields only.
+    sections=feedback_report,ux_score limits which ai_results sections are returned.
+    """
+    try:
+        doc = get_evaluation(evaluation_id, view=view, sections=_parse_sections(sections))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not doc:
         raise HTTPException(status_code=404, detail="Evaluation not found")
     return doc
 
 @app.get("/evaluations/user/{user_id}")
-async def get_user_history(user_id: str):
-    return {"evaluations": get_user_evaluations(user_id)}
+async def get_user_history(
+    user_id: str,
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: str | None = None,
+    view: str = "summary",
+    sections: str | None = None,
+):
+    """Newest-first history. Pass the returned next_cursor to fetch the next page."""
+    try:
+        evaluations, next_cursor = get_user_evaluations(
+            user_id, limit=limit, cursor=cursor, view=view, sections=_parse_sections(sections),
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"evaluations": evaluations, "next_cursor": next_cursor}
 
 @app.get("/evaluations/analysis/export")
-async def export_for_analysis():
-    docs = get_evaluations_for_analysis()
-    return {"total": len(docs), "evaluations": docs}
+async def export_for_analysis(
+    format: str = "json",
+    status: str = "completed",
+    user_id: str | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    after: str | None = None,
+    batch_size: int = Query(default=500, ge=1, le=5000),
+):
+    """
+    format=json   → legacy response: latest 200 completed evaluations in one body.
+    format=ndjson → streams every matching evaluation, one document per line.
+    format=csv    → streams flattened rows for spreadsheet analysis.
+
+    Streaming formats are oldest-first; resume by passing the last row's
+    cursor as `after`. status=all disables the status filter.
+    """
+    if format == "json":
+        docs = get_evaluations_for_analysis()
+        return {"total": len(docs), "evaluations": docs}
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be: json | ndjson | csv")
+    if after:
+        try:
+            decode_cursor(after)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    docs = iter_evaluations_for_analysis(
+        status=None if status == "all" else status,
+        user_id=user_id,
+        created_from=created_from,
+        created_to=created_to,
+        after=after,
+        batch_size=batch_size,
+    )
+    if format == "csv":
+        return StreamingResponse(
+            stream_csv(docs), media_type="text/csv",
+            headers={"Content-Disposition": "attachment; filename=evaluations.csv"},
+        )
+    return StreamingResponse(stream_ndjson(docs), media_type="application/x-ndjson")
+
+@app.get("/evaluations/analysis/hitl-metrics")
+async def hitl_metrics(
+    day_from: str | None = None,
+    day_to: str | None = None,
+    agent: str | None = None,
+    screen_type: str | None = None,
+):
+    """Pre-aggregated HITL agree/disagree/modify counts (days as YYYY-MM-DD)."""
+    return get_hitl_metrics(day_from=day_from, day_to=day_to, agent_name=agent, screen_type=screen_type)
+
+
+@app.get("/healthz")
+async def healthz(response: Response):
+    """Liveness: the process answers and its pipeline pool is usable. 503 means restart it."""
+    body = health.liveness()
+    if body["status"] != "ok":
+        response.status_code = 503
+    return body
+
+
+@app.get("/readyz")
+async def readyz(response: Response):
+    """
+    Readiness: pool warmed up, queue not full, required dependencies reachable
+    (READY_REQUIRED_PROBES). 503 takes the instance out of rotation.
+    Also reports queue depth, worker utilization and cached dependency probes.
+    """
+    body = await health.readiness()
+    if not body["ready"]:
+        response.status_code = 503
+    return body
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Per-stage latency, token, retry, cache-hit and cost metrics (Prometheus text format)."""
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
 
 @app.websocket("/ws/{client_id}")
-async def websocket_endpoint(websocket: WebSocket, client_id: str):
-    await manager.connect(client_id, websocket)
-    logger.info(f"[WS] Connected: {client_id}")
+async def websocket_endpoint(
+    websocket: WebSocket,
+    client_id: str,
+    evaluation_id: str | None = None,
+    last_seq: int | None = None,
+):
+    """
+    Progress stream. Several sockets per client_id are allowed (tabs, reconnects).
+    Reconnect with ?evaluation_id=...&last_seq=N to replay the events after seq N.
+    """
+    await manager.connect(client_id, websocket, evaluation_id=evaluation_id, last_seq=last_seq)
+    logger.info("[WS] Connected: %s", client_id)
     try:
         while True:
             await websocket.receive_text()
     except WebSocketDisconnect:
-        manager.disconnect(client_id)
-        logger.info(f"[WS] Disconnected: {client_id}")
\ No newline at end of file
+        manager.disconnect(client_id, websocket)
+        logger.info("[WS] Disconnected: %s", client_id)
+        if CANCEL_ON_DISCONNECT and not manager.is_connected(client_id):
+            _start_disconnect_timer(client_id)
\ No newline at end of file
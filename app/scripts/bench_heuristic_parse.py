@@ -0,0 +1,98 @@
+"""
+Micro-benchmark for heuristic score extraction.
+
+Compares the legacy per-keyword regex scan against the JSON-first parser
+and the single-pass text scanner on large synthetic inputs.
+
+    python -m app.scripts.bench_heuristic_parse --lines 2000 --repeat 3
+"""
+import argparse
+import json
+import random
+import re
+import time
+
+from app.services.evaluation_parser import (
+    HEURISTIC_SCORE_KEYWORDS,
+    _scan_heuristic_scores,
+    parse_heuristic_scores,
+)
+
+FILLER = [
+    "The layout uses a card-based design with consistent spacing between sections.",
+    "Users may not notice the error state when the network request fails.",
+    "Icons follow platform conventions and match user expectations in most cases.",
+    "Contrast between the secondary text and background is borderline for WCAG AA.",
+    "There is no undo for destructive actions in the list view.",
+]
+
+
+def legacy_parse_heuristic_scores(raw_text: str) -> dict:
+    """Previous implementation, kept as the correctness/performance reference."""
+    scores = {}
+    for key, keywords in HEURISTIC_SCORE_KEYWORDS.items():
+        for keyword in keywords:
+            pattern = rf"{keyword}.*?(\d+)\s*/?\s*10"
+            match = re.search(pattern, raw_text.lower())
+            if match:
+                scores[key] = int(match.group(1))
+                break
+        if key not in scores:
+            scores[key] = None
+    return scores
+
+
+def make_text(lines: int, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    out = []
+    for i in range(lines):
+        out.append(rng.choice(FILLER) * rng.randint(1, 4))
+        if i % 50 == 0:
+            key = rng.choice(list(HEURISTIC_SCORE_KEYWORDS))
+            keyword = rng.choice(HEURISTIC_SCORE_KEYWORDS[key])
+            out.append(f"{keyword.title()}: score {rng.randint(0, 10)}/10")
+    return "\n".join(out)
+
+
+def make_json(violations: int, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    items = [
+        {"id": rng.randint(1, 10), "name": "heuristic", "severity": rng.randint(0, 4),
+         "comment": rng.choice(FILLER) * 20}
+        for _ in range(violations)
+    ]
+    return json.dumps({"violations": items, "strengths": [], "overall_score": 6, "summary": ""})
+
+
+def bench(label: str, fn, text: str, repeat: int) -> float:
+    fn(text)  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    per_call = (time.perf_counter() - start) / repeat
+    print(f"  {label:<28} {per_call * 1000:9.2f} ms/call")
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    text = make_text(args.lines)
+    print(f"Free-text input: {len(text) / 1024:.0f} KiB, {args.lines} lines")
+    legacy = bench("legacy regex per keyword", legacy_parse_heuristic_scores, text, args.repeat)
+    single = bench("single-pass scanner", _scan_heuristic_scores, text, args.repeat)
+    assert legacy_parse_heuristic_scores(text) == _scan_heuristic_scores(text), "scanner disagrees with legacy"
+    print(f"  speed-up: {legacy / single:.1f}x (results identical)")
+
+    payload = make_json(args.lines // 20)
+    print(f"JSON input: {len(payload) / 1024:.0f} KiB")
+    legacy = bench("legacy regex per keyword", legacy_parse_heuristic_scores, payload, args.repeat)
+    structured = bench("structured JSON", parse_heuristic_scores, payload, args.repeat)
+    print(f"  speed-up: {legacy / structured:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
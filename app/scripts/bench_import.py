@@ -0,0 +1,98 @@
+"""
+Import-time benchmark for the API (cold start before serving traffic).
+
+Each run imports the module in a fresh interpreter with -X importtime.
+Reported: median/min/max wall time of the import, which heavy SDKs got
+loaded, and the slowest modules by cumulative import time.
+
+    python -m app.scripts.bench_import
+    python -m app.scripts.bench_import --runs 10 --top 30
+    python -m app.scripts.bench_import --module src.ux_feedback_crew.crew_pipeline
+    python -m app.scripts.bench_import --json data/outputs/bench_import.json
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+
+# Loaded lazily by the API: on first use, at startup, or in pipeline workers
+HEAVY_MODULES = ("crewai", "litellm", "vertexai", "google.genai", "boto3", "PIL.Image")
+
+_PROBE = """
+import sys, time
+sys.path[:0] = [{root!r}, {src!r}]
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print("RESULT", elapsed, ",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def _parse_importtime(stderr: str) -> list[tuple[str, float, float]]:
+    """(module, self seconds, cumulative seconds) from -X importtime output; nested modules are indented."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.rstrip(), int(self_us) / 1e6, int(cumulative_us) / 1e6))
+    return rows
+
+
+def run_once(module: str) -> tuple[float, list[str], list[tuple[str, float, float]]]:
+    code = _PROBE.format(root=str(ROOT), src=str(ROOT / "src"), module=module, heavy=HEAVY_MODULES)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          cwd=ROOT, capture_output=True, text=True)
+    result = next((l for l in proc.stdout.splitlines() if l.startswith("RESULT ")), None)
+    if proc.returncode != 0 or result is None:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    _, elapsed, loaded = result.split(" ", 2)
+    return float(elapsed), [m for m in loaded.split(",") if m], _parse_importtime(proc.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    print(f"import {args.module}: {args.runs} fresh interpreters")
+    timings, loaded, rows = [], [], []
+    for i in range(args.runs):
+        elapsed, loaded, rows = run_once(args.module)
+        timings.append(elapsed)
+        print(f"  run {i + 1}: {elapsed:.3f}s")
+
+    print(f"\n  median {statistics.median(timings):.3f}s | min {min(timings):.3f}s | max {max(timings):.3f}s")
+    print(f"  heavy SDKs loaded: {', '.join(loaded) or 'none'}")
+
+    # Self time summed per top-level package: where the import time actually goes
+    packages = {}
+    for name, self_seconds, _ in rows:
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0.0) + self_seconds
+    slowest = sorted(packages.items(), key=lambda item: -item[1])[:args.top]
+    print(f"\n  slowest packages (last run, self time):")
+    for name, seconds in slowest:
+        print(f"    {seconds * 1000:9.1f} ms  {name}")
+
+    if args.json:
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.json).write_text(json.dumps({
+            "module": args.module,
+            "runs": timings,
+            "median_seconds": statistics.median(timings),
+            "heavy_modules_loaded": loaded,
+            "slowest_packages": [{"package": name, "seconds": round(seconds, 4)} for name, seconds in slowest],
+        }, indent=2))
+        print(f"\nSaved {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+End-to-end latency / throughput baseline for /analyze-and-wireframe-s3.
+
+Every model call is served by app.scripts.fake_model_backend (recorded
+judge_eval outputs + configurable latency), S3 uploads are written to a
+temp dir, and MongoDB is whatever MONGO_URI points at — use a local,
+disposable database (DB_NAME defaults to heuruxagent_bench here).
+
+The app runs in-process behind httpx's ASGI transport, and each
+concurrency level sends `--requests` uploads with at most `level` in
+flight. Reported per level: p50/p95/p99 latency, throughput, errors and
+peak RSS.
+
+    python -m app.scripts.bench_pipeline --levels 1,4,16 --requests 32
+    python -m app.scripts.bench_pipeline --latency vision=2,heuristic=1.5,jitter=0
+    python -m app.scripts.bench_pipeline --json data/outputs/bench_baseline.json
+    python -m app.scripts.bench_pipeline --executor process   # pipelines in worker processes
+
+    # Same fakes behind a real server, for external load generators
+    python -m app.scripts.bench_pipeline --serve --port 8000
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from app.scripts.fake_model_backend import FakeLatency, install
+
+ROOT = Path(__file__).resolve().parents[2]
+ENDPOINT = "/analyze-and-wireframe-s3/{client_id}"
+
+
+def _prepare_env():
+    """Environment the app and crew need before they are imported."""
+    os.environ.setdefault("DB_NAME", "heuruxagent_bench")
+    os.environ.setdefault("GEMINI_API_KEY", "fake")
+    os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+    # Measure with production logging: no crewai console output
+    os.environ.setdefault("CREW_VERBOSE", "false")
+    # Pipeline worker processes install the same fakes (FAKE_MODEL_LATENCY is set in main)
+    os.environ.setdefault("PIPELINE_WORKER_INIT", "app.scripts.fake_model_backend:install_from_env")
+    for path in (ROOT, ROOT / "src"):
+        if str(path) not in sys.path:
+            sys.path.append(str(path))
+
+
+def _screenshot_bytes() -> bytes:
+    from PIL import Image, ImageDraw
+
+    img = Image.new("RGB", (375, 812), "white")
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((0, 0, 375, 60), fill="#1f6feb")
+    for y in range(100, 700, 120):
+        draw.rectangle((20, y, 355, y + 90), outline="#888888", width=2)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def load_app(upload_dir: Path):
+    """Imports the app with model fakes installed and S3 redirected to upload_dir."""
+    import app.main as main
+    from app.services import s3_service
+
+    async def fake_upload(file) -> str:
+        path = upload_dir / f"{uuid.uuid4()}.{file.filename.split('.')[-1]}"
+        path.write_bytes(await file.read())
+        return str(path)
+
+    def fake_upload_bytes(data: bytes, key: str, content_type: str) -> str:
+        path = upload_dir / key.replace("/", "_")
+        path.write_bytes(data)
+        return str(path)
+
+    main.upload_image_to_s3 = fake_upload
+    s3_service.upload_bytes_to_s3 = fake_upload_bytes
+    return main.app
+
+
+def _percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def _rss_mb() -> float:
+    """Current RSS from /proc, falling back to peak RSS where /proc is missing."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+async def run_level(client, level: int, requests: int, screenshot: bytes) -> dict:
+    slots = asyncio.Semaphore(level)
+    latencies, errors = [], 0
+    peak_rss = _rss_mb()
+
+    async def one(i: int):
+        nonlocal errors, peak_rss
+        async with slots:
+            started = time.perf_counter()
+            try:
+                response = await client.post(
+                    ENDPOINT.format(client_id=f"bench-{level}-{i}"),
+                    files={"file": ("screen.png", screenshot, "image/png")},
+                    headers={"X-User-Id": "bench"},
+                )
+                ok = response.status_code == 200
+            except Exception as e:
+                print(f"    request {i} failed: {e}")
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+            peak_rss = max(peak_rss, _rss_mb())
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    wall = time.perf_counter() - started
+    return {
+        "concurrency": level,
+        "requests": requests,
+        "errors": errors,
+        "p50_s": round(_percentile(latencies, 50), 3),
+        "p95_s": round(_percentile(latencies, 95), 3),
+        "p99_s": round(_percentile(latencies, 99), 3),
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else 0.0,
+        "wall_s": round(wall, 2),
+        "peak_rss_mb": round(peak_rss, 1),
+    }
+
+
+async def run_benchmark(levels: list, requests: int, timeout: float) -> list:
+    import httpx
+
+    with tempfile.TemporaryDirectory(prefix="bench_uploads_") as tmp:
+        app = load_app(Path(tmp))
+        screenshot = _screenshot_bytes()
+        # ASGITransport doesn't send lifespan events; run startup/shutdown handlers ourselves
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=timeout) as client:
+                results = []
+                for level in levels:
+                    print(f"  concurrency={level} requests={requests}...")
+                    results.append(await run_level(client, level, requests, screenshot))
+    return results
+
+
+def print_table(results: list):
+    print("\n| concurrency | requests | errors | p50 (s) | p95 (s) | p99 (s) | req/s | peak RSS (MB) |")
+    print("|---|---|---|---|---|---|---|---|")
+    for r in results:
+        print(f"| {r['concurrency']} | {r['requests']} | {r['errors']} | {r['p50_s']} | {r['p95_s']} "
+              f"| {r['p99_s']} | {r['throughput_rps']} | {r['peak_rss_mb']} |")
+
+
+def serve(host: str, port: int):
+    import uvicorn
+
+    upload_dir = Path(tempfile.mkdtemp(prefix="bench_uploads_"))
+    print(f"Serving with fake models on {host}:{port} (uploads in {upload_dir})")
+    uvicorn.run(load_app(upload_dir), host=host, port=port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", default="1,2,4,8", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=16, help="Requests per level")
+    parser.add_argument("--latency", default="", help="Fake model latency, e.g. vision=2,agent=0.1,jitter=0")
+    parser.add_argument("--timeout", type=float, default=600, help="Per-request timeout in seconds")
+    parser.add_argument("--json", type=Path, help="Also write results (and the latency config) here")
+    parser.add_argument("--executor", choices=("thread", "process"),
+                        help="PIPELINE_EXECUTOR for this run (default: from the environment)")
+    parser.add_argument("--serve", action="store_true", help="Run uvicorn with the fakes instead of benchmarking")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    os.environ["FAKE_MODEL_LATENCY"] = args.latency
+    if args.executor:
+        os.environ["PIPELINE_EXECUTOR"] = args.executor
+    _prepare_env()
+    latency = install(FakeLatency.parse(args.latency))
+
+    if args.serve:
+        serve(args.host, args.port)
+        return
+
+    levels = [int(level) for level in args.levels.split(",") if level.strip()]
+    print(f"Fake latency: {latency}")
+    results = asyncio.run(run_benchmark(levels, args.requests, args.timeout))
+    print_table(results)
+
+    if args.json:
+        args.json.parent.mkdir(parents=True, exist_ok=True)
+        args.json.write_text(json.dumps({"latency": repr(latency), "results": results}, indent=2))
+        print(f"\nSaved {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Deterministic fake model backend for benchmarks and offline runs.
+
+Replaces every model entry point the pipeline uses with recorded
+responses from judge_eval/*_output.* and a configurable latency:
+
+  - google.genai.Client            (vision, heuristic, wireframe tools)
+  - vertexai GenerativeModel       (feedback tool)
+  - crewai.LLM.call                (agent reasoning; emits one tool call, then
+                                    returns the tool observation as the final answer)
+
+install() must run before the crew/tools modules are imported.
+Pipeline worker processes get it through
+PIPELINE_WORKER_INIT=app.scripts.fake_model_backend:install_from_env
+(latency from FAKE_MODEL_LATENCY, same syntax as FakeLatency.parse).
+
+Run as a script, it serves the same responses as an OpenAI-compatible
+server instead, for stages pointed at it with the openai backend
+(src.utils.model_backends), without patching the app:
+
+    python -m app.scripts.fake_model_backend --port 8001 --latency feedback=0.4
+    FEEDBACK_MODEL_BACKEND=openai OPENAI_BASE_URL=http://localhost:8001/v1 uvicorn app.main:app
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import types
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+RECORDED_DIR = Path(__file__).resolve().parents[2] / "judge_eval"
+
+TOOL_NAMES = ("analyze_ui_screenshot", "evaluate_heuristics", "generate_feedback", "create_wireframe")
+_SCREENSHOT_PATH = re.compile(r"screenshot at (\S+?)\.? using")
+_TOOL_NAME = re.compile(r"^Tool Name: (\w+)", re.MULTILINE)
+
+
+@dataclass
+class FakeLatency:
+    """Seconds per call. jitter is a ± fraction, drawn from a seeded RNG."""
+    vision: float = 0.5
+    heuristic: float = 0.4
+    feedback: float = 0.4
+    wireframe: float = 0.6
+    agent: float = 0.05
+    jitter: float = 0.1
+    seed: int = 42
+    _rng: random.Random = field(default=None, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def sleep(self, stage: str):
+        base = getattr(self, stage)
+        with self._lock:
+            if self._rng is None:
+                self._rng = random.Random(self.seed)
+            factor = 1 + self._rng.uniform(-self.jitter, self.jitter)
+        time.sleep(max(0.0, base * factor))
+
+    @classmethod
+    def parse(cls, spec: str) -> "FakeLatency":
+        """'vision=2,heuristic=1.5,agent=0.1' → FakeLatency"""
+        latency = cls()
+        for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+            key, value = part.split("=", 1)
+            setattr(latency, key.strip(), float(value))
+        return latency
+
+
+class Recorded:
+    def __init__(self, directory: Path = RECORDED_DIR):
+        self.vision    = (directory / "vision_output.json").read_text(encoding="utf-8")
+        self.heuristic = (directory / "heuristic_output.json").read_text(encoding="utf-8")
+        self.feedback  = (directory / "feedback_output.json").read_text(encoding="utf-8")
+        self.wireframe = (directory / "wireframe_output.html").read_text(encoding="utf-8")
+
+
+class _Usage:
+    def __init__(self, prompt: str, text: str):
+        self.prompt_token_count = len(prompt) // 4
+        self.candidates_token_count = len(text) // 4
+        self.total_token_count = self.prompt_token_count + self.candidates_token_count
+
+
+class _Response:
+    def __init__(self, text: str, prompt: str = ""):
+        self.text = text
+        self.usage_metadata = _Usage(prompt, text)
+
+
+def _prompt_text(contents) -> str:
+    if isinstance(contents, (list, tuple)):
+        return "\n".join(c for c in contents if isinstance(c, str))
+    return str(contents)
+
+
+def _classify_prompt(contents) -> str:
+    text = _prompt_text(contents)
+    if isinstance(contents, (list, tuple)) and len(contents) > 1:
+        return "vision"
+    if "Nielsen" in text:
+        return "heuristic"
+    if "UI/UX designer" in text:
+        return "wireframe"
+    return "feedback"
+
+
+def install(latency: FakeLatency = None, recorded: Recorded = None):
+    """Patches all model entry points in this process. Returns the latency config."""
+    latency = latency or FakeLatency()
+    recorded = recorded or Recorded()
+
+    def respond(contents) -> _Response:
+        stage = _classify_prompt(contents)
+        latency.sleep(stage)
+        return _Response(getattr(recorded, stage), _prompt_text(contents))
+
+    # google-genai
+    from google import genai
+
+    class FakeModels:
+        def generate_content(self, model=None, contents=None, config=None, **_):
+            return respond(contents)
+
+        def get(self, model=None, **_):
+            return types.SimpleNamespace(name=model)
+
+    class FakeClient:
+        def __init__(self, *args, **kwargs):
+            self.models = FakeModels()
+
+    genai.Client = FakeClient
+
+    # vertexai (module may not be installed; the fake stands in either way)
+    class FakeGenerativeModel:
+        def __init__(self, model_name: str, *args, **kwargs):
+            self.model_name = model_name
+
+        def generate_content(self, prompt, generation_config=None, **_):
+            return respond(prompt)
+
+        def count_tokens(self, contents, **_):
+            return types.SimpleNamespace(total_tokens=len(_prompt_text(contents)) // 4)
+
+    vertexai = types.ModuleType("vertexai")
+    vertexai.init = lambda *args, **kwargs: None
+    generative_models = types.ModuleType("vertexai.generative_models")
+    generative_models.GenerativeModel = FakeGenerativeModel
+    vertexai.generative_models = generative_models
+    sys.modules["vertexai"] = vertexai
+    sys.modules["vertexai.generative_models"] = generative_models
+
+    # crewai agent LLM
+    from crewai import LLM
+
+    tool_args = {
+        "evaluate_heuristics": {"vision_analysis": recorded.vision},
+        # crewai's generated schemas require every argument, defaults included
+        "generate_feedback": {"vision_analysis": recorded.vision,
+                              "heuristic_evaluation": recorded.heuristic,
+                              "evaluation_id": ""},
+        "create_wireframe": {"vision_analysis": recorded.vision,
+                             "feedback_result": recorded.feedback,
+                             "feedback_user_comment": "",
+                             "wireframe_user_comment": ""},
+    }
+
+    def fake_call(self, messages, tools=None, callbacks=None, available_functions=None, **_):
+        latency.sleep("agent")
+        if isinstance(messages, str):
+            messages = [{"role": "user", "content": messages}]
+        last = str(messages[-1].get("content", ""))
+        if "\nObservation:" in last:
+            # First one: tool errors append format help that itself mentions "Observation:"
+            observation = last.split("\nObservation:", 1)[1].strip()
+            return f"Thought: I now know the final answer\nFinal Answer: {observation}"
+
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        # The agent's own tool list, not task text that may mention other tools
+        match = _TOOL_NAME.search(prompt)
+        tool = match.group(1) if match else None
+        if tool not in TOOL_NAMES:
+            return "Thought: I now know the final answer\nFinal Answer: {}"
+        if tool == "analyze_ui_screenshot":
+            path = _SCREENSHOT_PATH.search(prompt)
+            args = {"image_path": path.group(1) if path else ""}
+        else:
+            args = tool_args[tool]
+        return f"Thought: I should use the {tool} tool\nAction: {tool}\nAction Input: {json.dumps(args)}"
+
+    LLM.call = fake_call
+    return latency
+
+
+def install_from_env():
+    """Worker-process entry point, see PIPELINE_WORKER_INIT."""
+    return install(FakeLatency.parse(os.getenv("FAKE_MODEL_LATENCY", "")))
+
+
+def serve_openai(port: int, latency: FakeLatency = None, recorded: Recorded = None):
+    """Serves POST /v1/chat/completions with the recorded output of the stage the prompt belongs to."""
+    latency = latency or FakeLatency()
+    recorded = recorded or Recorded()
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, data: dict):
+            payload = json.dumps(data).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if not self.path.rstrip("/").endswith("/models"):
+                self.send_error(404)
+                return
+            self._send_json({"object": "list", "data": [{"id": "fake", "object": "model"}]})
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+            content = body["messages"][-1]["content"]
+            if isinstance(content, str):
+                contents = content
+            else:
+                # An image part makes it a vision prompt, as with the genai fake
+                contents = [p.get("text", "") if p.get("type") == "text" else None for p in content]
+            stage = _classify_prompt(contents)
+            latency.sleep(stage)
+            text = getattr(recorded, stage)
+            usage = _Usage(_prompt_text(contents), text)
+            self._send_json({
+                "object": "chat.completion",
+                "model": body.get("model", ""),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": usage.prompt_token_count,
+                          "completion_tokens": usage.candidates_token_count,
+                          "total_tokens": usage.total_token_count},
+            })
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    print(f"Fake OpenAI-compatible backend on http://localhost:{port}/v1 ({latency})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", default="", help="per-stage seconds, e.g. feedback=0.4,jitter=0")
+    args = parser.parse_args()
+    serve_openai(args.port, FakeLatency.parse(args.latency))
+
+
+if __name__ == "__main__":
+    main()
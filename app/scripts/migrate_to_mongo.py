@@ -1,7 +1,9 @@
 import pandas as pd
+import argparse
 import os
 import sys
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne, ASCENDING
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -9,90 +11,191 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 load_dotenv()
 
-def map_severity(sev):
-    """Maps 0-4 scale to Agent priority labels"""
-    if sev <= 1: return "low"
-    if sev == 2: return "medium"
-    return "high"
+DEFAULT_CSV = Path("data/ux_expert_evaluation_dataset_v2.csv")
+DEFAULT_COLLECTION = "expert_validation_dataset_v2"
+ITEM_COLUMNS = ["title", "priority", "effort_estimate", "why_it_matters", "what_to_do", "wireframe_changes"]
 
-def calculate_ux_score(group):
-    """Calculates a score based on expert severity"""
+
+def calculate_ux_score(severity_mean):
+    """Calculates a score based on expert severity (works on scalars and Series)"""
     # Logic: Start at 10, subtract points based on severity
-    avg_sev = group['severity'].mean()
-    score = max(0, 10 - (avg_sev * 2))
-    return round(score, 2)
+    return (10 - severity_mean * 2).clip(lower=0).round(2) if isinstance(severity_mean, pd.Series) \
+        else round(max(0, 10 - severity_mean * 2), 2)
 
-def migrate_dataset():
-    csv_path = Path("data/ux_expert_evaluation_dataset_v2.csv")
-    
-    if not csv_path.exists():
-        print(f"Error: File not found at {csv_path}")
-        return
 
-    # Load Data
-    print(f" Loading dataset from {csv_path}...")
-    df = pd.read_csv(csv_path)
-    
-    # Connect to MongoDB
-    uri = os.getenv("MONGO_URI") 
-    if not uri:
-        print("Error: MONGO_URI not found in .env file")
-        return
+def build_documents(df: pd.DataFrame) -> list:
+    """
+    Maps expert rows to one Agent-format document per ui_id.
+    Scores and severity counts come from a single groupby-aggregate;
+    feedback items are built column-wise and bucketed in one pass.
+    """
+    if "source" not in df.columns:
+        df = df.assign(source="internal_dataset")
+    sev = df["severity"]
 
-    client = MongoClient(uri)
-    db = client['heuruxagent_db']
-    collection = db['expert_validation_dataset_v2']
+    items = pd.DataFrame({
+        "ui_id": df["ui_id"],
+        "title": df["heuristic"],
+        "priority": pd.Series("medium", index=df.index).mask(sev <= 1, "low").mask(sev >= 3, "high"),
+        "effort_estimate": "Medium",  # Defaulting for now
+        "why_it_matters": df["issue"],
+        "what_to_do": df["suggestion"].map(lambda s: [s]),  # Wrapped in list for Agent compatibility
+        "wireframe_changes": "Apply UI fix according to " + df["heuristic"].astype(str) + " standards.",
+    })
 
-    documents = []
+    summary = df.assign(
+        is_high=sev >= 3, is_medium=sev == 2, is_low=sev <= 1,
+    ).groupby("ui_id", sort=False).agg(
+        image_url=("image_path", "first"),
+        screen_type=("screen_type", "first"),
+        source=("source", "first"),
+        severity_mean=("severity", "mean"),
+        total_issues=("severity", "size"),
+        high=("is_high", "sum"),
+        medium=("is_medium", "sum"),
+        low=("is_low", "sum"),
+    )
+    summary["score"] = calculate_ux_score(summary["severity_mean"])
 
-    # Group by ui_id and perform Mapping
-    print("Mapping expert evaluations to Agent JSON format...")
-    for ui_id, group in df.groupby('ui_id'):
-        first_row = group.iloc[0]
-        
-        feedback_items = []
-        for _, row in group.iterrows():
-            feedback_items.append({
-                "title": row['heuristic'], 
-                "priority": map_severity(row['severity']),
-                "effort_estimate": "Medium", # Defaulting for now
-                "why_it_matters": row['issue'],
-                "what_to_do": [row['suggestion']], # Wrapped in list for Agent compatibility
-                "wireframe_changes": f"Apply UI fix according to {row['heuristic']} standards."
-            })
-        
-        # Build the structured document
-        doc = {
+    feedback_items = {ui_id: [] for ui_id in summary.index}
+    for row in items.to_dict("records"):
+        feedback_items[row.pop("ui_id")].append(row)
+
+    documents = []
+    for ui_id, row in zip(summary.index, summary.itertuples(index=False)):
+        score = float(row.score)
+        documents.append({
             "ui_id": ui_id,
-            "image_url": first_row['image_path'],
-            "screen_type": first_row['screen_type'],
+            "image_url": row.image_url,
+            "screen_type": row.screen_type,
             "expert_report": {
-                "feedback_items": feedback_items,
+                "feedback_items": feedback_items[ui_id],
                 "ux_score": {
-                    "score": calculate_ux_score(group),
-                    "grade": "Good" if calculate_ux_score(group) >= 7.0 else "Needs Improvement"
+                    "score": score,
+                    "grade": "Good" if score >= 7.0 else "Needs Improvement"
                 },
                 "summary": {
-                    "total_issues": len(group),
-                    "high": int(len(group[group['severity'] >= 3])),
-                    "medium": int(len(group[group['severity'] == 2])),
-                    "low": int(len(group[group['severity'] <= 1]))
+                    "total_issues": int(row.total_issues),
+                    "high": int(row.high),
+                    "medium": int(row.medium),
+                    "low": int(row.low)
                 }
             },
             "metadata": {
-                "source": first_row.get('source', 'internal_dataset'),
+                "source": row.source,
                 "expert_label": "ui ux expert"
             }
-        }
-        documents.append(doc)
-
-    # Insert into MongoDB
-    if documents:
-        print(f"Uploading {len(documents)} documents to MongoDB...")
-        collection.insert_many(documents)
-        print("Migration Successful!")
+        })
+    return documents
+
+
+def dedupe_ui_ids(collection) -> int:
+    """
+    Collections filled by the old insert_many migration hold one copy of a
+    ui_id per run. Keeps the newest copy of each (the upserts below rewrite
+    it anyway) and returns how many documents were deleted.
+    """
+    duplicates = collection.aggregate([
+        {"$group": {"_id": "$ui_id", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ], allowDiskUse=True)
+    stale = [oid for group in duplicates for oid in sorted(group["ids"])[:-1]]
+    for start in range(0, len(stale), 1000):
+        collection.delete_many({"_id": {"$in": stale[start:start + 1000]}})
+    return len(stale)
+
+
+def iter_ui_groups(csv_path: Path, chunksize: int):
+    """
+    Streams the CSV in chunks and yields DataFrames holding complete ui_id
+    groups. Rows of the last ui_id in a chunk are carried into the next
+    chunk, so the CSV must keep each ui_id's rows contiguous.
+    """
+    if not chunksize:
+        yield pd.read_csv(csv_path)
+        return
+
+    carry = None
+    flushed = set()
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        last_ui = chunk["ui_id"].iloc[-1]
+        tail = chunk["ui_id"] == last_ui
+        ready, carry = chunk[~tail], chunk[tail]
+        if len(ready):
+            ui_ids = set(ready["ui_id"].unique())
+            repeated = ui_ids & flushed
+            if repeated:
+                raise ValueError(
+                    f"ui_id rows are not contiguous ({sorted(repeated)[:3]}...). "
+                    "Sort the CSV by ui_id or run with --chunksize 0."
+                )
+            flushed |= ui_ids
+            yield ready
+    if carry is not None and len(carry):
+        if last_ui in flushed:
+            raise ValueError(f"ui_id rows are not contiguous ({last_ui}). Sort the CSV by ui_id.")
+        yield carry
+
+
+def migrate_dataset(
+    csv_path: Path = DEFAULT_CSV,
+    collection_name: str = DEFAULT_COLLECTION,
+    chunksize: int = 50_000,
+    batch_size: int = 1000,
+):
+    if not csv_path.exists():
+        print(f"Error: File not found at {csv_path}")
+        return
+
+    # Connect to MongoDB
+    uri = os.getenv("MONGO_URI")
+    if not uri:
+        print("Error: MONGO_URI not found in .env file")
+        return
+
+    client = MongoClient(uri)
+    db = client['heuruxagent_db']
+    collection = db[collection_name]
+    # Upserts are keyed on ui_id — re-running the migration updates instead of duplicating
+    removed = dedupe_ui_ids(collection)
+    if removed:
+        print(f"Removed {removed} duplicate ui_id documents left by earlier migrations")
+    try:
+        collection.create_index([("ui_id", ASCENDING)], unique=True)
+    except (DuplicateKeyError, OperationFailure) as e:
+        print(f"Error: could not create the unique ui_id index on {collection_name}: {e}")
+        print("Documents without a ui_id, or an existing non-unique ui_id index, can block it. "
+              "Fix or drop them (or drop the collection, the migration rebuilds it) and re-run.")
+        return
+
+    print(f" Streaming dataset from {csv_path}...")
+    print("Mapping expert evaluations to Agent JSON format...")
+    total = upserted = 0
+    for frame in iter_ui_groups(csv_path, chunksize):
+        documents = build_documents(frame)
+        for start in range(0, len(documents), batch_size):
+            ops = [
+                UpdateOne({"ui_id": doc["ui_id"]}, {"$set": doc}, upsert=True)
+                for doc in documents[start:start + batch_size]
+            ]
+            result = collection.bulk_write(ops, ordered=False)
+            upserted += result.upserted_count
+        total += len(documents)
+        print(f"  {total} documents written...")
+
+    if total:
+        print(f"Migration Successful! {total} documents ({upserted} new, {total - upserted} updated)")
     else:
         print("No data found to migrate.")
 
+
 if __name__ == "__main__":
-    migrate_dataset()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Import the expert evaluation CSV into MongoDB")
+    parser.add_argument("--csv", type=Path, default=DEFAULT_CSV)
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION)
+    parser.add_argument("--chunksize", type=int, default=50_000, help="CSV rows per chunk (0 = load whole file)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Upserts per bulk_write")
+    args = parser.parse_args()
+    migrate_dataset(args.csv, args.collection, args.chunksize, args.batch_size)
@@ -0,0 +1,174 @@
+"""
+Re-derives parser-computed fields (screen_type, heuristic scores, feedback
+issues/suggestions, ux_score) across the evaluations collection.
+
+Streams documents in _id order with only the raw agent outputs projected,
+derives fields in a process pool, and writes back with unordered
+bulk_write. Progress is checkpointed after every written batch so an
+interrupted run resumes where it stopped.
+
+    python -m app.scripts.reprocess_evaluations --workers 4 --batch-size 500
+    python -m app.scripts.reprocess_evaluations --reset          # start over
+    python -m app.scripts.reprocess_evaluations --rebuild-hitl-metrics
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from app.services.evaluation_parser import DERIVATION_SOURCE_FIELDS, derive_fields_batch
+
+DEFAULT_CHECKPOINT = Path("data/outputs/reprocess_checkpoint.json")
+REPROCESS_STATUSES = ["completed", "regenerated"]
+
+
+def load_checkpoint(path: Path) -> dict:
+    if path.exists():
+        return json.loads(path.read_text())
+    return {"last_id": None, "processed": 0, "updated": 0}
+
+
+def save_checkpoint(path: Path, state: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state))
+    os.replace(tmp, path)   # atomic: a crash never leaves a half-written checkpoint
+
+
+def _batches(cursor, batch_size: int):
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def reprocess(workers: int, batch_size: int, checkpoint_path: Path, dry_run: bool = False, limit: int = 0):
+    from bson import ObjectId
+    from pymongo import ASCENDING, UpdateOne
+    from app.services.database import evaluations_collection, _now
+
+    state = load_checkpoint(checkpoint_path)
+    query = {"status": {"$in": REPROCESS_STATUSES}}
+    if state["last_id"]:
+        query["_id"] = {"$gt": ObjectId(state["last_id"])}
+        print(f"Resuming after {state['last_id']} ({state['processed']} already processed)")
+
+    cursor = evaluations_collection.find(query, {"_id": 1, **DERIVATION_SOURCE_FIELDS}) \
+        .sort("_id", ASCENDING).batch_size(batch_size)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    def write(results):
+        if not results or dry_run:
+            return 0
+        now = _now()
+        ops = [
+            UpdateOne({"_id": _id}, {"$set": {**fields, "timestamps.reprocessed_at": now}})
+            for _id, fields in results
+        ]
+        return evaluations_collection.bulk_write(ops, ordered=False).modified_count
+
+    started = time.time()
+    ctx = multiprocessing.get_context("spawn")
+    # At most 2 batches per worker are in memory at once, whatever the collection size
+    max_in_flight = max(2, workers * 2)
+    in_flight = deque()
+
+    def drain_one():
+        future, last_id = in_flight.popleft()
+        results = future.result()
+        state["updated"]   += write(results)
+        state["processed"] += len(results)
+        state["last_id"]    = str(last_id)
+        if not dry_run:
+            save_checkpoint(checkpoint_path, state)
+        rate = state["processed"] / max(time.time() - started, 1e-6)
+        print(f"  processed={state['processed']} updated={state['updated']} ({rate:.0f} docs/s)")
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            for batch in _batches(cursor, batch_size):
+                in_flight.append((pool.submit(derive_fields_batch, batch), batch[-1]["_id"]))
+                if len(in_flight) >= max_in_flight:
+                    drain_one()
+            while in_flight:
+                drain_one()
+    finally:
+        cursor.close()
+
+    print(f"Done: {state['processed']} processed, {state['updated']} updated "
+          f"in {time.time() - started:.1f}s{' (dry run)' if dry_run else ''}")
+
+
+def rebuild_hitl_metrics():
+    """
+    Recomputes hitl_metrics from every stored HITL response (server-side aggregation).
+    The aggregate lands in a scratch collection that is then renamed over
+    hitl_metrics, so dashboards never read a half-empty collection.
+    """
+    from pymongo import ASCENDING
+    from app.services.database import evaluations_collection, hitl_metrics_collection
+
+    rebuild = hitl_metrics_collection.database[f"{hitl_metrics_collection.name}_rebuild"]
+    pipeline = [
+        {"$unwind": "$hitl_feedback.responses"},
+        {"$group": {
+            "_id": {
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$hitl_feedback.responses.reviewed_at",
+                                          "onNull": "unknown"}},
+                "agent": {"$ifNull": ["$hitl_feedback.responses.agent", "unknown"]},
+                "screen_type": {"$ifNull": ["$input.screen_type", "unknown"]},
+            },
+            "agree":    {"$sum": {"$cond": [{"$eq": ["$hitl_feedback.responses.user_action", "agree"]}, 1, 0]}},
+            "disagree": {"$sum": {"$cond": [{"$eq": ["$hitl_feedback.responses.user_action", "disagree"]}, 1, 0]}},
+            "modify":   {"$sum": {"$cond": [{"$eq": ["$hitl_feedback.responses.user_action", "modify"]}, 1, 0]}},
+            "total":    {"$sum": 1},
+        }},
+        {"$project": {
+            "_id": {"$concat": ["$_id.day", "|", "$_id.agent", "|", "$_id.screen_type"]},
+            "day": "$_id.day",
+            "agent": "$_id.agent",
+            "screen_type": "$_id.screen_type",
+            "counts": {"agree": "$agree", "disagree": "$disagree", "modify": "$modify", "total": "$total"},
+        }},
+        {"$out": rebuild.name},
+    ]
+    rebuild.drop()
+    evaluations_collection.aggregate(pipeline, allowDiskUse=True)
+    rebuild.create_index([("day", ASCENDING), ("agent", ASCENDING)])
+    # Reviews $inc'd between the aggregate and the rename are only in the old collection;
+    # run this while HITL traffic is low
+    rebuild.rename(hitl_metrics_collection.name, dropTarget=True)
+    print(f"Rebuilt hitl_metrics: {hitl_metrics_collection.count_documents({})} rows")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--checkpoint", type=Path, default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--reset", action="store_true", help="Ignore and delete the existing checkpoint")
+    parser.add_argument("--dry-run", action="store_true", help="Derive fields without writing")
+    parser.add_argument("--limit", type=int, default=0, help="Stop after N documents (0 = all)")
+    parser.add_argument("--rebuild-hitl-metrics", action="store_true",
+                        help="Recompute the hitl_metrics collection instead of derived fields")
+    args = parser.parse_args()
+
+    if args.rebuild_hitl_metrics:
+        rebuild_hitl_metrics()
+        return
+    if args.reset and args.checkpoint.exists():
+        args.checkpoint.unlink()
+    reprocess(args.workers, args.batch_size, args.checkpoint, dry_run=args.dry_run, limit=args.limit)
+
+
+if __name__ == "__main__":
+    main()
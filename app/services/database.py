@@ -1,133 +1,108 @@
 import os
-import json
-import re
-from pymongo import MongoClient, DESCENDING
+import base64
+from pymongo import MongoClient, ASCENDING, DESCENDING, timeout as mongo_timeout
+from pymongo.errors import DuplicateKeyError
 from dotenv import load_dotenv
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
+from app.services.evaluation_parser import (
+    detect_screen_type, parse_heuristic_scores,
+    parse_feedback_report, parse_overall_score, compute_ux_score,
+)
+
+from app.services.render_service import html_hash
+from src.utils.tracing import mongo_listeners
+
 load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = os.getenv("DB_NAME", "heuruxagent_db")
 
-client = MongoClient(MONGO_URI)
+# connect=False: no connection until the first operation, so importing this module costs no round trip
+client = MongoClient(MONGO_URI, connect=False, event_listeners=mongo_listeners())
 db = client[DB_NAME]
 
 evaluations_collection = db["evaluations"]
-
-evaluations_collection.create_index([("user_id", DESCENDING)])
-evaluations_collection.create_index([("evaluation_id", DESCENDING)], unique=True)
-evaluations_collection.create_index([("timestamps.created_at", DESCENDING)])
-evaluations_collection.create_index([("status", DESCENDING)])
-
-def _now() -> datetime:
-    return datetime.now(timezone.utc)
+# Pre-aggregated HITL counters: one doc per (day, agent, screen_type)
+hitl_metrics_collection = db["hitl_metrics"]
 
 
-def _detect_screen_type(vision_text: str) -> str:
+def ensure_indexes():
     """
-    Basic screen type detection from vision agent output.
-    Can be improved with more keywords over time.
+    Creates the indexes the queries below rely on (no-op for existing ones).
+    Run by the API at startup, not at import.
     """
-    text = vision_text.lower()
-    if any(w in text for w in ["login", "sign in", "password", "email"]):
-        return "login"
-    if any(w in text for w in ["dashboard", "analytics", "chart", "overview"]):
-        return "dashboard"
-    if any(w in text for w in ["cart", "checkout", "product", "price", "buy"]):
-        return "ecommerce"
-    if any(w in text for w in ["profile", "account", "settings"]):
-        return "profile"
-    return "unknown"
-
-
-def _parse_heuristic_scores(raw_text: str) -> dict:
-    """
-    Attempts to extract numeric heuristic scores from the heuristic agent output.
-    Falls back to None for any score it can't find.
-    Designed to be resilient — will never crash the pipeline.
-    """
-    score_keys = {
-        "visibility_of_system_status": ["visibility", "system status"],
-        "match_with_real_world": ["match", "real world", "metaphor"],
-        "user_control": ["user control", "freedom", "undo"],
-        "consistency": ["consistency", "standards"],
-        "error_prevention": ["error prevention", "error"],
-        "recognition_over_recall": ["recognition", "recall"],
-        "flexibility": ["flexibility", "efficiency", "shortcuts"],
-        "aesthetic_design": ["aesthetic", "minimalist", "design"],
-        "error_recovery": ["error recovery", "recovery", "help users"],
-        "accessibility": ["accessibility", "wcag", "contrast"],
-    }
+    evaluations_collection.create_index([("user_id", DESCENDING)])
+    evaluations_collection.create_index([("evaluation_id", DESCENDING)], unique=True)
+    evaluations_collection.create_index([("timestamps.created_at", DESCENDING)])
+    evaluations_collection.create_index([("status", DESCENDING)])
+    # Serves paginated history: equality on user_id, then the (created_at, evaluation_id) cursor order
+    evaluations_collection.create_index([
+        ("user_id", ASCENDING),
+        ("timestamps.created_at", DESCENDING),
+        ("evaluation_id", DESCENDING),
+    ])
+
+    # Idempotency-Key per user; only evaluations submitted with a key are indexed
+    evaluations_collection.create_index(
+        [("user_id", ASCENDING), ("idempotency_key", ASCENDING)],
+        unique=True,
+        partialFilterExpression={"idempotency_key": {"$type": "string"}},
+    )
 
-    scores = {}
-    for key, keywords in score_keys.items():
-        for keyword in keywords:
-            pattern = rf"{keyword}.*?(\d+)\s*/?\s*10"
-            match = re.search(pattern, raw_text.lower())
-            if match:
-                scores[key] = int(match.group(1))
-                break
-        if key not in scores:
-            scores[key] = None  
+    hitl_metrics_collection.create_index([("day", ASCENDING), ("agent", ASCENDING)])
 
-    return scores
 
+def ping(seconds: float):
+    """One round trip to the server, bounded by `seconds` (readiness probe)."""
+    with mongo_timeout(seconds):
+        client.admin.command("ping")
 
-def _parse_feedback_report(raw_text: str) -> dict:
-    """
-    Attempts to extract structured issues and suggestions from feedback agent output.
-    Returns raw_text plus any structured lists found.
-    """
-    issues = []
-    suggestions = []
-
-    lines = raw_text.split("\n")
-    current_section = None
-
-    for line in lines:
-        line = line.strip()
-        lower = line.lower()
-
-        if any(w in lower for w in ["issue", "problem", "violation", "finding"]):
-            current_section = "issues"
-        elif any(w in lower for w in ["suggestion", "recommendation", "improvement", "fix"]):
-            current_section = "suggestions"
-        elif line.startswith(("-", "•", "*", "–")) or (len(line) > 2 and line[0].isdigit() and line[1] in (".", ")")):
-            content = line.lstrip("-•*–0123456789.) ").strip()
-            if content:
-                if current_section == "issues":
-                    issues.append(content)
-                elif current_section == "suggestions":
-                    suggestions.append(content)
-
-    return {
-        "issues_detected": issues,
-        "suggestions": suggestions,
-        "raw_text": raw_text,
-    }
 
+HITL_ACTIONS = ("agree", "disagree", "modify")
+
+# Lightweight fields used by history lists and `view=summary`
+SUMMARY_PROJECTION = {
+    "_id": 0,
+    "evaluation_id": 1,
+    "user_id": 1,
+    "status": 1,
+    "input": 1,
+    "ai_results.ux_score": 1,
+    "ai_results.feedback_report.issues_detected": 1,
+    "ai_results.improved_design.preview_image_url": 1,
+    "hitl_feedback.review_status": 1,
+    "timestamps": 1,
+}
+
+AI_RESULT_SECTIONS = (
+    "vision_analysis",
+    "heuristic_evaluation",
+    "feedback_report",
+    "improved_design",
+    "ux_score",
+)
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
 
-def _compute_ux_score(scores: dict) -> Optional[float]:
-    """
-    Computes overall UX score as average of available heuristic scores.
-    Returns None if no scores were parsed.
-    """
-    valid = [v for v in scores.values() if v is not None]
-    if not valid:
-        return None
-    return round(sum(valid) / len(valid), 2)
+
+class DuplicateSubmission(ValueError):
+    """Another evaluation of this user already holds the Idempotency-Key."""
 
 
 def create_evaluation_document(
     evaluation_id: str,
     user_id: str,
     screenshot_url: str,
+    idempotency_key: Optional[str] = None,
+    content_hash: Optional[str] = None,
 ) -> bool:
     """
     Creates an evaluation document in 'processing' state when pipeline starts.
     Call this immediately after S3 upload.
+    Raises DuplicateSubmission if idempotency_key is already taken.
     """
     doc = {
         "evaluation_id": evaluation_id,
@@ -136,6 +111,7 @@ def create_evaluation_document(
             "screenshot_url": screenshot_url,
             "screen_type": "unknown",      
             "uploaded_at": _now(),
+            "content_hash": content_hash,
         },
         "status": "processing",
         "ai_results": None,                
@@ -149,19 +125,51 @@ def create_evaluation_document(
             "pipeline_duration_seconds": None,
         },
     }
+    if idempotency_key:
+        doc["idempotency_key"] = idempotency_key
 
-    evaluations_collection.insert_one(doc)
+    try:
+        evaluations_collection.insert_one(doc)
+    except DuplicateKeyError as e:
+        raise DuplicateSubmission(f"Idempotency-Key already used: {idempotency_key}") from e
     return True
 
 
+def find_by_idempotency_key(user_id: str, idempotency_key: str, ttl_hours: float) -> Optional[dict]:
+    """
+    The evaluation submitted with this key, or None. Keys of failed or
+    cancelled evaluations, and keys older than ttl_hours, are released
+    (removed from their evaluation) so the key can start a new run.
+    """
+    doc = evaluations_collection.find_one(
+        {"user_id": user_id, "idempotency_key": idempotency_key},
+        {"_id": 0, "evaluation_id": 1, "status": 1, "input": 1, "timestamps.created_at": 1,
+         "ai_results.feedback_report": 1, "ai_results.improved_design.html_code": 1},
+    )
+    if doc is None:
+        return None
+    created_at = doc["timestamps"]["created_at"]
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)   # pymongo returns naive UTC by default
+    expired = _now() - created_at > timedelta(hours=ttl_hours)
+    if expired or doc.get("status") in ("failed", "cancelled"):
+        evaluations_collection.update_one(
+            {"evaluation_id": doc["evaluation_id"]}, {"$unset": {"idempotency_key": ""}}
+        )
+        return None
+    return doc
+
+
 def complete_evaluation(
     evaluation_id: str,
     tasks_output: list,
     pipeline_duration_seconds: float,
+    metrics: Optional[dict] = None,
 ) -> bool:
     """
     Updates the evaluation document with all agent outputs after pipeline completes.
     Parses raw agent outputs into structured fields automatically.
+    `metrics` is the per-stage breakdown from src.utils.stage_metrics.
     """
     vision_raw    = str(tasks_output[0].raw) if len(tasks_output) > 0 else ""
     heuristic_raw = str(tasks_output[1].raw) if len(tasks_output) > 1 else ""
@@ -169,10 +177,10 @@ def complete_evaluation(
     wireframe_html = str(tasks_output[3].raw) if len(tasks_output) > 3 else ""
 
     # Parse structured data from raw outputs
-    screen_type       = _detect_screen_type(vision_raw)
-    heuristic_scores  = _parse_heuristic_scores(heuristic_raw)
-    feedback_parsed   = _parse_feedback_report(feedback_raw)
-    ux_score          = _compute_ux_score(heuristic_scores)
+    screen_type       = detect_screen_type(vision_raw)
+    heuristic_scores  = parse_heuristic_scores(heuristic_raw)
+    feedback_parsed   = parse_feedback_report(feedback_raw)
+    ux_score          = compute_ux_score(heuristic_scores, parse_overall_score(heuristic_raw))
 
     evaluations_collection.update_one(
         {"evaluation_id": evaluation_id},
@@ -188,29 +196,76 @@ def complete_evaluation(
                 "feedback_report": feedback_parsed,
                 "improved_design": {
                     "html_code": wireframe_html,
+                    "html_sha256": html_hash(wireframe_html or ""),
                     "preview_image_url": None,   
                 },
                 "ux_score": ux_score,
             },
+            "metrics": metrics,
             "timestamps.completed_at": _now(),
             "timestamps.pipeline_duration_seconds": round(pipeline_duration_seconds, 2),
-        }}
+        },
+         # Every stage is in ai_results now
+         "$unset": {"checkpoints": ""}}
     )
     return True
 
 
-def fail_evaluation(evaluation_id: str, error: str) -> bool:
-    """Marks evaluation as failed with error context."""
+def fail_evaluation(evaluation_id: str, error: str, metrics: Optional[dict] = None) -> bool:
+    """Marks evaluation as failed with error context (and the stages that did run)."""
     evaluations_collection.update_one(
         {"evaluation_id": evaluation_id},
         {"$set": {
             "status": "failed",
             "error": error,
+            "metrics": metrics,
             "timestamps.completed_at": _now(),
         }}
     )
     return True
 
+def cancel_evaluation(evaluation_id: str, reason: str, metrics: Optional[dict] = None) -> bool:
+    """Marks evaluation as cancelled (user request or disconnect), keeping the stages that did run."""
+    evaluations_collection.update_one(
+        {"evaluation_id": evaluation_id},
+        {"$set": {
+            "status": "cancelled",
+            "cancel_reason": reason,
+            "metrics": metrics,
+            "timestamps.completed_at": _now(),
+        }}
+    )
+    return True
+
+def save_checkpoint(evaluation_id: str, stage: str, output: str) -> bool:
+    """Persists one completed stage's raw output, so a failed run can resume after it."""
+    evaluations_collection.update_one(
+        {"evaluation_id": evaluation_id},
+        {"$set": {f"checkpoints.{stage}": {"output": output, "saved_at": _now()}}},
+    )
+    return True
+
+
+def get_checkpoints(evaluation_id: str) -> dict:
+    """stage → raw output of the stages an earlier attempt completed."""
+    doc = evaluations_collection.find_one({"evaluation_id": evaluation_id}, {"_id": 0, "checkpoints": 1})
+    return {stage: entry["output"] for stage, entry in ((doc or {}).get("checkpoints") or {}).items()}
+
+
+def restart_evaluation(evaluation_id: str) -> bool:
+    """
+    Moves a failed or cancelled evaluation back to 'processing' for a resume.
+    Atomic: False if it is in any other state (e.g. another resume got there first).
+    """
+    result = evaluations_collection.update_one(
+        {"evaluation_id": evaluation_id, "status": {"$in": ["failed", "cancelled"]}},
+        {"$set": {"status": "processing", "timestamps.resumed_at": _now()},
+         "$unset": {"error": "", "cancel_reason": ""},
+         "$inc": {"attempts": 1}},
+    )
+    return result.modified_count == 1
+
+
 def save_hitl_response(
     evaluation_id: str,
     agent_name: str,
@@ -221,56 +276,192 @@ def save_hitl_response(
 ) -> bool:
     """
     Appends a single HITL response to the evaluation document.
-    Also updates review_status to 'reviewed'.
+    Also updates review_status to 'reviewed' and bumps the pre-aggregated
+    agreement counters in hitl_metrics.
     """
+    reviewed_at = _now()
     response = {
         "agent": agent_name,
         "ai_suggestion": ai_suggestion,
         "user_action": user_action,
         "user_modified_suggestion": user_modified_suggestion,
         "reviewed_by": reviewed_by,
-        "reviewed_at": _now(),
+        "reviewed_at": reviewed_at,
     }
 
-    evaluations_collection.update_one(
+    # Same round-trip returns screen_type for the metrics key
+    doc = evaluations_collection.find_one_and_update(
         {"evaluation_id": evaluation_id},
         {
             "$push": {"hitl_feedback.responses": response},
             "$set":  {"hitl_feedback.review_status": "reviewed"},
-        }
+        },
+        projection={"_id": 0, "input.screen_type": 1},
     )
+    if doc is not None:
+        _increment_hitl_metrics(
+            agent_name=agent_name,
+            screen_type=(doc.get("input") or {}).get("screen_type") or "unknown",
+            user_action=user_action,
+            reviewed_at=reviewed_at,
+        )
     return True
 
 
-def get_evaluation(evaluation_id: str) -> Optional[dict]:
+def _increment_hitl_metrics(agent_name: str, screen_type: str, user_action: str, reviewed_at: datetime):
+    """Atomic $inc upsert — concurrent reviews never lose counts."""
+    day = reviewed_at.strftime("%Y-%m-%d")
+    hitl_metrics_collection.update_one(
+        {"_id": f"{day}|{agent_name}|{screen_type}"},
+        {
+            "$inc": {f"counts.{user_action}": 1, "counts.total": 1},
+            "$setOnInsert": {"day": day, "agent": agent_name, "screen_type": screen_type},
+        },
+        upsert=True,
+    )
+
+
+def get_hitl_metrics(
+    day_from: Optional[str] = None,
+    day_to: Optional[str] = None,
+    agent_name: Optional[str] = None,
+    screen_type: Optional[str] = None,
+) -> dict:
+    """
+    Reads HITL agreement counters for a day range (YYYY-MM-DD, inclusive).
+    Returns the matching rows plus per-agent totals and agreement rates.
+    Reads touch at most days × agents × screen_types small documents.
+    """
+    query = {}
+    if day_from or day_to:
+        query["day"] = {}
+        if day_from:
+            query["day"]["$gte"] = day_from
+        if day_to:
+            query["day"]["$lte"] = day_to
+    if agent_name:
+        query["agent"] = agent_name
+    if screen_type:
+        query["screen_type"] = screen_type
+
+    rows = list(hitl_metrics_collection.find(query, {"_id": 0}).sort("day", ASCENDING))
+
+    by_agent: dict = {}
+    for row in rows:
+        totals = by_agent.setdefault(row["agent"], {a: 0 for a in HITL_ACTIONS} | {"total": 0})
+        for key in (*HITL_ACTIONS, "total"):
+            totals[key] += row.get("counts", {}).get(key, 0)
+    for totals in by_agent.values():
+        totals["agreement_rate"] = round(totals["agree"] / totals["total"], 4) if totals["total"] else None
+
+    return {"rows": rows, "by_agent": by_agent}
+
+
+def set_preview_image(evaluation_id: str, preview_image_url: str, html_sha256: str) -> bool:
+    """
+    Stores the rendered wireframe thumbnail URL alongside the evaluation.
+    False (nothing stored) if the evaluation's wireframe is no longer the
+    rendered one.
+    """
+    result = evaluations_collection.update_one(
+        {"evaluation_id": evaluation_id, "ai_results.improved_design.html_sha256": html_sha256},
+        {"$set": {
+            "ai_results.improved_design.preview_image_url": preview_image_url,
+            "ai_results.improved_design.preview_html_sha256": html_sha256,
+        }}
+    )
+    return result.matched_count > 0
+
+
+def _build_projection(view: str = "full", sections: Optional[list] = None) -> dict:
+    """
+    Builds a Mongo projection for evaluation reads.
+      view="summary" → SUMMARY_PROJECTION only
+      view="full"    → whole document; `sections` limits which ai_results
+                       sections are returned (others are excluded server-side)
+    Raises ValueError for unknown views/sections.
+    """
+    if view == "summary":
+        return dict(SUMMARY_PROJECTION)
+    if view != "full":
+        raise ValueError(f"Unknown view '{view}' (expected: summary | full)")
+
+    projection = {"_id": 0}
+    if sections:
+        unknown = set(sections) - set(AI_RESULT_SECTIONS)
+        if unknown:
+            raise ValueError(f"Unknown ai_results sections: {', '.join(sorted(unknown))}")
+        for section in AI_RESULT_SECTIONS:
+            if section not in sections:
+                projection[f"ai_results.{section}"] = 0
+    return projection
+
+
+def encode_cursor(created_at: datetime, evaluation_id: str) -> str:
+    raw = f"{created_at.isoformat()}|{evaluation_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    """Inverse of encode_cursor. Raises ValueError on malformed cursors."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_at, evaluation_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), evaluation_id
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def _after_cursor(cursor: str, direction: int = DESCENDING) -> dict:
+    """Filter for documents strictly after `cursor` in (created_at, evaluation_id) order."""
+    created_at, evaluation_id = decode_cursor(cursor)
+    op = "$lt" if direction == DESCENDING else "$gt"
+    return {"$or": [
+        {"timestamps.created_at": {op: created_at}},
+        {"timestamps.created_at": created_at, "evaluation_id": {op: evaluation_id}},
+    ]}
+
+
+def get_evaluation(
+    evaluation_id: str,
+    view: str = "full",
+    sections: Optional[list] = None,
+) -> Optional[dict]:
     """Fetch single evaluation by ID. Excludes MongoDB _id."""
     return evaluations_collection.find_one(
         {"evaluation_id": evaluation_id},
-        {"_id": 0}
+        _build_projection(view, sections)
     )
 
 
-def get_user_evaluations(user_id: str, limit: int = 20) -> list:
+def get_user_evaluations(
+    user_id: str,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    view: str = "summary",
+    sections: Optional[list] = None,
+) -> tuple[list, Optional[str]]:
     """
-    Fetch evaluation history for a user.
-    Returns lightweight list (no full html/raw text) for history screen.
+    Fetch evaluation history for a user, newest first.
+    Returns (evaluations, next_cursor); next_cursor is None on the last page.
+    Defaults to the lightweight summary projection for the history screen.
     """
-    projection = {
-        "_id": 0,
-        "evaluation_id": 1,
-        "status": 1,
-        "input": 1,
-        "ai_results.ux_score": 1,
-        "ai_results.feedback_report.issues_detected": 1,
-        "hitl_feedback.review_status": 1,
-        "timestamps": 1,
-    }
-    cursor = evaluations_collection.find(
-        {"user_id": user_id},
-        projection
-    ).sort("timestamps.created_at", DESCENDING).limit(limit)
+    query = {"user_id": user_id}
+    if cursor:
+        query.update(_after_cursor(cursor))
+
+    docs = list(
+        evaluations_collection.find(query, _build_projection(view, sections))
+        .sort([("timestamps.created_at", DESCENDING), ("evaluation_id", DESCENDING)])
+        .limit(limit + 1)
+    )
 
-    return list(cursor)
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        next_cursor = encode_cursor(last["timestamps"]["created_at"], last["evaluation_id"])
+    return docs, next_cursor
 
 
 def get_evaluations_for_analysis(limit: int = 200) -> list:
@@ -286,13 +477,52 @@ def get_evaluations_for_analysis(limit: int = 200) -> list:
     return list(cursor)
 
 
+def iter_evaluations_for_analysis(
+    status: Optional[str] = "completed",
+    user_id: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    after: Optional[str] = None,
+    batch_size: int = 500,
+):
+    """
+    Streams evaluations oldest-first for full dataset export.
+    Iterates a server-side cursor in `batch_size` batches, so memory stays
+    constant regardless of collection size. `after` is a cursor from
+    encode_cursor() to resume an interrupted export.
+    """
+    query = {}
+    if status:
+        query["status"] = status
+    if user_id:
+        query["user_id"] = user_id
+    if created_from or created_to:
+        query["timestamps.created_at"] = {}
+        if created_from:
+            query["timestamps.created_at"]["$gte"] = created_from
+        if created_to:
+            query["timestamps.created_at"]["$lt"] = created_to
+    if after:
+        query = {"$and": [query, _after_cursor(after, ASCENDING)]}
+
+    cursor = evaluations_collection.find(query, {"_id": 0}) \
+        .sort([("timestamps.created_at", ASCENDING), ("evaluation_id", ASCENDING)]) \
+        .batch_size(batch_size)
+    try:
+        for doc in cursor:
+            yield doc
+    finally:
+        cursor.close()
+
+
 def update_wireframe(
     evaluation_id: str,
     new_wireframe: str,
     feedback_comment: str,
     wireframe_comment: str,
     regenerated_by: str,
-    new_feedback: str = None
+    new_feedback: str = None,
+    metrics: dict = None,
 ):
     """
     Updates the improved_design in an existing evaluation when the user triggers regeneration.
@@ -305,6 +535,8 @@ def update_wireframe(
     # Prepare the update document
     update_fields = {
         "ai_results.improved_design.html_code": new_wireframe,
+        "ai_results.improved_design.html_sha256": html_hash(new_wireframe or ""),
+        "ai_results.improved_design.preview_image_url": None,
         "status": "regenerated",
         "timestamps.updated_at": datetime.now(timezone.utc)
     }
@@ -324,6 +556,7 @@ def update_wireframe(
                     "regenerated_by": regenerated_by,
                     "regenerated_at": datetime.now(timezone.utc),
                     "new_feedback_preview": new_feedback[:200] if new_feedback else "N/A",
+                    "metrics": metrics,
                 }
             }
         }
@@ -0,0 +1,83 @@
+"""
+Idempotent /analyze submissions and in-flight deduplication.
+
+Clients retrying on a timeout must not start a second pipeline:
+
+  - Idempotency-Key header: the key is stored on the evaluation (unique per
+    user). A retry gets the completed result, 409 while the run is still
+    processing on another API worker, and 422 if the key is reused for a
+    different image. Keys of failed or cancelled runs, or older than
+    IDEMPOTENCY_TTL_HOURS, start a new run.
+  - Content hash: a submission of the same image by the same user while
+    one is running in this process attaches to that run, key or not.
+
+Each run is a task of its own, shielded from the request that started it:
+when the first client gives up, the run goes on and its retry attaches.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+from typing import Awaitable, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+# ("key" | "content", user_id, value) → (running job, its content hash)
+_inflight: dict[tuple, tuple[asyncio.Task, str]] = {}
+
+
+class KeyReused(ValueError):
+    """The Idempotency-Key belongs to a submission of a different image."""
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _keys(user_id: str, idempotency_key: Optional[str], digest: str) -> list[tuple]:
+    keys = [("content", user_id, digest)]
+    if idempotency_key:
+        keys.insert(0, ("key", user_id, idempotency_key))
+    return keys
+
+
+def find(user_id: str, idempotency_key: Optional[str], digest: str) -> Optional[asyncio.Task]:
+    """The running job for this key or image, if one was started in this process."""
+    for key in _keys(user_id, idempotency_key, digest):
+        job, job_digest = _inflight.get(key, (None, None))
+        if job is None or job.done():
+            continue
+        if job_digest != digest:
+            raise KeyReused("Idempotency-Key was already used for a different image")
+        return job
+    return None
+
+
+def _settle(job: asyncio.Task):
+    # Every caller may have gone away; don't warn about an unretrieved exception
+    if not job.cancelled():
+        job.exception()
+
+
+def start(user_id: str, idempotency_key: Optional[str], digest: str, run: Awaitable) -> asyncio.Task:
+    """Runs `run` as its own task, registered under the key and the image hash until it ends."""
+    job = asyncio.ensure_future(run)
+    keys = _keys(user_id, idempotency_key, digest)
+    for key in keys:
+        _inflight[key] = (job, digest)
+
+    def release(done: asyncio.Task):
+        for key in keys:
+            if _inflight.get(key, (None,))[0] is done:
+                del _inflight[key]
+        _settle(done)
+
+    job.add_done_callback(release)
+    return job
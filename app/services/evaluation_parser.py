@@ -0,0 +1,312 @@
+"""
+Pure parsers that derive structured fields from raw agent outputs.
+Kept free of DB/model imports so they can run in scripts and worker processes.
+"""
+import json
+import re
+from typing import Optional
+
+
+# screen_type labels of the expert datasets (data/ux_expert_evaluation_dataset*.csv)
+SCREEN_TYPES = (
+    "login", "signup", "homescreen", "dashboard", "contentScreen", "ecommerce", "product",
+    "cart", "payment", "search", "filter_state", "profile", "settings", "notifications",
+    "social_media", "chat", "ride_booking", "banking", "health", "fitness", "music_player",
+    "rating", "empty_state", "error_state",
+)
+_COMPACT_SCREEN_TYPES = {re.sub(r"[^a-z0-9]", "", label.lower()): label for label in SCREEN_TYPES}
+_LABEL_WORD = re.compile(r"[a-z0-9]+")
+_CAMEL_CASE = re.compile(r"(?<=[a-z])(?=[A-Z])")
+
+
+def _known_screen_type(reported: str) -> Optional[str]:
+    """
+    Dataset label named by the vision model's own screen_type, e.g.
+    'Login Screen' → login, 'Ride Booking' → ride_booking.
+    """
+    words = _LABEL_WORD.findall(_CAMEL_CASE.sub(" ", reported).lower())
+    if "".join(words) in _COMPACT_SCREEN_TYPES:
+        return _COMPACT_SCREEN_TYPES["".join(words)]
+    for i, word in enumerate(words):
+        # Two-word labels first: 'Home Screen' is homescreen, not an unknown 'home'
+        for candidate in ("".join(words[i:i + 2]), word):
+            if candidate in _COMPACT_SCREEN_TYPES:
+                return _COMPACT_SCREEN_TYPES[candidate]
+    return None
+
+
+def _keyword_screen_type(text: str) -> str:
+    text = text.lower()
+    if any(w in text for w in ["login", "sign in", "password", "email"]):
+        return "login"
+    if any(w in text for w in ["dashboard", "analytics", "chart", "overview"]):
+        return "dashboard"
+    if any(w in text for w in ["cart", "checkout", "product", "price", "buy"]):
+        return "ecommerce"
+    if any(w in text for w in ["profile", "account", "settings"]):
+        return "profile"
+    return "unknown"
+
+
+def detect_screen_type(vision_text: str) -> str:
+    """
+    Screen type from vision agent output.
+    The vision model's own `screen_type` wins when it names a dataset label;
+    otherwise keywords, in that field first, then in the whole output.
+
+    A TF-IDF classifier trained on the expert issue text was tried and
+    dropped: held out per UI (with v1/v2 duplicates removed) it scored 19%
+    against 15% for these keywords, and no labelled vision outputs exist
+    to validate it on what it would actually classify.
+    """
+    data = _load_json_object(vision_text)
+    reported = str((data or {}).get("screen_type") or "")
+    if reported:
+        known = _known_screen_type(reported)
+        if known:
+            return known
+        keyword = _keyword_screen_type(reported)
+        if keyword != "unknown":
+            return keyword
+    return _keyword_screen_type(vision_text)
+
+
+# Keyword priority per score key, used when scanning free-text heuristic output
+HEURISTIC_SCORE_KEYWORDS = {
+    "visibility_of_system_status": ("visibility", "system status"),
+    "match_with_real_world": ("match", "real world", "metaphor"),
+    "user_control": ("user control", "freedom", "undo"),
+    "consistency": ("consistency", "standards"),
+    "error_prevention": ("error prevention", "error"),
+    "recognition_over_recall": ("recognition", "recall"),
+    "flexibility": ("flexibility", "efficiency", "shortcuts"),
+    "aesthetic_design": ("aesthetic", "minimalist", "design"),
+    "error_recovery": ("error recovery", "recovery", "help users"),
+    "accessibility": ("accessibility", "wcag", "contrast"),
+}
+
+# Nielsen ids/names from config/nielsen_heuristics.json → score keys
+_HEURISTIC_IDS = {
+    1: "visibility_of_system_status",
+    2: "match_with_real_world",
+    3: "user_control",
+    4: "consistency",
+    5: "error_prevention",
+    6: "recognition_over_recall",
+    7: "flexibility",
+    8: "aesthetic_design",
+    9: "error_recovery",
+    10: None,   # Help and documentation: no score key of its own
+}
+_HEURISTIC_NAMES = {
+    "visibility of system status": "visibility_of_system_status",
+    "match between system and": "match_with_real_world",
+    "user control and freedom": "user_control",
+    "consistency and standards": "consistency",
+    "error prevention": "error_prevention",
+    "recognition rather than recall": "recognition_over_recall",
+    "flexibility and efficiency": "flexibility",
+    "aesthetic and minimalist": "aesthetic_design",
+    "recover from errors": "error_recovery",
+    "accessibility": "accessibility",
+    "wcag": "accessibility",
+}
+
+_SCORE_PATTERN = re.compile(r"(\d+)\s*/?\s*10")
+_CODE_FENCE    = re.compile(r"```(?:json)?", re.IGNORECASE)
+
+
+def _load_json_object(text: str) -> Optional[dict]:
+    """Best-effort parse of a JSON object from tool output (fences tolerated)."""
+    text = _CODE_FENCE.sub("", text).strip()
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _heuristic_key(item: dict) -> Optional[str]:
+    try:
+        heuristic_id = int(item.get("id"))
+    except (TypeError, ValueError):
+        heuristic_id = None
+    # A known Nielsen id decides, even when it has no score key (10)
+    if heuristic_id in _HEURISTIC_IDS:
+        return _HEURISTIC_IDS[heuristic_id]
+    name = str(item.get("name") or item.get("heuristic") or "").lower()
+    for fragment, key in _HEURISTIC_NAMES.items():
+        if fragment in name:
+            return key
+    return None
+
+
+def _item_score(item: dict) -> Optional[int]:
+    """
+    Explicit 0–10 `score` wins; otherwise a 0–4 Nielsen `severity` maps to
+    10 − 2·severity (same scale as the expert dataset migration).
+    """
+    score = item.get("score")
+    if isinstance(score, (int, float)) and 0 <= score <= 10:
+        return int(round(score))
+    severity = item.get("severity")
+    if isinstance(severity, (int, float)) and 0 <= severity <= 4:
+        return int(round(10 - severity * 2))
+    return None
+
+
+def _scores_from_heuristic_json(data: dict) -> dict:
+    scores = dict.fromkeys(HEURISTIC_SCORE_KEYWORDS)
+    # Violations first: if a heuristic appears in both lists, the violation score counts
+    for item in (data.get("violations") or []) + (data.get("strengths") or []):
+        if not isinstance(item, dict):
+            continue
+        key = _heuristic_key(item)
+        if key and scores[key] is None:
+            scores[key] = _item_score(item)
+    return scores
+
+
+def _scan_heuristic_scores(raw_text: str) -> dict:
+    """
+    Single pass over the lines of free-text output.
+    For each key, the highest-priority keyword that is followed by an
+    "N/10" score on the same line wins; earliest line breaks ties.
+    Lines without a "10" are skipped before any keyword search.
+    """
+    found = {}   # key -> (keyword priority, score)
+    for line in raw_text.lower().splitlines():
+        if "10" not in line or not _SCORE_PATTERN.search(line):
+            continue
+        for key, keywords in HEURISTIC_SCORE_KEYWORDS.items():
+            best = found.get(key)
+            for priority in range(best[0] if best else len(keywords)):
+                keyword = keywords[priority]
+                pos = line.find(keyword)
+                if pos == -1:
+                    continue
+                match = _SCORE_PATTERN.search(line, pos + len(keyword))
+                if match:
+                    found[key] = (priority, int(match.group(1)))
+                    break
+        if len(found) == len(HEURISTIC_SCORE_KEYWORDS) and all(p == 0 for p, _ in found.values()):
+            break
+
+    return {key: found[key][1] if key in found else None for key in HEURISTIC_SCORE_KEYWORDS}
+
+
+def parse_heuristic_scores(raw_text: str) -> dict:
+    """
+    Attempts to extract numeric heuristic scores from the heuristic agent output.
+    Prefers the structured JSON returned by evaluate_heuristics and only
+    scans free text when the output isn't JSON.
+    Falls back to None for any score it can't find.
+    Designed to be resilient — will never crash the pipeline.
+    """
+    try:
+        data = _load_json_object(raw_text)
+        if data is not None and ("violations" in data or "strengths" in data):
+            return _scores_from_heuristic_json(data)
+        return _scan_heuristic_scores(raw_text)
+    except Exception:
+        return dict.fromkeys(HEURISTIC_SCORE_KEYWORDS)
+
+
+def parse_feedback_report(raw_text: str) -> dict:
+    """
+    Attempts to extract structured issues and suggestions from feedback agent output.
+    Returns raw_text plus any structured lists found.
+    """
+    issues = []
+    suggestions = []
+
+    lines = raw_text.split("\n")
+    current_section = None
+
+    for line in lines:
+        line = line.strip()
+        lower = line.lower()
+
+        if any(w in lower for w in ["issue", "problem", "violation", "finding"]):
+            current_section = "issues"
+        elif any(w in lower for w in ["suggestion", "recommendation", "improvement", "fix"]):
+            current_section = "suggestions"
+        elif line.startswith(("-", "•", "*", "–")) or (len(line) > 2 and line[0].isdigit() and line[1] in (".", ")")):
+            content = line.lstrip("-•*–0123456789.) ").strip()
+            if content:
+                if current_section == "issues":
+                    issues.append(content)
+                elif current_section == "suggestions":
+                    suggestions.append(content)
+
+    return {
+        "issues_detected": issues,
+        "suggestions": suggestions,
+        "raw_text": raw_text,
+    }
+
+
+def parse_overall_score(raw_text: str) -> Optional[float]:
+    """
+    The model's own `overall_score` from evaluate_heuristics JSON, on the
+    0–10 scale of the heuristic scores (0–100 values are divided by 10).
+    None when the output isn't JSON or carries no usable score.
+    """
+    try:
+        data = _load_json_object(raw_text)
+    except Exception:
+        return None
+    score = (data or {}).get("overall_score")
+    if isinstance(score, bool) or not isinstance(score, (int, float)) or not 0 <= score <= 100:
+        return None
+    return round(score / 10 if score > 10 else score, 2)
+
+
+def compute_ux_score(scores: dict, overall: Optional[float] = None) -> Optional[float]:
+    """
+    Computes overall UX score as average of available heuristic scores.
+    Items of evaluate_heuristics usually carry only id/name/comment, so
+    without any parsed score the model's `overall` (parse_overall_score) is used.
+    Returns None if neither is available.
+    """
+    valid = [v for v in scores.values() if v is not None]
+    if not valid:
+        return overall
+    return round(sum(valid) / len(valid), 2)
+
+
+# Projection of the raw agent outputs that derived fields are computed from
+DERIVATION_SOURCE_FIELDS = {
+    "ai_results.vision_analysis": 1,
+    "ai_results.heuristic_evaluation.raw_text": 1,
+    "ai_results.feedback_report.raw_text": 1,
+}
+
+
+def derive_fields(doc: dict) -> dict:
+    """
+    Recomputes every parser-derived field of an evaluation from its raw
+    agent outputs. Returns a `$set` document (dotted paths).
+    """
+    ai        = doc.get("ai_results") or {}
+    heuristic = ai.get("heuristic_evaluation") or {}
+    feedback  = ai.get("feedback_report") or {}
+
+    heuristic_raw = heuristic.get("raw_text") or ""
+    scores = parse_heuristic_scores(heuristic_raw)
+    parsed = parse_feedback_report(feedback.get("raw_text") or "")
+    return {
+        "input.screen_type": detect_screen_type(ai.get("vision_analysis") or ""),
+        "ai_results.heuristic_evaluation.scores": scores,
+        "ai_results.feedback_report.issues_detected": parsed["issues_detected"],
+        "ai_results.feedback_report.suggestions": parsed["suggestions"],
+        "ai_results.ux_score": compute_ux_score(scores, parse_overall_score(heuristic_raw)),
+    }
+
+
+def derive_fields_batch(docs: list) -> list:
+    """[(_id, $set fields)] for a batch — the unit of work for reprocessing pools."""
+    return [(doc["_id"], derive_fields(doc)) for doc in docs]
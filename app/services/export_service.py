@@ -0,0 +1,95 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterable, Iterator
+
+from app.services.database import encode_cursor
+
+# Flat columns for spreadsheet / pandas analysis of HITL agreement
+CSV_COLUMNS = [
+    "evaluation_id",
+    "user_id",
+    "status",
+    "screen_type",
+    "screenshot_url",
+    "ux_score",
+    "issues_detected",
+    "suggestions",
+    "review_status",
+    "hitl_responses",
+    "hitl_agree",
+    "hitl_disagree",
+    "hitl_modify",
+    "regenerations",
+    "created_at",
+    "completed_at",
+    "pipeline_duration_seconds",
+    "cursor",
+]
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _doc_cursor(doc: dict) -> str | None:
+    created_at = (doc.get("timestamps") or {}).get("created_at")
+    if not created_at:
+        return None
+    return encode_cursor(created_at, doc["evaluation_id"])
+
+
+def _flatten(doc: dict) -> dict:
+    ai        = doc.get("ai_results") or {}
+    feedback  = ai.get("feedback_report") or {}
+    hitl      = doc.get("hitl_feedback") or {}
+    responses = hitl.get("responses") or []
+    ts        = doc.get("timestamps") or {}
+    actions   = [r.get("user_action") for r in responses]
+    return {
+        "evaluation_id":             doc.get("evaluation_id"),
+        "user_id":                   doc.get("user_id"),
+        "status":                    doc.get("status"),
+        "screen_type":               (doc.get("input") or {}).get("screen_type"),
+        "screenshot_url":            (doc.get("input") or {}).get("screenshot_url"),
+        "ux_score":                  ai.get("ux_score"),
+        "issues_detected":           len(feedback.get("issues_detected") or []),
+        "suggestions":               len(feedback.get("suggestions") or []),
+        "review_status":             hitl.get("review_status"),
+        "hitl_responses":            len(responses),
+        "hitl_agree":                actions.count("agree"),
+        "hitl_disagree":             actions.count("disagree"),
+        "hitl_modify":               actions.count("modify"),
+        "regenerations":             len(doc.get("regeneration_history") or []),
+        "created_at":                _json_default(ts["created_at"]) if ts.get("created_at") else "",
+        "completed_at":              _json_default(ts["completed_at"]) if ts.get("completed_at") else "",
+        "pipeline_duration_seconds": ts.get("pipeline_duration_seconds"),
+        "cursor":                    _doc_cursor(doc),
+    }
+
+
+def stream_ndjson(docs: Iterable[dict]) -> Iterator[bytes]:
+    """
+    One full evaluation document per line. Each line carries `_cursor`;
+    pass the last received value as `after` to resume an interrupted export.
+    """
+    for doc in docs:
+        doc["_cursor"] = _doc_cursor(doc)
+        yield (json.dumps(doc, default=_json_default, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def stream_csv(docs: Iterable[dict]) -> Iterator[bytes]:
+    """Flattened per-evaluation rows; the `cursor` column resumes like NDJSON `_cursor`."""
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=CSV_COLUMNS)
+    writer.writeheader()
+    for doc in docs:
+        writer.writerow(_flatten(doc))
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate(0)
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
@@ -0,0 +1,170 @@
+"""
+Liveness and readiness of an API process.
+
+    GET /healthz   alive: the event loop answers and the pipeline pool isn't
+                   broken (a broken process pool never recovers: restart)
+    GET /readyz    should get traffic: pipeline pool warmed up, admission
+                   queue not full, required dependencies reachable, Mongo
+                   indexes created (when mongo is required)
+
+Both report pool status, queue depth and worker utilization. /readyz adds
+latency probes for Mongo, S3 and the model of every stage tier. Probes run
+in the threadpool with a timeout. Their results are cached, so a load
+balancer polling every second costs one round trip per dependency per TTL,
+and concurrent checks share a probe in flight.
+
+    HEALTH_PROBE_TTL_SECONDS=15
+    HEALTH_PROBE_TIMEOUT_SECONDS=3
+    READY_REQUIRED_PROBES=mongo    comma-separated: mongo, s3, models
+                                   (models: every stage has a reachable tier);
+                                   the other probes are reported only
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Callable
+
+from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
+
+from app.services import database, s3_service
+from app.services.metrics_service import observe_probe
+from app.services.pipeline_workers import pool_status
+from app.services.scheduler import scheduler
+from src.utils import model_backends, model_cascade
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+HEALTH_PROBE_TTL_SECONDS     = float(os.getenv("HEALTH_PROBE_TTL_SECONDS", "15"))
+HEALTH_PROBE_TIMEOUT_SECONDS = float(os.getenv("HEALTH_PROBE_TIMEOUT_SECONDS", "3"))
+READY_REQUIRED_PROBES        = {p.strip() for p in os.getenv("READY_REQUIRED_PROBES", "mongo").split(",") if p.strip()}
+
+_started = time.monotonic()
+# probe name → (monotonic time, result)
+_cache: dict[str, tuple[float, dict]] = {}
+_inflight: dict[str, asyncio.Task] = {}
+# Outcome of the startup index creation (retried in the background until it succeeds)
+_indexes = {"ok": False, "error": "not created yet"}
+
+
+def set_indexes(error: str | None):
+    """Records the last ensure_indexes attempt: None when it succeeded."""
+    _indexes.update(ok=error is None, error=error)
+
+
+async def _run_probe(name: str, check: Callable) -> dict:
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(run_in_threadpool(check), HEALTH_PROBE_TIMEOUT_SECONDS)
+        result = {"ok": True, "error": None}
+    except asyncio.TimeoutError:
+        result = {"ok": False, "error": f"no answer within {HEALTH_PROBE_TIMEOUT_SECONDS:g}s"}
+    except Exception as e:
+        result = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    seconds = time.perf_counter() - started
+    result["latency_ms"] = round(seconds * 1000, 1)
+    result["checked_at"] = datetime.now(timezone.utc).isoformat()
+    if not result["ok"]:
+        logger.warning("[HEALTH] Probe %s failed: %s", name, result["error"])
+    _cache[name] = (time.monotonic(), result)
+    observe_probe(name, result["ok"], seconds)
+    return result
+
+
+async def probe(name: str, check: Callable) -> dict:
+    """check() (blocking, raises on failure) timed, cached for HEALTH_PROBE_TTL_SECONDS."""
+    cached = _cache.get(name)
+    if cached is not None and time.monotonic() - cached[0] < HEALTH_PROBE_TTL_SECONDS:
+        return cached[1]
+    task = _inflight.get(name)
+    if task is None:
+        task = asyncio.ensure_future(_run_probe(name, check))
+        _inflight[name] = task
+        task.add_done_callback(lambda _: _inflight.pop(name, None))
+    # A caller that goes away doesn't cancel the probe the others wait on
+    return await asyncio.shield(task)
+
+
+def _model_targets() -> dict[str, dict[str, tuple[str, str]]]:
+    """stage → {"backend:model": (backend, model)} for every tier of its cascade."""
+    targets = {}
+    for stage in model_backends.STAGE_DEFAULTS:
+        targets[stage] = {}
+        for tier in model_cascade.tiers(stage):
+            backend, model = model_backends.resolve(stage, tier)
+            targets[stage][f"{backend}:{model}"] = (backend, model)
+    return targets
+
+
+def _load() -> dict:
+    pool = pool_status()
+    stats = scheduler.stats()
+    capacity = pool["workers"] or scheduler.max_concurrent
+    return {
+        "pool": pool,
+        "queue": {
+            "running": sum(c["running"] for c in stats.values()),
+            "queued": scheduler.queued(),
+            "max_queued": scheduler.max_queued,
+            "classes": stats,
+        },
+        "utilization": round(pool["busy"] / capacity, 3) if capacity else 0.0,
+    }
+
+
+def liveness() -> dict:
+    load = _load()
+    return {
+        "status": "failing" if load["pool"]["broken"] else "ok",
+        "uptime_seconds": round(time.monotonic() - _started, 1),
+        **load,
+    }
+
+
+async def readiness() -> dict:
+    load = _load()
+    targets = _model_targets()
+    models = {name: target for tiers in targets.values() for name, target in tiers.items()}
+
+    names = ["mongo", "s3", *models]
+    checks = [
+        lambda: database.ping(HEALTH_PROBE_TIMEOUT_SECONDS),
+        s3_service.check_bucket,
+        *(lambda target=target: model_backends.probe(*target) for target in models.values()),
+    ]
+    results = dict(zip(names, await asyncio.gather(*(probe(n, c) for n, c in zip(names, checks)))))
+
+    # A stage can serve while any tier of its cascade answers
+    stages = {stage: any(results[name]["ok"] for name in tiers) for stage, tiers in targets.items()}
+
+    reasons = []
+    if load["pool"]["broken"]:
+        reasons.append("pipeline pool broken")
+    elif not load["pool"]["warm"]:
+        reasons.append("pipeline pool warming up")
+    if load["queue"]["queued"] >= scheduler.max_queued:
+        reasons.append("admission queue full")
+    for name in ("mongo", "s3"):
+        if name in READY_REQUIRED_PROBES and not results[name]["ok"]:
+            reasons.append(f"{name} unreachable")
+    if "mongo" in READY_REQUIRED_PROBES and not _indexes["ok"]:
+        reasons.append("mongo indexes not created")
+    if "models" in READY_REQUIRED_PROBES:
+        reasons.extend(f"no reachable model for {stage}" for stage, ok in stages.items() if not ok)
+
+    return {
+        "ready": not reasons,
+        "reasons": reasons,
+        **load,
+        "indexes": dict(_indexes),
+        "probes": {
+            "mongo": results["mongo"],
+            "s3": results["s3"],
+            "models": {name: results[name] for name in models},
+            "stages": stages,
+        },
+    }
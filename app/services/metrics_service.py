@@ -0,0 +1,65 @@
+"""
+Prometheus exposition of per-stage pipeline metrics.
+
+observe_run() takes the dict produced by PipelineMetrics.to_dict() after a
+pipeline or regeneration finishes; GET /metrics serves the registry.
+Scheduler and readiness-probe gauges are set as they change.
+"""
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Model calls take seconds to minutes; DB/upload stages milliseconds
+_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+PIPELINE_SECONDS = Histogram(
+    "heuruxagent_pipeline_seconds", "End-to-end pipeline wall time", ["kind", "status"], buckets=_BUCKETS,
+)
+STAGE_SECONDS = Histogram(
+    "heuruxagent_stage_seconds", "Wall time per pipeline stage", ["kind", "stage"], buckets=_BUCKETS,
+)
+MODEL_SECONDS = Histogram(
+    "heuruxagent_model_seconds", "Model latency per pipeline stage (all calls of one run)", ["kind", "stage"],
+    buckets=_BUCKETS,
+)
+MODEL_CALLS = Counter("heuruxagent_model_calls_total", "Model calls", ["stage"])
+TOKENS = Counter("heuruxagent_tokens_total", "Model tokens", ["stage", "direction"])
+RETRIES = Counter("heuruxagent_retries_total", "Model call retries", ["stage"])
+ESCALATIONS = Counter("heuruxagent_escalations_total", "Moves to a larger model tier", ["stage"])
+SERVED = Counter("heuruxagent_served_total", "Stage outputs by the model tier that produced them",
+                 ["stage", "model", "tier"])
+CACHE_HITS = Counter("heuruxagent_cache_hits_total", "Cache hits that skipped work", ["stage"])
+COST_USD = Counter("heuruxagent_cost_usd_total", "Estimated model cost (MODEL_PRICES)", ["stage"])
+SCHED_RUNNING = Gauge("heuruxagent_scheduler_running", "Pipeline runs in flight", ["priority"])
+SCHED_QUEUED = Gauge("heuruxagent_scheduler_queued", "Pipeline runs waiting for a slot", ["priority"])
+PROBE_UP = Gauge("heuruxagent_probe_up", "Last readiness probe of a dependency succeeded (1) or not (0)", ["probe"])
+PROBE_SECONDS = Gauge("heuruxagent_probe_seconds", "Latency of the last readiness probe of a dependency", ["probe"])
+
+
+def observe_run(metrics: dict, duration_seconds: float, kind: str = "analyze", status: str = "completed"):
+    PIPELINE_SECONDS.labels(kind, status).observe(duration_seconds)
+    for stage, values in (metrics or {}).get("stages", {}).items():
+        STAGE_SECONDS.labels(kind, stage).observe(values["wall_seconds"])
+        if values["model_calls"]:
+            MODEL_SECONDS.labels(kind, stage).observe(values["model_seconds"])
+            MODEL_CALLS.labels(stage).inc(values["model_calls"])
+        TOKENS.labels(stage, "input").inc(values["input_tokens"])
+        TOKENS.labels(stage, "output").inc(values["output_tokens"])
+        RETRIES.labels(stage).inc(values["retries"])
+        ESCALATIONS.labels(stage).inc(values.get("escalations", 0))
+        CACHE_HITS.labels(stage).inc(values["cache_hits"])
+        COST_USD.labels(stage).inc(values["cost_usd"])
+    for stage, served in (metrics or {}).get("served_by", {}).items():
+        SERVED.labels(stage, served["model"], str(served["tier"])).inc()
+
+
+def observe_scheduler(priority: str, running: int, queued: int):
+    SCHED_RUNNING.labels(priority).set(running)
+    SCHED_QUEUED.labels(priority).set(queued)
+
+
+def observe_probe(probe: str, ok: bool, seconds: float):
+    PROBE_UP.labels(probe).set(1 if ok else 0)
+    PROBE_SECONDS.labels(probe).set(seconds)
+
+
+def render_latest() -> tuple[bytes, str]:
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,335 @@
+"""
+Where crew pipelines run.
+
+By default they run in the API's threadpool. With PIPELINE_EXECUTOR=process
+they run in a pool of worker processes instead, so agent orchestration,
+image decoding and JSON/markdown building don't compete with the event
+loop for the GIL, and pipeline capacity scales apart from the API.
+
+    PIPELINE_EXECUTOR=thread          thread | process
+    PIPELINE_WORKERS_PER_CORE=1       process pool size = cores × this (at least 1)
+    PIPELINE_WORKERS=                 explicit pool size, overrides the above
+    PIPELINE_WORKER_INIT=             "module:function" run once in each worker
+                                      (the benchmark installs its fake models this way)
+
+Workers are spawned, because the API process runs threads. A job returns a
+PipelineResult holding the raw task outputs and the stage metrics recorded
+in the worker. Those metrics are merged into the caller's recorder. Progress
+from a worker's safe_emit goes onto a multiprocessing queue. A drain thread
+in the API process re-emits it, so it reaches the websocket bus as before.
+Stage checkpoints (src.utils.checkpoint) take the same queue.
+The caller's trace context goes with each job, so the worker's spans join
+the request's trace. A run's cancel token (src.utils.cancellation) is
+mirrored into the worker through a Manager Event.
+"""
+import asyncio
+import importlib
+import logging
+import math
+import multiprocessing
+import os
+import sys
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+from opentelemetry import context as otel_context
+from opentelemetry import propagate
+from starlette.concurrency import run_in_threadpool
+
+from src.utils import cancellation, checkpoint
+from src.utils.cancellation import EvaluationCancelled
+from src.utils.stage_metrics import current, start_run
+from src.utils.tracing import bind_evaluation, span
+from src.ws_manager import safe_emit, set_emit_sink
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+
+PIPELINE_EXECUTOR         = os.getenv("PIPELINE_EXECUTOR", "thread").lower()
+PIPELINE_WORKERS_PER_CORE = float(os.getenv("PIPELINE_WORKERS_PER_CORE", "1"))
+PIPELINE_WORKERS          = int(os.getenv("PIPELINE_WORKERS") or 0)
+PIPELINE_WORKER_INIT      = os.getenv("PIPELINE_WORKER_INIT", "")
+# How long a finished job waits for its last progress events to be re-emitted
+PROGRESS_FLUSH_TIMEOUT    = 5.0
+
+_JOBS = {
+    "full": "run_full_ux_pipeline_raw",
+    "regen": "run_wireframe_regen_raw",
+}
+
+
+@dataclass
+class TaskResult:
+    raw: str
+
+
+@dataclass
+class PipelineResult:
+    """Picklable stand-in for crewai's CrewOutput, holding only what the API reads."""
+    tasks_output: list[TaskResult]
+    metrics: dict = field(default_factory=dict)
+
+
+class PipelineJobError(RuntimeError):
+    """A pipeline failure raised in a worker, with the metrics recorded before it."""
+
+    def __init__(self, message: str, metrics: Optional[dict] = None):
+        super().__init__(message)
+        self.metrics = metrics or {}
+
+    def __reduce__(self):
+        return type(self), (str(self), self.metrics)
+
+
+def pipeline_workers() -> int:
+    if PIPELINE_WORKERS > 0:
+        return PIPELINE_WORKERS
+    return max(1, math.floor((os.cpu_count() or 1) * PIPELINE_WORKERS_PER_CORE))
+
+
+# Worker process side
+
+_worker_queue = None
+
+
+def _init_worker(progress_queue, init_hook: str):
+    global _worker_queue
+    _worker_queue = progress_queue
+    for path in (ROOT_DIR, ROOT_DIR / "src"):
+        if str(path) not in sys.path:
+            sys.path.append(str(path))
+
+    from src.utils.log_config import configure_logging
+    from src.utils.tracing import setup_tracing
+
+    configure_logging()
+    setup_tracing()
+    set_emit_sink(lambda *event: progress_queue.put(("progress", *event)))
+    checkpoint.set_sink(lambda *saved: progress_queue.put(("checkpoint", *saved)))
+    if init_hook:
+        module, function = init_hook.split(":", 1)
+        getattr(importlib.import_module(module), function)()
+
+
+def _warm_worker() -> int:
+    # Imports crewai and the tools once, before the first job needs them
+    from ux_feedback_crew import crew_pipeline  # noqa: F401
+    return os.getpid()
+
+
+def _run_job(kind: str, args: tuple, evaluation_id: str, carrier: dict, flush_token: str,
+             cancel_event=None) -> PipelineResult:
+    from ux_feedback_crew import crew_pipeline
+
+    metrics = start_run(evaluation_id)
+    bind_evaluation(evaluation_id)
+    if cancel_event is not None:
+        cancellation.bind(evaluation_id, cancel_event)
+    token = otel_context.attach(propagate.extract(carrier))
+    try:
+        with span(f"worker.{kind}", **{"process.pid": os.getpid()}):
+            output = getattr(crew_pipeline, _JOBS[kind])(*args)
+        return PipelineResult([TaskResult(str(t.raw)) for t in output.tasks_output], metrics.to_dict())
+    except EvaluationCancelled as e:
+        e.metrics = metrics.to_dict()
+        raise
+    except Exception as e:
+        # crewai/model exceptions aren't reliably picklable; send their text back
+        raise PipelineJobError(f"{type(e).__name__}: {e}", metrics.to_dict()) from None
+    finally:
+        otel_context.detach(token)
+        # Queued after every progress event of this job
+        _worker_queue.put(("flushed", flush_token))
+
+
+# API process side
+
+_executor: Optional[ProcessPoolExecutor] = None
+_sync_manager = None   # serves the cancel events shared with workers
+_progress_queue = None
+_drain_thread: Optional[threading.Thread] = None
+_flush_waiters: dict[str, tuple[asyncio.AbstractEventLoop, asyncio.Future]] = {}
+_warm_thread: Optional[threading.Thread] = None   # thread executor: crew import at startup
+_warm_futures: list = []                          # process executor: one warm-up job per worker
+_warm_error: Optional[BaseException] = None
+_busy = 0                                         # jobs in flight; updated on the event loop only
+
+
+def _drain_progress(progress_queue):
+    while True:
+        event = progress_queue.get()
+        if event is None:
+            return
+        if event[0] == "checkpoint":
+            checkpoint.save(*event[1:])
+            continue
+        if event[0] == "flushed":
+            waiter = _flush_waiters.pop(event[1], None)
+            if waiter is not None:
+                loop, future = waiter
+                loop.call_soon_threadsafe(lambda f=future: f.done() or f.set_result(None))
+            continue
+        _, client_id, message, step, evaluation_id = event
+        safe_emit(client_id, message, step, evaluation_id=evaluation_id)
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor, _sync_manager, _progress_queue, _drain_thread
+    if _executor is None:
+        # spawn: the API process runs threads, forking it is not safe
+        ctx = multiprocessing.get_context("spawn")
+        _sync_manager = ctx.Manager()
+        _progress_queue = ctx.Queue()
+        _drain_thread = threading.Thread(target=_drain_progress, args=(_progress_queue,),
+                                         name="pipeline-progress", daemon=True)
+        _drain_thread.start()
+        _executor = ProcessPoolExecutor(
+            max_workers=pipeline_workers(),
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(_progress_queue, PIPELINE_WORKER_INIT),
+        )
+    return _executor
+
+
+def _warm_in_thread():
+    global _warm_error
+    try:
+        _warm_worker()
+    except Exception as e:
+        _warm_error = e
+        logger.error("[WORKERS] Importing the crew failed: %s", e)
+
+
+def pool_status() -> dict:
+    """Executor health for readiness checks: warmed up, usable, and how busy."""
+    if PIPELINE_EXECUTOR == "process":
+        # Set by ProcessPoolExecutor once a worker died; every later submit fails
+        broken = bool(_executor is not None and getattr(_executor, "_broken", False))
+        warm = bool(_warm_futures) and all(
+            f.done() and not f.cancelled() and f.exception() is None for f in _warm_futures
+        )
+        workers = pipeline_workers()
+    else:
+        broken = _warm_error is not None
+        warm = _warm_thread is not None and not _warm_thread.is_alive()
+        workers = None   # the API's threadpool
+    return {
+        "executor": PIPELINE_EXECUTOR,
+        "workers": workers,
+        "busy": _busy,
+        "warm": warm,
+        "broken": broken,
+        "ready": warm and not broken,
+    }
+
+
+def start_pipeline_pool():
+    """
+    Spawns and warms every worker at startup. With the thread executor,
+    imports the crew in a background thread instead: the API serves
+    requests meanwhile, and the first pipeline waits on the import lock.
+    """
+    global _warm_thread
+    if PIPELINE_EXECUTOR != "process":
+        _warm_thread = threading.Thread(target=_warm_in_thread, name="pipeline-warmup", daemon=True)
+        _warm_thread.start()
+        return
+    executor = _get_executor()
+    _warm_futures[:] = [executor.submit(_warm_worker) for _ in range(pipeline_workers())]
+    logger.info("[WORKERS] Pipeline pool: %d processes", pipeline_workers())
+
+
+def shutdown_pipeline_pool():
+    global _executor, _sync_manager, _drain_thread
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+    if _sync_manager is not None:
+        _sync_manager.shutdown()
+        _sync_manager = None
+    if _drain_thread is not None:
+        _progress_queue.put(None)
+        _drain_thread.join(timeout=PROGRESS_FLUSH_TIMEOUT)
+        _drain_thread = None
+
+
+async def _submit(kind: str, evaluation_id: str, *args) -> PipelineResult:
+    loop = asyncio.get_running_loop()
+    carrier = {}
+    propagate.inject(carrier)
+    flush_token = f"flush:{uuid.uuid4()}"
+    flushed = loop.create_future()
+    _flush_waiters[flush_token] = (loop, flushed)
+
+    async def wait_flushed():
+        # Progress of this job reaches the bus before the caller's final event
+        try:
+            await asyncio.wait_for(flushed, PROGRESS_FLUSH_TIMEOUT)
+        except asyncio.TimeoutError:
+            _flush_waiters.pop(flush_token, None)
+            logger.warning("[WORKERS] Progress of %s not flushed within %.0fs", evaluation_id, PROGRESS_FLUSH_TIMEOUT)
+
+    executor = _get_executor()
+    token = cancellation.get(evaluation_id)
+    cancel_event = None
+    if token is not None:
+        cancel_event = _sync_manager.Event()
+        token.attach_remote(cancel_event)
+
+    metrics = current()
+    try:
+        result = await asyncio.wrap_future(
+            executor.submit(_run_job, kind, args, evaluation_id, carrier, flush_token, cancel_event)
+        )
+    except (PipelineJobError, EvaluationCancelled) as e:
+        await wait_flushed()
+        if metrics is not None:
+            metrics.merge(getattr(e, "metrics", None))
+        raise
+    except BaseException:
+        # Worker died or the request was cancelled: no flush marker to wait for
+        _flush_waiters.pop(flush_token, None)
+        raise
+
+    await wait_flushed()
+    if metrics is not None:
+        metrics.merge(result.metrics)
+    return result
+
+
+@contextmanager
+def _counted():
+    global _busy
+    _busy += 1
+    try:
+        yield
+    finally:
+        _busy -= 1
+
+
+async def run_full_pipeline(image_path: str, client_id: str, evaluation_id: str, restored: dict | None = None):
+    """Vision → Heuristics → Feedback → Wireframe, on the configured executor."""
+    with _counted():
+        if PIPELINE_EXECUTOR == "process":
+            return await _submit("full", evaluation_id, image_path, client_id, evaluation_id, restored)
+        from ux_feedback_crew.crew_pipeline import run_full_ux_pipeline_raw
+        return await run_in_threadpool(run_full_ux_pipeline_raw, image_path, client_id, evaluation_id, restored)
+
+
+async def run_wireframe_regen(client_id: str, evaluation_id: str, *args):
+    """Wireframe-only regeneration; args as crew_pipeline.run_wireframe_regen_raw after evaluation_id."""
+    with _counted():
+        if PIPELINE_EXECUTOR == "process":
+            return await _submit("regen", evaluation_id, client_id, evaluation_id, *args)
+        from ux_feedback_crew.crew_pipeline import run_wireframe_regen_raw
+        return await run_in_threadpool(run_wireframe_regen_raw, client_id, evaluation_id, *args)
@@ -0,0 +1,363 @@
+import asyncio
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from src.utils.http_client import evict
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RENDER_WORKERS     = int(os.getenv("RENDER_WORKERS", "2"))
+RENDER_MAX_PENDING = int(os.getenv("RENDER_MAX_PENDING", str(RENDER_WORKERS * 4)))
+RENDER_CACHE_DIR   = Path(os.getenv("RENDER_CACHE_DIR", "data/outputs/previews"))
+# Every wireframe version has its own hash, so the cache is capped (least recently used go first)
+RENDER_CACHE_MAX_BYTES = int(float(os.getenv("RENDER_CACHE_MAX_MB", "200")) * 1024 * 1024)
+THUMBNAIL_WIDTH    = int(os.getenv("PREVIEW_THUMBNAIL_WIDTH", "240"))
+
+# Wireframes are generated mobile-first at 375px (see wireframe_tool prompt)
+VIEWPORT_WIDTH  = 375
+VIEWPORT_HEIGHT = 812
+
+_SKIP_TAGS   = {"head", "title", "style", "script", "noscript", "svg", "template"}
+_VOID_TAGS   = {"input", "img", "br", "hr", "meta", "link", "source"}
+_INLINE_TAGS = {"span", "a", "strong", "b", "em", "i", "small", "label", "sup", "sub", "u", "code"}
+_HEADING_SIZES = {"h1": 22, "h2": 19, "h3": 17, "h4": 15, "h5": 14, "h6": 13}
+_BODY_SIZE = 12
+
+_HEX_COLOR   = re.compile(r"#([0-9a-fA-F]{6}|[0-9a-fA-F]{3})\b")
+_BG_DECL     = re.compile(r"background(?:-color)?\s*:\s*([^;]+)", re.IGNORECASE)
+_COLOR_DECL  = re.compile(r"(?<![-\w])color\s*:\s*([^;]+)", re.IGNORECASE)
+_CLASS_RULE  = re.compile(r"\.([\w-]+)\s*\{([^}]*)\}")
+
+
+# HTML → box tree
+
+class _Node:
+    __slots__ = ("tag", "classes", "style", "attrs", "children")
+
+    def __init__(self, tag: str, attrs: dict):
+        self.tag      = tag
+        self.attrs    = attrs
+        self.classes  = (attrs.get("class") or "").split()
+        self.style    = attrs.get("style") or ""
+        self.children = []   # _Node | str
+
+
+class _WireframeParser(HTMLParser):
+    """
+    Builds a minimal block tree from wireframe HTML.
+    Inline tags are flattened into their parent's text; only simple
+    `.class { ... }` rules from <style> blocks are kept for colours.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = _Node("body", {})
+        self.class_styles: dict[str, str] = {}
+        self._stack = [self.root]
+        self._skip_depth = 0
+        self._in_style = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+            self._in_style = tag == "style"
+            return
+        if tag == "body" and not self._skip_depth:
+            self.root = _Node("body", dict(attrs)) if not self.root.children else self.root
+            self._stack[0] = self.root
+            return
+        if self._skip_depth or tag in _INLINE_TAGS or tag == "html":
+            return
+        node = _Node(tag, dict(attrs))
+        self._stack[-1].children.append(node)
+        if tag not in _VOID_TAGS:
+            self._stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        if self._skip_depth or tag in _INLINE_TAGS:
+            return
+        self._stack[-1].children.append(_Node(tag, dict(attrs)))
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+            self._in_style = False
+            return
+        if self._skip_depth or tag in _INLINE_TAGS or tag in _VOID_TAGS:
+            return
+        # Tolerate unclosed tags by unwinding to the nearest matching open node
+        for i in range(len(self._stack) - 1, 0, -1):
+            if self._stack[i].tag == tag:
+                del self._stack[i:]
+                break
+
+    def handle_data(self, data):
+        if self._in_style:
+            for cls, body in _CLASS_RULE.findall(data):
+                self.class_styles[cls] = self.class_styles.get(cls, "") + ";" + body
+            return
+        if self._skip_depth:
+            return
+        text = " ".join(data.split())
+        if text:
+            self._stack[-1].children.append(text)
+
+
+# Layout + drawing
+
+_font_cache: dict[int, "ImageFont.ImageFont"] = {}
+
+
+def _font(size: int):
+    font = _font_cache.get(size)
+    if font is None:
+        from PIL import ImageFont
+
+        try:
+            font = ImageFont.load_default(size=size)
+        except TypeError:
+            font = ImageFont.load_default()
+        _font_cache[size] = font
+    return font
+
+
+def _parse_color(value: str) -> Optional[str]:
+    match = _HEX_COLOR.search(value or "")
+    if not match:
+        return None
+    hex_value = match.group(1)
+    if len(hex_value) == 3:
+        hex_value = "".join(c * 2 for c in hex_value)
+    return f"#{hex_value}"
+
+
+def _node_colors(node: _Node, class_styles: dict) -> tuple[Optional[str], Optional[str]]:
+    declarations = ";".join(class_styles.get(c, "") for c in node.classes) + ";" + node.style
+    bg = fg = None
+    for match in _BG_DECL.finditer(declarations):
+        bg = _parse_color(match.group(1)) or bg
+    for match in _COLOR_DECL.finditer(declarations):
+        fg = _parse_color(match.group(1)) or fg
+    return bg, fg
+
+
+def _wrap(text: str, font, max_width: int) -> list[str]:
+    lines, current = [], ""
+    for word in text.split():
+        candidate = f"{current} {word}".strip()
+        if current and font.getlength(candidate) > max_width:
+            lines.append(current)
+            current = word
+        else:
+            current = candidate
+    if current:
+        lines.append(current)
+    return lines
+
+
+class _Renderer:
+    PAD = 6
+
+    def __init__(self, draw: "ImageDraw.ImageDraw", class_styles: dict, height: int):
+        self.draw = draw
+        self.class_styles = class_styles
+        self.height = height
+
+    def text(self, text: str, x: int, y: int, width: int, size: int, fill: str, paint: bool) -> int:
+        font = _font(size)
+        line_height = size + 4
+        for line in _wrap(text, font, max(width, 20)):
+            if y > self.height:
+                break
+            if paint:
+                self.draw.text((x, y), line, font=font, fill=fill)
+            y += line_height
+        return y
+
+    def layout(self, node: _Node, x: int, y: int, width: int,
+               fg: str = "#222222", paint: bool = True) -> int:
+        """Lays out a node top-down and returns the y below it. paint=False only measures."""
+        if y > self.height:
+            return y
+        tag = node.tag
+        bg, node_fg = _node_colors(node, self.class_styles)
+        fg = node_fg or fg
+
+        if tag in ("input", "textarea", "select"):
+            if paint:
+                label = node.attrs.get("placeholder") or node.attrs.get("value") or ""
+                self.draw.rectangle([x, y, x + width, y + 36], outline="#9a9a9a", fill=bg or "#ffffff")
+                self.text(label, x + 8, y + 11, width - 16, _BODY_SIZE, "#8a8a8a", paint)
+            return y + 36 + self.PAD
+        if tag == "img":
+            if paint:
+                self.draw.rectangle([x, y, x + width, y + 72], outline="#b0b0b0", fill="#ececec")
+                self.draw.line([x, y, x + width, y + 72], fill="#c8c8c8")
+                self.draw.line([x, y + 72, x + width, y], fill="#c8c8c8")
+            return y + 72 + self.PAD
+        if tag == "hr":
+            if paint:
+                self.draw.line([x, y + 2, x + width, y + 2], fill="#cccccc")
+            return y + 4 + self.PAD
+        if tag == "br":
+            return y + _BODY_SIZE
+
+        is_button = tag == "button"
+        boxed = bool(bg) or is_button
+        if boxed and paint:
+            # Measure first so the box can be painted beneath its content
+            bottom = self.layout(node, x, y, width, fg, paint=False)
+            self.draw.rectangle([x, y, x + width, bottom], fill=bg or "#dcdcdc")
+
+        size = _HEADING_SIZES.get(tag, _BODY_SIZE)
+        inner_x, inner_w = x + self.PAD, width - 2 * self.PAD
+        cursor = y + (self.PAD if boxed else 0)
+
+        for child in node.children:
+            if isinstance(child, str):
+                cursor = self.text(child, inner_x, cursor, inner_w, size, fg, paint)
+            else:
+                cursor = self.layout(child, inner_x, cursor, inner_w, fg, paint)
+            if cursor > self.height:
+                break
+
+        if is_button:
+            cursor = max(cursor + self.PAD, y + 44)   # min touch target
+        elif boxed:
+            cursor += self.PAD
+        return cursor
+
+
+def _render_png(html: str, thumbnail_width: int = THUMBNAIL_WIDTH) -> bytes:
+    """
+    Rasterizes wireframe HTML into a PNG thumbnail without a browser.
+    This is an approximation (block stacking + text + colours), good
+    enough for history-screen previews. Runs inside worker processes.
+    """
+    # Imported here: only render workers need PIL, not the API process
+    from PIL import Image, ImageDraw
+
+    parser = _WireframeParser()
+    parser.feed(html)
+    parser.close()
+
+    root_bg, _ = _node_colors(parser.root, parser.class_styles)
+    image = Image.new("RGB", (VIEWPORT_WIDTH, VIEWPORT_HEIGHT), root_bg or "#ffffff")
+    renderer = _Renderer(ImageDraw.Draw(image), parser.class_styles, VIEWPORT_HEIGHT)
+    renderer.layout(parser.root, 0, 0, VIEWPORT_WIDTH)
+
+    ratio = thumbnail_width / VIEWPORT_WIDTH
+    thumb = image.resize((thumbnail_width, int(VIEWPORT_HEIGHT * ratio)), Image.LANCZOS)
+    buf = io.BytesIO()
+    thumb.save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+
+# Worker pool + cache
+
+_executor: Optional[ProcessPoolExecutor] = None
+_pending = 0   # renders queued on or running in the pool; event loop only
+
+
+class RenderBusy(RuntimeError):
+    """RENDER_MAX_PENDING renders are already queued or running."""
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: the API process runs threads, forking it is not safe
+        _executor = ProcessPoolExecutor(
+            max_workers=RENDER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def html_hash(html: str) -> str:
+    return hashlib.sha256(html.encode("utf-8")).hexdigest()
+
+
+async def render_preview(html: str) -> bytes:
+    """
+    Returns PNG thumbnail bytes for wireframe HTML.
+    Cached on disk by HTML hash, capped at RENDER_CACHE_MAX_MB. At most RENDER_MAX_PENDING renders wait for
+    or run on the pool; beyond that RenderBusy is raised instead of queueing,
+    so a burst of completions can't pile up unbounded work.
+    """
+    global _pending
+    RENDER_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    cache_path = RENDER_CACHE_DIR / f"{html_hash(html)}.png"
+    if cache_path.exists():
+        try:
+            png = cache_path.read_bytes()
+            os.utime(cache_path)   # mtime is the LRU clock
+            return png
+        except FileNotFoundError:
+            pass   # evicted in between: render it again
+
+    if _pending >= RENDER_MAX_PENDING:
+        raise RenderBusy(f"{_pending} previews already rendering")
+    _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        png = await loop.run_in_executor(_get_executor(), _render_png, html)
+    finally:
+        _pending -= 1
+
+    tmp_path = cache_path.with_suffix(".tmp")
+    tmp_path.write_bytes(png)
+    os.replace(tmp_path, cache_path)
+    await loop.run_in_executor(None, evict, RENDER_CACHE_DIR, RENDER_CACHE_MAX_BYTES, "*.png")
+    return png
+
+
+async def render_and_store_preview(evaluation_id: str, html: str) -> Optional[str]:
+    """
+    Renders the wireframe preview, uploads it next to the evaluation in S3
+    and stores the URL on improved_design.preview_image_url.
+    The object key carries the HTML hash, so a regenerated wireframe gets a
+    new URL (no stale CDN/client copies), and the URL is only stored while
+    the evaluation still holds this HTML: a slow render of an older
+    wireframe can't replace the newer preview.
+    Never raises — a missing preview must not affect the evaluation.
+    """
+    from starlette.concurrency import run_in_threadpool
+    from app.services.s3_service import upload_bytes_to_s3
+    from app.services.database import set_preview_image
+
+    if not html or not html.strip():
+        return None
+    digest = html_hash(html)
+    try:
+        png = await render_preview(html)
+        url = await run_in_threadpool(
+            upload_bytes_to_s3, png, f"previews/{evaluation_id}/{digest}.png", "image/png"
+        )
+        if not await run_in_threadpool(set_preview_image, evaluation_id, url, digest):
+            logger.info("[PREVIEW] Wireframe of %s changed while rendering, preview dropped", evaluation_id)
+            return None
+        logger.info("[PREVIEW] Stored preview for %s", evaluation_id)
+        return url
+    except Exception as e:
+        logger.error("[PREVIEW] Failed for %s: %s", evaluation_id, e)
+        return None
+
+
+def shutdown_render_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -1,14 +1,27 @@
-import boto3
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
 
-s3_client = boto3.client(
-    "s3",
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_KEY"),
-    region_name=os.getenv("AWS_REGION"),
-)
-
 BUCKET_NAME = os.getenv("AWS_BUCKET_NAME")
+
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    """Process-wide S3 client, created on first use (boto3 is slow to import and set up)."""
+    global _s3_client
+    if _s3_client is None:
+        with _s3_client_lock:
+            if _s3_client is None:
+                import boto3
+
+                _s3_client = boto3.client(
+                    "s3",
+                    aws_access_key_id=os.getenv("AWS_ACCESS_KEY"),
+                    aws_secret_access_key=os.getenv("AWS_SECRET_KEY"),
+                    region_name=os.getenv("AWS_REGION"),
+                )
+    return _s3_client
@@ -1,19 +1,38 @@
 import uuid
 from fastapi import UploadFile
-from .s3_config import s3_client, BUCKET_NAME
+from .s3_config import get_s3_client, BUCKET_NAME
+from src.utils.tracing import span
 
 async def upload_image_to_s3(file: UploadFile) -> str:
     file_extension = file.filename.split(".")[-1]
     unique_key = f"uploads/{uuid.uuid4()}.{file_extension}"
 
-    s3_client.upload_fileobj(
-        file.file,
-        BUCKET_NAME,
-        unique_key,
-        ExtraArgs={
-            "ContentType": file.content_type
-        }
-    )
+    with span("s3.upload_fileobj", **{"aws.s3.bucket": BUCKET_NAME or "", "aws.s3.key": unique_key}):
+        get_s3_client().upload_fileobj(
+            file.file,
+            BUCKET_NAME,
+            unique_key,
+            ExtraArgs={
+                "ContentType": file.content_type
+            }
+        )
 
     image_url = f"https://{BUCKET_NAME}.s3.amazonaws.com/{unique_key}"
     return image_url
+
+
+def upload_bytes_to_s3(data: bytes, key: str, content_type: str) -> str:
+    """Uploads generated artifacts (e.g. wireframe previews) and returns the public URL."""
+    with span("s3.put_object", **{"aws.s3.bucket": BUCKET_NAME or "", "aws.s3.key": key}):
+        get_s3_client().put_object(
+            Bucket=BUCKET_NAME,
+            Key=key,
+            Body=data,
+            ContentType=content_type,
+        )
+    return f"https://{BUCKET_NAME}.s3.amazonaws.com/{key}"
+
+
+def check_bucket():
+    """HEAD on the bucket: network, credentials and bucket all usable (readiness probe)."""
+    get_s3_client().head_bucket(Bucket=BUCKET_NAME)
@@ -0,0 +1,164 @@
+"""
+Fair admission of pipeline runs.
+
+Every pipeline run waits here for a slot before the crew starts. There are
+two priority classes, picked with the X-Priority header:
+
+    interactive   single screens from the UI (default)
+    batch         bulk uploads, reprocessing
+
+A free slot goes to a waiting interactive run first. Within a class, users
+(x-user-id) take turns, so one user's batch of hundreds of screens can't
+hold back the next user's single request. Class caps bound how many runs
+of each class are in flight. Keeping SCHED_BATCH_MAX below
+SCHED_MAX_CONCURRENT reserves capacity for interactive requests, however
+long the batch backlog gets.
+
+    SCHED_MAX_CONCURRENT=         runs in flight (default: process pool size, or 16 with threads)
+    SCHED_INTERACTIVE_MAX=        default: SCHED_MAX_CONCURRENT
+    SCHED_BATCH_MAX=              default: a quarter of SCHED_MAX_CONCURRENT (at least 1)
+    SCHED_MAX_QUEUED=1000         waiting runs before new ones are rejected
+
+Time spent waiting is recorded as the `queue` stage of the run's metrics.
+"""
+import asyncio
+import logging
+import os
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from app.services.metrics_service import observe_scheduler
+from app.services.pipeline_workers import PIPELINE_EXECUTOR, pipeline_workers
+from src.utils.cancellation import CancelToken, EvaluationCancelled
+from src.utils.stage_metrics import stage
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_CLASSES = ("interactive", "batch")   # dispatch order
+
+SCHED_MAX_CONCURRENT  = int(os.getenv("SCHED_MAX_CONCURRENT")
+                            or (pipeline_workers() if PIPELINE_EXECUTOR == "process" else 16))
+SCHED_INTERACTIVE_MAX = int(os.getenv("SCHED_INTERACTIVE_MAX") or SCHED_MAX_CONCURRENT)
+SCHED_BATCH_MAX       = int(os.getenv("SCHED_BATCH_MAX") or max(1, SCHED_MAX_CONCURRENT // 4))
+SCHED_MAX_QUEUED      = int(os.getenv("SCHED_MAX_QUEUED", "1000"))
+
+
+class SchedulerFull(RuntimeError):
+    pass
+
+
+class FairScheduler:
+    """
+    Strict priority between classes, round robin between users inside a
+    class, FIFO per user. Runs on the event loop; no locking needed.
+    """
+
+    def __init__(self, max_concurrent: int, caps: dict[str, int], max_queued: int):
+        self.max_concurrent = max_concurrent
+        self.caps = caps
+        self.max_queued = max_queued
+        # class → user → waiting futures; the first user is next in turn
+        self.queues: dict[str, OrderedDict[str, deque]] = {c: OrderedDict() for c in caps}
+        self.running: dict[str, int] = {c: 0 for c in caps}
+
+    def queued(self, priority: Optional[str] = None) -> int:
+        classes = [priority] if priority else self.caps
+        return sum(len(waiters) for c in classes for waiters in self.queues[c].values())
+
+    def stats(self) -> dict:
+        return {
+            c: {"running": self.running[c], "queued": self.queued(c), "cap": self.caps[c],
+                "users_waiting": len(self.queues[c])}
+            for c in self.caps
+        }
+
+    def _publish(self):
+        for c in self.caps:
+            observe_scheduler(c, self.running[c], self.queued(c))
+
+    def _next(self) -> Optional[tuple[str, asyncio.Future]]:
+        if sum(self.running.values()) >= self.max_concurrent:
+            return None
+        for priority in PRIORITY_CLASSES:
+            if self.running[priority] >= self.caps[priority]:
+                continue
+            users = self.queues[priority]
+            while users:
+                user, waiters = next(iter(users.items()))
+                future = waiters.popleft()
+                if waiters:
+                    users.move_to_end(user)   # this user's next run waits for everyone else's turn
+                else:
+                    del users[user]
+                if not future.done():
+                    return priority, future
+        return None
+
+    def _dispatch(self):
+        while (picked := self._next()) is not None:
+            priority, future = picked
+            self.running[priority] += 1
+            future.set_result(None)
+        self._publish()
+
+    def _remove(self, priority: str, user: str, future: asyncio.Future):
+        waiters = self.queues[priority].get(user)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(future)
+        except ValueError:
+            return
+        if not waiters:
+            del self.queues[priority][user]
+
+    async def acquire(self, user: str, priority: str, cancel_token: Optional[CancelToken] = None):
+        if priority not in self.caps:
+            raise ValueError(f"Unknown priority '{priority}' (expected: {' | '.join(PRIORITY_CLASSES)})")
+        if self.queued() >= self.max_queued:
+            raise SchedulerFull(f"{self.max_queued} runs already waiting")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.queues[priority].setdefault(user, deque()).append(future)
+        if cancel_token is not None:
+            def abort():
+                if not future.done():
+                    future.set_exception(EvaluationCancelled(cancel_token.evaluation_id, cancel_token.reason))
+            cancel_token.on_cancel(lambda: loop.call_soon_threadsafe(abort))
+        self._dispatch()
+
+        try:
+            with stage("queue"):
+                await future
+        except BaseException:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self.release(priority)   # granted, then the request went away
+            else:
+                self._remove(priority, user, future)
+                self._publish()
+            raise
+
+    def release(self, priority: str):
+        self.running[priority] -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, user: str, priority: str = "interactive", cancel_token: Optional[CancelToken] = None):
+        await self.acquire(user, priority, cancel_token)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+
+scheduler = FairScheduler(
+    max_concurrent=SCHED_MAX_CONCURRENT,
+    caps={"interactive": SCHED_INTERACTIVE_MAX, "batch": SCHED_BATCH_MAX},
+    max_queued=SCHED_MAX_QUEUED,
+)
@@ -0,0 +1,348 @@
+"""
+LLM-judge harness over every ui_id in the expert dataset.
+
+For each UI: run (or load) the pipeline outputs, build the four judge
+prompts from run_llm_judge.build_prompts with ground truth derived from
+the expert CSV, and judge them concurrently. Judge responses are cached
+by prompt hash, per-UI pipeline outputs and results are persisted, so
+re-running resumes instead of repeating model calls.
+
+    # full run against the real pipeline + judge model
+    python judge_eval/run_judge_harness.py --pipeline live --concurrency 8
+
+    # offline run (CI, no credentials): the real crew against the fake model
+    # backend (app/scripts/fake_model_backend.py) + deterministic stub judge
+    python judge_eval/run_judge_harness.py --pipeline fake --judge stub
+
+    # replays the outputs a live run recorded for each UI (UIs never run
+    # live are skipped)
+    python judge_eval/run_judge_harness.py --pipeline recorded --judge stub
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import re
+import sys
+from collections import defaultdict
+from pathlib import Path
+from statistics import mean
+
+from run_llm_judge import JUDGE_METRICS, JUDGE_MODEL, build_prompts, parse_judge_response
+
+HERE = Path(__file__).resolve().parent
+ROOT = HERE.parent
+DEFAULT_DATASET = ROOT / "data" / "ux_expert_evaluation_dataset_v2.csv"
+RESULTS_DIR = HERE / "results"
+CACHE_DIR = HERE / "cache"
+# Per-UI pipeline outputs of live runs, replayed by --pipeline recorded
+RECORDED_DIR = RESULTS_DIR / "outputs" / "live"
+FAKE_SCREENSHOT = RESULTS_DIR / "fake_screenshot.png"
+
+_WORD = re.compile(r"[a-z]{4,}")
+_LABEL_SPLIT = re.compile(r"_|(?<=[a-z])(?=[A-Z])")
+
+
+# Ground truth
+
+def load_ground_truth(csv_path: Path) -> dict:
+    """ui_id → {ui_id, screen_type, image_url, ground_truth} built from expert rows."""
+    uis = {}
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            ui = uis.setdefault(row["ui_id"], {
+                "ui_id": row["ui_id"],
+                "screen_type": row["screen_type"],
+                "image_url": row["image_path"],
+                "ground_truth": {
+                    # The CSV has no element annotations; the screen type is the closest signal.
+                    # Only its own words: a generic "screen" would match any vision output
+                    "expected_ui_elements": [_LABEL_SPLIT.sub(" ", row["screen_type"]).lower()],
+                    "expected_issues": [],
+                    "expected_heuristics": [],
+                    "expected_improvements": [],
+                },
+            })
+            gt = ui["ground_truth"]
+            gt["expected_issues"].append(row["issue"])
+            gt["expected_improvements"].append(row["suggestion"])
+            if row["heuristic"] not in gt["expected_heuristics"]:
+                gt["expected_heuristics"].append(row["heuristic"])
+    return uis
+
+
+# Pipeline outputs
+
+def _maybe_json(text: str):
+    try:
+        return json.loads(text)
+    except (TypeError, ValueError):
+        return text
+
+
+def _import_paths():
+    for path in (ROOT, ROOT / "src"):
+        if str(path) not in sys.path:
+            sys.path.append(str(path))
+
+
+def install_fake_backend(latency: str = ""):
+    """
+    Patches the model entry points with the recorded responses of
+    app/scripts/fake_model_backend.py. Must run before the crew is imported.
+    The screenshot is a local placeholder: the dataset images are remote.
+    """
+    # Offline: no key checks, telemetry or crewai trace prompts
+    os.environ.setdefault("GEMINI_API_KEY", "fake")
+    os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+    os.environ.setdefault("CREWAI_TRACING_ENABLED", "false")
+    os.environ.setdefault("CREW_VERBOSE", "false")
+    _import_paths()
+    from PIL import Image
+    from app.scripts.fake_model_backend import FakeLatency, install
+
+    install(FakeLatency.parse(latency or "vision=0,heuristic=0,feedback=0,wireframe=0,agent=0,jitter=0"))
+    FAKE_SCREENSHOT.parent.mkdir(parents=True, exist_ok=True)
+    Image.new("RGB", (375, 812), "white").save(FAKE_SCREENSHOT)
+
+
+def live_outputs(ui: dict, image_path: str | None = None) -> dict:
+    _import_paths()
+    from ux_feedback_crew.crew_pipeline import run_full_ux_pipeline_raw
+
+    eval_id = f"judge-{ui['ui_id']}"
+    result = run_full_ux_pipeline_raw(image_path or ui["image_url"], eval_id, eval_id)
+    raw = [str(t.raw) for t in result.tasks_output]
+    return {
+        "vision": _maybe_json(raw[0]),
+        "heuristic": _maybe_json(raw[1]),
+        "feedback": _maybe_json(raw[2]),
+        "wireframe": raw[3],
+    }
+
+
+# Judges
+
+class JudgeCache:
+    """Judge responses on disk, keyed by sha256(model + prompt)."""
+
+    def __init__(self, directory: Path, model: str):
+        self.directory = directory
+        self.model = model
+        self.hits = self.misses = 0
+        directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, prompt: str) -> Path:
+        key = hashlib.sha256(f"{self.model}\n{prompt}".encode("utf-8")).hexdigest()
+        return self.directory / f"{key}.json"
+
+    def get(self, prompt: str):
+        path = self._path(prompt)
+        if path.exists():
+            self.hits += 1
+            return json.loads(path.read_text(encoding="utf-8"))
+        self.misses += 1
+        return None
+
+    def put(self, prompt: str, value: dict):
+        self._path(prompt).write_text(json.dumps(value), encoding="utf-8")
+
+
+async def litellm_judge(agent: str, prompt: str, _context: dict) -> dict:
+    import litellm
+
+    response = await litellm.acompletion(
+        model=JUDGE_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0,
+    )
+    return parse_judge_response(response.choices[0].message.content)
+
+
+async def stub_judge(agent: str, _prompt: str, context: dict) -> dict:
+    """
+    Deterministic offline judge: share of ground-truth items whose content
+    words mostly appear in the agent output, scaled to 0–10.
+    """
+    output_words = set(_WORD.findall(context["output"].lower()))
+    covered = 0
+    for item in context["expected"]:
+        words = set(_WORD.findall(item.lower()))
+        if words and len(words & output_words) / len(words) >= 0.3:
+            covered += 1
+    score = round(10 * covered / len(context["expected"]), 1) if context["expected"] else 0.0
+    return {**{metric: score for metric in JUDGE_METRICS[agent]}, "overall": score}
+
+
+def _judge_contexts(gt: dict, outputs: dict) -> dict:
+    def text(value):
+        return value if isinstance(value, str) else json.dumps(value)
+    return {
+        "vision_analyst": {"expected": gt["expected_ui_elements"], "output": text(outputs["vision"])},
+        "heuristic_evaluator": {"expected": gt["expected_issues"] + gt["expected_heuristics"],
+                                "output": text(outputs["heuristic"])},
+        "feedback_specialist": {"expected": gt["expected_issues"] + gt["expected_improvements"],
+                                "output": text(outputs["feedback"])},
+        "wireframe_designer": {"expected": gt["expected_improvements"], "output": text(outputs["wireframe"])},
+    }
+
+
+# Harness
+
+class Harness:
+    def __init__(self, args):
+        self.args = args
+        self.judge = stub_judge if args.judge == "stub" else litellm_judge
+        self.cache = JudgeCache(CACHE_DIR, "stub" if args.judge == "stub" else JUDGE_MODEL)
+        self.judge_slots = asyncio.Semaphore(args.concurrency)
+        self.pipeline_slots = asyncio.Semaphore(args.pipeline_concurrency)
+        if args.pipeline == "fake":
+            install_fake_backend(args.fake_latency)
+        self.outputs_dir = RESULTS_DIR / "outputs" / "fake" if args.pipeline == "fake" else RECORDED_DIR
+        self.results_path = RESULTS_DIR / f"results_{args.pipeline}_{args.judge}.jsonl"
+
+    def completed(self) -> dict:
+        done = {}
+        if self.results_path.exists():
+            for line in self.results_path.read_text(encoding="utf-8").splitlines():
+                if line.strip():
+                    row = json.loads(line)
+                    # Rows with failed judge calls (older runs wrote them) are judged again
+                    if not any("error" in scores for scores in row["scores"].values()):
+                        done[row["ui_id"]] = row
+        return done
+
+    async def outputs_for(self, ui: dict) -> dict:
+        path = self.outputs_dir / f"{ui['ui_id']}.json"
+        if path.exists():
+            return json.loads(path.read_text(encoding="utf-8"))
+        async with self.pipeline_slots:
+            image_path = str(FAKE_SCREENSHOT) if self.args.pipeline == "fake" else None
+            outputs = await asyncio.to_thread(live_outputs, ui, image_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(outputs), encoding="utf-8")
+        return outputs
+
+    async def judge_one(self, agent: str, prompt: str, context: dict) -> dict:
+        cached = self.cache.get(prompt)
+        if cached is not None:
+            return cached
+        async with self.judge_slots:
+            for attempt in range(3):
+                try:
+                    result = await self.judge(agent, prompt, context)
+                    break
+                except Exception as e:
+                    if attempt == 2:
+                        return {"error": str(e)}
+                    await asyncio.sleep(2 ** attempt)
+        self.cache.put(prompt, result)
+        return result
+
+    async def run_ui(self, ui: dict, sink) -> dict:
+        outputs = await self.outputs_for(ui)
+        gt = ui["ground_truth"]
+        prompts = build_prompts(gt, outputs["vision"], outputs["heuristic"], outputs["feedback"], outputs["wireframe"])
+        contexts = _judge_contexts(gt, outputs)
+        scores = await asyncio.gather(*(
+            self.judge_one(agent, prompt, contexts[agent]) for agent, prompt in prompts.items()
+        ))
+        row = {"ui_id": ui["ui_id"], "screen_type": ui["screen_type"], "scores": dict(zip(prompts, scores))}
+        failed = [agent for agent, result in row["scores"].items() if "error" in result]
+        if failed:
+            # Not written: the next run retries this UI instead of resuming past it
+            print(f"  judge failed for {ui['ui_id']} ({', '.join(failed)}), will retry on the next run")
+            return None
+        sink.write(json.dumps(row) + "\n")
+        sink.flush()
+        print(f"  judged {ui['ui_id']}")
+        return row
+
+    async def run(self) -> list:
+        uis = load_ground_truth(self.args.dataset)
+        if self.args.limit:
+            uis = dict(list(uis.items())[:self.args.limit])
+        if self.args.pipeline == "recorded":
+            recorded = {ui_id: ui for ui_id, ui in uis.items() if (self.outputs_dir / f"{ui_id}.json").exists()}
+            if len(recorded) < len(uis):
+                print(f"Skipping {len(uis) - len(recorded)} UIs without recorded outputs (run --pipeline live first)")
+            uis = recorded
+        done = self.completed()
+        pending = [ui for ui_id, ui in uis.items() if ui_id not in done]
+        print(f"{len(uis)} UIs, {len(done)} already judged, {len(pending)} to go")
+
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        with open(self.results_path, "a", encoding="utf-8") as sink:
+            results = await asyncio.gather(*(self.run_ui(ui, sink) for ui in pending), return_exceptions=True)
+        rows = []
+        for ui, result in zip(pending, results):
+            if isinstance(result, BaseException):
+                print(f"  {ui['ui_id']} failed: {type(result).__name__}: {result}")
+            elif result is not None:
+                rows.append(result)
+        print(f"{len(rows)} of {len(pending)} judged this run")
+        print(f"Judge cache: {self.cache.hits} hits, {self.cache.misses} misses")
+        return [done[u] for u in uis if u in done] + rows
+
+
+def aggregate(rows: list) -> dict:
+    """Mean of every metric per agent, and mean overall per agent per screen type."""
+    per_agent = defaultdict(lambda: defaultdict(list))
+    per_screen = defaultdict(lambda: defaultdict(list))
+    for row in rows:
+        for agent, scores in row["scores"].items():
+            for metric, value in scores.items():
+                if isinstance(value, (int, float)):
+                    per_agent[agent][metric].append(value)
+            if isinstance(scores.get("overall"), (int, float)):
+                per_screen[row["screen_type"]][agent].append(scores["overall"])
+    return {
+        "uis": len(rows),
+        "by_agent": {a: {m: round(mean(v), 2) for m, v in metrics.items()} for a, metrics in per_agent.items()},
+        "by_screen_type": {s: {a: round(mean(v), 2) for a, v in agents.items()} for s, agents in per_screen.items()},
+    }
+
+
+def print_tables(summary: dict):
+    print(f"\nAggregate scores over {summary['uis']} UIs\n")
+    print("| agent | metric | mean |\n|---|---|---|")
+    for agent, metrics in summary["by_agent"].items():
+        for metric, value in metrics.items():
+            print(f"| {agent} | {metric} | {value} |")
+
+    agents = list(JUDGE_METRICS)
+    print("\n| screen_type | " + " | ".join(agents) + " |")
+    print("|---" * (len(agents) + 1) + "|")
+    for screen_type, values in sorted(summary["by_screen_type"].items()):
+        print(f"| {screen_type} | " + " | ".join(str(values.get(a, "-")) for a in agents) + " |")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", type=Path, default=DEFAULT_DATASET)
+    parser.add_argument("--pipeline", choices=["fake", "recorded", "live"], default="recorded")
+    parser.add_argument("--fake-latency", default="",
+                        help="FakeLatency spec for --pipeline fake, e.g. vision=0.2,agent=0.01 (default: none)")
+    parser.add_argument("--judge", choices=["stub", "litellm"], default="litellm")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent judge calls")
+    parser.add_argument("--pipeline-concurrency", type=int, default=2, help="Concurrent live pipeline runs")
+    parser.add_argument("--limit", type=int, default=0, help="Only the first N UIs (0 = all)")
+    parser.add_argument("--fresh", action="store_true", help="Discard previous results (cache is kept)")
+    args = parser.parse_args()
+
+    harness = Harness(args)
+    if args.fresh and harness.results_path.exists():
+        harness.results_path.unlink()
+    rows = asyncio.run(harness.run())
+
+    summary = aggregate(rows)
+    summary_path = RESULTS_DIR / f"summary_{args.pipeline}_{args.judge}.json"
+    summary_path.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    print_tables(summary)
+    print(f"\nSaved {harness.results_path.name} and {summary_path.name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,26 +19,33 @@ def read_text(path):
         return f.read()
 
 
+# Sub-scores each judge prompt asks for (plus "overall")
+JUDGE_METRICS = {
+    "vision_analyst": ["component_accuracy", "layout_understanding", "completeness"],
+    "heuristic_evaluator": ["issue_accuracy", "heuristic_mapping", "severity_relevance"],
+    "feedback_specialist": ["accuracy", "actionability", "completeness"],
+    "wireframe_designer": ["improvement_implementation", "usability_enhancement", "completeness"],
+}
+
+
+def parse_judge_response(content):
+    content = content.strip()
+    content = re.sub(r"^```json\s*|^```\s*|```$", "", content, flags=re.MULTILINE).strip()
+    return json.loads(content)
+
+
 def call_judge(prompt):
     response = litellm.completion(
         model=JUDGE_MODEL,
         messages=[{"role": "user", "content": prompt}],
         temperature=0
     )
-    content = response.choices[0].message.content.strip()
-    content = re.sub(r"^```json\s*|^```\s*|```$", "", content, flags=re.MULTILINE).strip()
-    return json.loads(content)
+    return parse_judge_response(response.choices[0].message.content)
 
 
-def main():
-    dataset = read_json("dataset.json")
-    vision = read_json("vision_output.json")
-    heuristic = read_json("heuristic_output.json")
-    feedback = read_json("feedback_output.json")
-    wireframe = read_text("wireframe_output.html")
-    gt = dataset["ground_truth"]
-
-    prompts = {
+def build_prompts(gt, vision, heuristic, feedback, wireframe):
+    """Judge prompt per agent for one UI, given its ground truth and pipeline outputs."""
+    return {
         "vision_analyst": f"""
 You are a UX expert judge.
 
@@ -143,6 +150,16 @@ Return only JSON:
 """
     }
 
+
+def main():
+    dataset = read_json("dataset.json")
+    vision = read_json("vision_output.json")
+    heuristic = read_json("heuristic_output.json")
+    feedback = read_json("feedback_output.json")
+    wireframe = read_text("wireframe_output.html")
+    gt = dataset["ground_truth"]
+
+    prompts = build_prompts(gt, vision, heuristic, feedback, wireframe)
     results = {}
 
     for agent_name, prompt in prompts.items():
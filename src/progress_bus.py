@@ -0,0 +1,150 @@
+"""
+Pub/sub transport for progress events, so any API worker can deliver an
+event to a socket held by another worker.
+
+ConnectionManager.send_progress publishes; every worker subscribes and
+delivers to the sockets it holds. Backends (PROGRESS_BUS):
+
+    memory  single process (default)
+    redis   Redis pub/sub at REDIS_URL; sequence numbers come from Redis
+            INCR so they stay monotonic whichever worker publishes
+
+The Redis listener never awaits a delivery itself: each client's events go
+to its own queue, drained in order by a task that exits once the queue is
+empty. A slow socket only delays its own client.
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Awaitable, Callable, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_BUS     = os.getenv("PROGRESS_BUS", "memory").lower()
+REDIS_URL        = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+PROGRESS_CHANNEL = os.getenv("PROGRESS_CHANNEL", "heuruxagent:progress")
+SEQ_TTL_SECONDS  = 24 * 3600
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class InMemoryBus:
+    """Delivers in-process; sequence numbers are assigned by the receiving manager."""
+
+    def __init__(self):
+        self.handler: Optional[Handler] = None
+
+    async def start(self, handler: Handler):
+        self.handler = handler
+
+    async def stop(self):
+        pass
+
+    async def next_seq(self, evaluation_id: str) -> Optional[int]:
+        return None
+
+    async def publish(self, message: dict):
+        if self.handler is not None:
+            await self.handler(message)
+
+
+class RedisBus:
+    """Redis (or any RESP-compatible server) pub/sub; one subscriber task per process."""
+
+    def __init__(self, url: str = REDIS_URL, channel: str = PROGRESS_CHANNEL, client=None):
+        self.url = url
+        self.channel = channel
+        self.redis = client
+        self.handler: Optional[Handler] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._queues: dict[str, asyncio.Queue] = {}
+        self._drainers: set[asyncio.Task] = set()
+
+    def _client(self):
+        if self.redis is None:
+            try:
+                import redis.asyncio as aioredis
+            except ImportError as e:
+                raise RuntimeError("PROGRESS_BUS=redis needs the 'redis' package") from e
+            self.redis = aioredis.Redis.from_url(self.url)
+        return self.redis
+
+    async def start(self, handler: Handler):
+        self.handler = handler
+        pubsub = self._client().pubsub()
+        # Subscribed before start() returns, so no event published after startup is missed
+        await pubsub.subscribe(self.channel)
+        self._listener = asyncio.create_task(self._listen(pubsub))
+        logger.info("[BUS] Subscribed to %s", self.channel)
+
+    async def _listen(self, pubsub):
+        while True:
+            try:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None:
+                    continue
+                self._dispatch(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                await pubsub.aclose()
+                raise
+            except Exception as e:
+                logger.error("[BUS] Listener error: %s", e)
+                await asyncio.sleep(1)
+
+    def _dispatch(self, event: dict):
+        # Control events share one queue, so they keep their order too
+        key = event.get("client_id") or "control"
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = asyncio.Queue()
+            task = asyncio.create_task(self._drain(key, queue))
+            self._drainers.add(task)
+            task.add_done_callback(self._drainers.discard)
+        queue.put_nowait(event)
+
+    async def _drain(self, key: str, queue: asyncio.Queue):
+        # No await between the empty check and the removal: an event dispatched
+        # after it starts a new drainer
+        while not queue.empty():
+            try:
+                await self.handler(queue.get_nowait())
+            except Exception as e:
+                logger.error("[BUS] Delivery to %s failed: %s", key, e)
+        del self._queues[key]
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        for task in list(self._drainers):
+            task.cancel()
+        await asyncio.gather(*self._drainers, return_exceptions=True)
+        self._queues.clear()
+        if self.redis is not None:
+            await self.redis.aclose()
+
+    async def next_seq(self, evaluation_id: str) -> Optional[int]:
+        key = f"{self.channel}:seq:{evaluation_id}"
+        async with self._client().pipeline(transaction=True) as pipe:
+            seq, _ = await pipe.incr(key).expire(key, SEQ_TTL_SECONDS).execute()
+        return int(seq)
+
+    async def publish(self, message: dict):
+        await self._client().publish(self.channel, json.dumps(message, default=str))
+
+
+def create_bus(kind: str = PROGRESS_BUS):
+    if kind == "memory":
+        return InMemoryBus()
+    if kind == "redis":
+        return RedisBus()
+    raise ValueError(f"Unknown PROGRESS_BUS '{kind}' (expected: memory | redis)")
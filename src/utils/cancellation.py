@@ -0,0 +1,137 @@
+"""
+Cooperative cancellation of running evaluations.
+
+The API registers a CancelToken per run; cancel() sets it (cancel endpoint,
+or the client's websocket staying away past CANCEL_GRACE_SECONDS). The crew
+calls check() before every task and model_cascade before every model call
+(including crewai's tool retries), and stops with
+EvaluationCancelled instead of spending model quota on stages nobody will
+read. A model call already in flight is allowed to finish.
+
+The token's event is bound to the current context like the stage metrics,
+so it follows run_in_threadpool into the crew thread. Pipelines in worker
+processes get a multiprocessing Event instead (attach_remote), set together
+with the local one.
+
+    CANCEL_ON_DISCONNECT=false    cancel a client's runs when its last socket closes
+    CANCEL_GRACE_SECONDS=30       ... and it hasn't reconnected within this time
+"""
+import logging
+import os
+import threading
+from contextvars import ContextVar
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CANCEL_ON_DISCONNECT = os.getenv("CANCEL_ON_DISCONNECT", "false").lower() in ("1", "true", "yes")
+CANCEL_GRACE_SECONDS = float(os.getenv("CANCEL_GRACE_SECONDS", "30"))
+
+_event: ContextVar[Optional[tuple]] = ContextVar("cancel_event", default=None)
+
+
+class EvaluationCancelled(Exception):
+    def __init__(self, evaluation_id: str = "", reason: str = ""):
+        super().__init__(evaluation_id, reason)
+        self.evaluation_id = evaluation_id
+        self.reason = reason
+
+    def __str__(self):
+        return f"Evaluation {self.evaluation_id} cancelled ({self.reason or 'requested'})"
+
+
+class CancelToken:
+    def __init__(self, evaluation_id: str, client_id: str = ""):
+        self.evaluation_id = evaluation_id
+        self.client_id = client_id
+        self.reason = ""
+        self._local = threading.Event()
+        self._remote = None
+        self._callbacks = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._local.is_set()
+
+    def attach_remote(self, event):
+        """Also sets `event` (shared with a worker process) on cancel."""
+        self._remote = event
+        if self.cancelled:
+            event.set()
+
+    def on_cancel(self, callback):
+        """callback() runs once on cancel, in the cancelling thread (now if already cancelled)."""
+        if self.cancelled:
+            callback()
+        else:
+            self._callbacks.append(callback)
+
+    def cancel(self, reason: str = ""):
+        self.reason = self.reason or reason
+        self._local.set()
+        if self._remote is not None:
+            try:
+                self._remote.set()
+            except (OSError, EOFError):
+                pass   # worker manager already gone: the run is over anyway
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+
+# Runs of this API process, by evaluation_id
+_tokens: dict[str, CancelToken] = {}
+_tokens_lock = threading.Lock()
+
+
+def register(evaluation_id: str, client_id: str = "") -> CancelToken:
+    """Creates the run's token and binds it to the current context."""
+    token = CancelToken(evaluation_id, client_id)
+    with _tokens_lock:
+        _tokens[evaluation_id] = token
+    bind(evaluation_id, token._local)
+    return token
+
+
+def release(evaluation_id: str):
+    with _tokens_lock:
+        _tokens.pop(evaluation_id, None)
+
+
+def get(evaluation_id: str) -> Optional[CancelToken]:
+    return _tokens.get(evaluation_id)
+
+
+def cancel(evaluation_id: str, reason: str = "requested") -> bool:
+    """Cancels a run of this process. False if it isn't running here."""
+    token = _tokens.get(evaluation_id)
+    if token is None:
+        return False
+    token.cancel(reason)
+    logger.info("[CANCEL] %s (%s)", evaluation_id, reason)
+    return True
+
+
+def cancel_client(client_id: str, reason: str = "client disconnected") -> list[str]:
+    """Cancels every run of this process started for `client_id`."""
+    with _tokens_lock:
+        ids = [t.evaluation_id for t in _tokens.values() if t.client_id == client_id]
+    return [evaluation_id for evaluation_id in ids if cancel(evaluation_id, reason)]
+
+
+def bind(evaluation_id: str, event):
+    """Binds a run's event (threading or multiprocessing Event) to the current context."""
+    _event.set((evaluation_id, event))
+
+
+def check():
+    """Raises EvaluationCancelled if the current run was cancelled. No-op outside a run."""
+    bound = _event.get()
+    if bound is not None and bound[1].is_set():
+        evaluation_id = bound[0]
+        token = _tokens.get(evaluation_id)
+        raise EvaluationCancelled(evaluation_id, token.reason if token else "")
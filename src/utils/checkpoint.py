@@ -0,0 +1,39 @@
+"""
+Per-stage checkpoints of a pipeline run.
+
+The crew calls save() as each task completes. The API process installs a
+sink that persists the output on the evaluation (database.save_checkpoint);
+a resumed run gets those outputs back and skips their stages. Pipeline
+worker processes install a sink that forwards to the API process through
+the progress queue. Without a sink (scripts, benchmarks) checkpoints are
+dropped.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Stage names, in pipeline order; a resume restarts at the first one missing
+STAGES = ("vision", "heuristic", "feedback", "wireframe")
+
+_sink = None
+
+
+def set_sink(sink):
+    """sink(evaluation_id, stage, output) persists one stage output."""
+    global _sink
+    _sink = sink
+
+
+def save(evaluation_id: str, stage: str, output: str):
+    if _sink is None or not evaluation_id:
+        return
+    try:
+        _sink(evaluation_id, stage, output)
+    except Exception as e:
+        # Losing a checkpoint only costs a longer resume; the run itself goes on
+        logger.error("[CHECKPOINT] Saving %s of %s failed: %s", stage, evaluation_id, e)
+
+
+def first_missing(checkpoints: dict) -> str | None:
+    """First stage without a checkpoint, None if all completed."""
+    return next((stage for stage in STAGES if stage not in checkpoints), None)
@@ -0,0 +1,187 @@
+"""
+Shared HTTP client for remote inputs (screenshots, dataset images).
+
+One pooled requests.Session per process: connections and TLS sessions are
+reused across tool calls and threads. Downloads are streamed to a disk
+cache with a size limit; cached files are revalidated with
+If-None-Match / If-Modified-Since, so an unchanged object costs a 304
+instead of a full transfer. The cache is capped: after each download the
+least recently used files are evicted until it fits HTTP_CACHE_MAX_MB
+(every upload has its own S3 key, so without a cap the disk fills up).
+
+    HTTP_POOL_SIZE=16             connections kept per host
+    HTTP_CONNECT_TIMEOUT=5        seconds
+    HTTP_READ_TIMEOUT=30          seconds between bytes
+    HTTP_MAX_DOWNLOAD_MB=20       larger responses are rejected
+    HTTP_CACHE_DIR=data/cache/http
+    HTTP_CACHE_MAX_MB=500         total size of cached bodies
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+HTTP_POOL_SIZE       = int(os.getenv("HTTP_POOL_SIZE", "16"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT    = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+HTTP_MAX_DOWNLOAD    = int(float(os.getenv("HTTP_MAX_DOWNLOAD_MB", "20")) * 1024 * 1024)
+HTTP_CACHE_DIR       = Path(os.getenv("HTTP_CACHE_DIR", "data/cache/http"))
+HTTP_CACHE_MAX_BYTES = int(float(os.getenv("HTTP_CACHE_MAX_MB", "500")) * 1024 * 1024)
+CHUNK_SIZE           = 64 * 1024
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_evict_lock = threading.Lock()
+
+
+class DownloadTooLarge(ValueError):
+    pass
+
+
+def get_session() -> requests.Session:
+    """Process-wide pooled session with retries on connection errors and 502/503/504."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(total=2, backoff_factor=0.5, status_forcelist=(502, 503, 504),
+                              allowed_methods=frozenset({"GET", "HEAD"}))
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE,
+                                      max_retries=retry)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def _cache_paths(url: str, cache_dir: Path) -> tuple[Path, Path]:
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return cache_dir / f"{key}.bin", cache_dir / f"{key}.json"
+
+
+def _read_meta(meta_path: Path) -> dict:
+    try:
+        return json.loads(meta_path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _atomic_write_text(path: Path, text: str):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _stream_to(response: requests.Response, path: Path, max_bytes: int):
+    """Streams the body into `path` (atomically), enforcing max_bytes as it goes."""
+    declared = response.headers.get("Content-Length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise DownloadTooLarge(f"{response.url} is {declared} bytes (limit {max_bytes})")
+
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".part")
+    try:
+        received = 0
+        with os.fdopen(fd, "wb") as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                received += len(chunk)
+                if received > max_bytes:
+                    raise DownloadTooLarge(f"{response.url} exceeds {max_bytes} bytes")
+                f.write(chunk)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def _touch(path: Path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def evict(cache_dir: Path = HTTP_CACHE_DIR, max_bytes: int = HTTP_CACHE_MAX_BYTES, pattern: str = "*.bin") -> int:
+    """
+    Deletes the least recently used bodies (files matching `pattern`, and
+    their .json metadata) until the cache holds at most max_bytes; mtime is
+    the LRU clock. Returns the number of files evicted.
+    Safe against other processes evicting the same directory.
+    """
+    with _evict_lock:
+        entries = []
+        for body in cache_dir.glob(pattern):
+            try:
+                stat = body.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, body))
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, body in sorted(entries, key=lambda e: e[0]):
+            if total <= max_bytes:
+                break
+            for path in (body, body.with_suffix(".json")):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+            total -= size
+            evicted += 1
+    if evicted:
+        logger.debug("[HTTP] Evicted %d cached files from %s", evicted, cache_dir)
+    return evicted
+
+
+def fetch_to_cache(
+    url: str,
+    max_bytes: int = HTTP_MAX_DOWNLOAD,
+    cache_dir: Path = HTTP_CACHE_DIR,
+) -> tuple[Path, bool]:
+    """
+    Returns (local path, served_from_cache). Cached copies are revalidated
+    with the stored ETag / Last-Modified; responses without validators are
+    refetched next time. Raises requests.HTTPError / DownloadTooLarge.
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    body_path, meta_path = _cache_paths(url, cache_dir)
+    meta = _read_meta(meta_path) if body_path.exists() else {}
+
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    with get_session().get(url, headers=headers, stream=True,
+                           timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)) as response:
+        if response.status_code == 304 and headers:
+            logger.debug("[HTTP] 304 Not Modified, using cached %s", url)
+            _touch(body_path)   # mtime is the LRU clock
+            return body_path, True
+        response.raise_for_status()
+        _stream_to(response, body_path, max_bytes)
+        _atomic_write_text(meta_path, json.dumps({
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_type": response.headers.get("Content-Type"),
+        }))
+    logger.debug("[HTTP] Downloaded %s", url)
+    evict(cache_dir)
+    return body_path, False
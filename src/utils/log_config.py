@@ -0,0 +1,102 @@
+"""
+Process-wide logging setup.
+
+Records are handed to a QueueHandler, so the request/crew threads only pay
+for an enqueue; a QueueListener thread formats and writes them. (The stock
+QueueHandler.prepare formats the message and traceback in the caller's
+thread; ours passes the record through unformatted, so log arguments must
+not be mutated after the call.) Messages should use lazy %-formatting
+(logger.info("x=%s", x)) so records below LOG_LEVEL are never formatted.
+
+    LOG_LEVEL=INFO         DEBUG | INFO | WARNING | ERROR
+    LOG_FORMAT=text        text | json (one JSON object per line)
+    CREW_VERBOSE=true      crewai agent/crew console output; set false in production
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+from src.utils.tracing import log_context
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+CREW_VERBOSE = os.getenv("CREW_VERBOSE", "true").lower() in ("1", "true", "yes")
+
+TEXT_FORMAT = "%(asctime)s | %(levelname)s | %(message)s"
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with evaluation_id / trace ids when bound."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key in ("evaluation_id", "trace_id", "span_id"):
+            value = getattr(record, key, None)
+            if value:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _ContextFilter(logging.Filter):
+    """Copies the caller's evaluation_id / trace context onto the record before it is queued."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in log_context().items():
+            setattr(record, key, value)
+        return True
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues the record as is: message and exception text are built by the listener thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue is in-process (no pickling), so args and exc_info can travel unformatted
+        return record
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """Idempotent; replaces handlers on the root logger with a queue-backed one."""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+    records = queue.SimpleQueue()
+    queue_handler = _DeferredQueueHandler(records)
+    queue_handler.addFilter(_ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(records, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flushes queued records; safe to call more than once."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
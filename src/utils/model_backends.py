@@ -0,0 +1,218 @@
+"""
+Model backends for the tool stages.
+
+Each stage calls its models through a backend picked from config:
+
+    <STAGE>_MODEL_BACKEND=        gemini | vertex | openai
+                                  (default: gemini; feedback: vertex)
+    GEMINI_VISION_MODEL=          default model per stage
+    GEMINI_HEURISTIC_MODEL=
+    GEMINI_WIREFRAME_MODEL=
+    FEEDBACK_MODEL=               default: the fine-tuned Vertex endpoint
+    GEMINI_API_KEY=               gemini: Gemini API
+    VERTEX_PROJECT=heuruxagent    vertex: Vertex AI models and tuned endpoints
+    VERTEX_LOCATION=us-central1
+    OPENAI_BASE_URL=http://localhost:8000/v1
+                                  openai: any OpenAI-compatible server (vLLM,
+                                  llama.cpp, Ollama, a load-test stand-in)
+    OPENAI_API_KEY=
+    OPENAI_TIMEOUT_SECONDS=300
+
+A cascade tier (src.utils.model_cascade) can name its own backend,
+"<backend>:<model>", e.g. FEEDBACK_MODEL_CASCADE=openai:qwen2.5-7b,vertex:projects/...
+
+Nothing is imported or initialized until a backend is first used: no
+vertexai.init() or credential lookup at import time, and a stage pointed
+at a local server never loads the Google SDKs.
+"""
+import base64
+import io
+import logging
+import os
+import threading
+from typing import Callable, Optional
+
+from dotenv import load_dotenv
+
+from src.utils.http_client import HTTP_CONNECT_TIMEOUT, get_session
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+VERTEX_PROJECT         = os.getenv("VERTEX_PROJECT", "heuruxagent")
+VERTEX_LOCATION        = os.getenv("VERTEX_LOCATION", "us-central1")
+OPENAI_BASE_URL        = os.getenv("OPENAI_BASE_URL", "http://localhost:8000/v1").rstrip("/")
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "300"))
+
+# Fine-tuned feedback model on Vertex AI
+FEEDBACK_ENDPOINT = "projects/75094798515/locations/us-central1/endpoints/1191994299567308800"
+
+# stage → (backend, model) used when no cascade is configured
+STAGE_DEFAULTS = {
+    "vision":    ("gemini", os.getenv("GEMINI_VISION_MODEL")),
+    "heuristic": ("gemini", os.getenv("GEMINI_HEURISTIC_MODEL")),
+    "feedback":  ("vertex", os.getenv("FEEDBACK_MODEL") or FEEDBACK_ENDPOINT),
+    "wireframe": ("gemini", os.getenv("GEMINI_WIREFRAME_MODEL")),
+}
+
+_init_lock = threading.Lock()
+_gemini_client = None
+_vertex_ready = False
+
+
+class _Usage:
+    def __init__(self, prompt_tokens: int, output_tokens: int):
+        self.prompt_token_count = prompt_tokens or 0
+        self.candidates_token_count = output_tokens or 0
+
+
+class ModelResponse:
+    """Backend-neutral response, shaped like the genai/vertexai ones (.text, .usage_metadata)."""
+
+    def __init__(self, text: str, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+def _is_image(part) -> bool:
+    return hasattr(part, "save") and hasattr(part, "format")
+
+
+def _png_bytes(image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _gemini_models():
+    global _gemini_client
+    if _gemini_client is None:
+        from google import genai
+
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not set")
+        with _init_lock:
+            if _gemini_client is None:
+                _gemini_client = genai.Client(api_key=api_key)
+    return _gemini_client.models
+
+
+def _gemini(model: str, contents, temperature: Optional[float]):
+    config = {"temperature": temperature} if temperature is not None else None
+    return _gemini_models().generate_content(model=model, contents=contents, config=config)
+
+
+def _vertex_model(model: str):
+    global _vertex_ready
+    import vertexai
+    from vertexai.generative_models import GenerativeModel
+
+    if not _vertex_ready:
+        with _init_lock:
+            if not _vertex_ready:
+                vertexai.init(project=VERTEX_PROJECT, location=VERTEX_LOCATION)
+                _vertex_ready = True
+    return GenerativeModel(model)
+
+
+def _vertex(model: str, contents, temperature: Optional[float]):
+    if isinstance(contents, (list, tuple)):
+        from vertexai.generative_models import Part
+        contents = [Part.from_data(_png_bytes(p), "image/png") if _is_image(p) else p for p in contents]
+    config = {"temperature": temperature} if temperature is not None else None
+    return _vertex_model(model).generate_content(contents, generation_config=config)
+
+
+def _openai_headers() -> dict:
+    api_key = os.getenv("OPENAI_API_KEY")
+    return {"Authorization": f"Bearer {api_key}"} if api_key else {}
+
+
+def _openai(model: str, contents, temperature: Optional[float]):
+    parts = contents if isinstance(contents, (list, tuple)) else [contents]
+    content = []
+    for part in parts:
+        if _is_image(part):
+            data = base64.b64encode(_png_bytes(part)).decode("ascii")
+            content.append({"type": "image_url", "image_url": {"url": f"data:image/png;base64,{data}"}})
+        else:
+            content.append({"type": "text", "text": str(part)})
+    body = {"model": model, "messages": [{"role": "user", "content": content}]}
+    if temperature is not None:
+        body["temperature"] = temperature
+
+    response = get_session().post(f"{OPENAI_BASE_URL}/chat/completions", json=body, headers=_openai_headers(),
+                                  timeout=(HTTP_CONNECT_TIMEOUT, OPENAI_TIMEOUT_SECONDS))
+    response.raise_for_status()
+    payload = response.json()
+    usage = payload.get("usage") or {}
+    return ModelResponse(
+        payload["choices"][0]["message"].get("content") or "",
+        _Usage(usage.get("prompt_tokens"), usage.get("completion_tokens")),
+    )
+
+
+# Probes: one cheap request that reaches the model without generating (readiness checks)
+
+def _probe_gemini(model: str):
+    _gemini_models().get(model=model)
+
+
+def _probe_vertex(model: str):
+    _vertex_model(model).count_tokens("ping")
+
+
+def _probe_openai(model: str):
+    response = get_session().get(f"{OPENAI_BASE_URL}/models", headers=_openai_headers(),
+                                 timeout=(HTTP_CONNECT_TIMEOUT, HTTP_CONNECT_TIMEOUT))
+    response.raise_for_status()
+
+
+# name → generate(model, contents, temperature); contents is a prompt or a list of prompts and PIL images
+BACKENDS: dict[str, Callable] = {
+    "gemini": _gemini,
+    "vertex": _vertex,
+    "openai": _openai,
+}
+# name → probe(model), raises if the model can't be reached
+PROBES: dict[str, Callable] = {
+    "gemini": _probe_gemini,
+    "vertex": _probe_vertex,
+    "openai": _probe_openai,
+}
+
+
+def register(name: str, generate: Callable, probe: Optional[Callable] = None):
+    """Adds or replaces a backend (e.g. a stand-in for load tests)."""
+    BACKENDS[name] = generate
+    if probe is not None:
+        PROBES[name] = probe
+
+
+def probe(backend: str, model: str):
+    """Raises if `model` on `backend` can't be reached. Backends without a probe pass."""
+    check = PROBES.get(backend)
+    if check is not None:
+        check(model)
+
+
+def resolve(stage: str, tier: str) -> tuple[str, str]:
+    """(backend, model) of a cascade tier: its "<backend>:" prefix, else the stage's backend."""
+    prefix, sep, model = (tier or "").partition(":")
+    if sep and prefix in BACKENDS:
+        return prefix, model
+    default_backend = STAGE_DEFAULTS.get(stage, ("gemini", None))[0]
+    backend = os.getenv(f"{stage.upper()}_MODEL_BACKEND", default_backend).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown model backend '{backend}' for {stage} (expected: {' | '.join(BACKENDS)})")
+    return backend, tier
+
+
+def caller(stage: str, contents, temperature: Optional[float] = None) -> Callable[[str], object]:
+    """call(tier) for model_cascade.run: sends `contents` to the tier's backend and model."""
+    def call(tier: str):
+        backend, model = resolve(stage, tier)
+        return BACKENDS[backend](model, contents, temperature)
+    return call
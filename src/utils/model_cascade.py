@@ -0,0 +1,139 @@
+"""
+Per-stage model cascades.
+
+Each tool stage lists its models cheapest/fastest first:
+
+    VISION_MODEL_CASCADE=gemini-2.5-flash-lite,gemini-2.5-flash
+    HEURISTIC_MODEL_CASCADE=...
+    FEEDBACK_MODEL_CASCADE=...
+    WIREFRAME_MODEL_CASCADE=...
+    MODEL_TIER_TIMEOUT_SECONDS=60   a tier with a larger one behind it gets this long
+    <STAGE>_MODEL_RETRIES=          extra calls of the last tier on invalid output
+                                    (default: vision/heuristic 1, feedback/wireframe 0)
+
+Unset, a stage uses its single model as before (GEMINI_*_MODEL, the feedback
+endpoint; see model_backends.STAGE_DEFAULTS). run() calls the tiers in order and returns the first output
+that parses and passes the stage's schema check. It moves on to the next
+tier when the output is invalid, the call takes longer than the timeout,
+or the call raises (endpoint down, quota, ...). The last tier gets no
+timeout and the stage's retries on invalid output, like the single-model
+stages had (vision and heuristic retried once, feedback and wireframe not).
+
+Which tier served the stage is recorded on the run's metrics (served_by,
+escalations) and on the model span.
+"""
+import concurrent.futures
+import contextvars
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from dotenv import load_dotenv
+
+from src.utils import cancellation
+from src.utils.model_backends import STAGE_DEFAULTS
+from src.utils.stage_metrics import record_escalation, record_model_call, record_retry, record_served
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MODEL_TIER_TIMEOUT_SECONDS = float(os.getenv("MODEL_TIER_TIMEOUT_SECONDS", "60"))
+
+# stage → retries of the last tier on invalid output, unless <STAGE>_MODEL_RETRIES is set
+STAGE_RETRIES = {"vision": 1, "heuristic": 1, "feedback": 0, "wireframe": 0}
+
+
+class CascadeExhausted(RuntimeError):
+    """No tier produced a valid output. last_text is the last output received, if any."""
+
+    def __init__(self, stage: str, errors: list[str], last_text: Optional[str] = None):
+        super().__init__(f"{stage}: no model produced a valid output ({'; '.join(errors)})")
+        self.stage = stage
+        self.errors = errors
+        self.last_text = last_text
+
+
+def tiers(stage: str) -> list[str]:
+    """Models of `stage`, from <STAGE>_MODEL_CASCADE or just its default model."""
+    configured = os.getenv(f"{stage.upper()}_MODEL_CASCADE", "")
+    models = [m.strip() for m in configured.split(",") if m.strip()]
+    return models or [STAGE_DEFAULTS[stage][1]]
+
+
+def retry_count(stage: str) -> int:
+    return int(os.getenv(f"{stage.upper()}_MODEL_RETRIES", STAGE_RETRIES.get(stage, 0)))
+
+
+def require_keys(data, *keys: str):
+    """Schema check for JSON stages: an object with every key in `keys`."""
+    if not isinstance(data, dict):
+        raise ValueError(f"expected a JSON object, got {type(data).__name__}")
+    missing = [k for k in keys if k not in data]
+    if missing:
+        raise ValueError(f"missing keys: {', '.join(missing)}")
+    return data
+
+
+def _call(call: Callable, model: str, timeout: Optional[float]):
+    if not timeout:
+        return call(model)
+    # A thread per timed call, not a pool: time queued behind other calls would count
+    # against the tier's timeout. One that times out finishes in the background and is dropped
+    future = concurrent.futures.Future()
+    context = contextvars.copy_context()
+
+    def target():
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(context.run(call, model))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=target, name="model-call", daemon=True).start()
+    try:
+        return future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        raise TimeoutError(f"no response within {timeout:g}s") from None
+
+
+def run(stage: str, models: list[str], call: Callable[[str], Any], parse: Callable[[str], Any],
+        timeout: float = MODEL_TIER_TIMEOUT_SECONDS, retries: Optional[int] = None) -> Any:
+    """
+    call(model) returns the model response (with .text); parse(text) returns
+    the stage output or raises ValueError. Returns parse()'s result.
+    retries defaults to retry_count(stage).
+    """
+    errors, last_text = [], None
+    last = len(models) - 1
+    retries = retry_count(stage) if retries is None else retries
+    for tier, model in enumerate(models):
+        if tier:
+            record_escalation(stage)
+        attempts = 1 + retries if tier == last else 1
+        for attempt in range(attempts):
+            # before every call, tier 0 included: crewai retries a failed tool
+            # call, and a cancelled run must not start another model call
+            cancellation.check()
+            if attempt:
+                record_retry(stage)
+            started = time.perf_counter()
+            try:
+                response = _call(call, model, timeout if tier < last else None)
+            except Exception as e:
+                errors.append(f"{model}: {e}")
+                logger.warning("[%s] Tier %d (%s) failed: %s", stage.upper(), tier, model, e)
+                break
+            record_model_call(stage, model, time.perf_counter() - started, response, tier=tier)
+            last_text = (response.text or "").strip()
+            try:
+                output = parse(last_text)
+            except ValueError as e:
+                errors.append(f"{model}: {e}")
+                logger.warning("[%s] Tier %d (%s) returned invalid output: %s", stage.upper(), tier, model, e)
+                continue
+            record_served(stage, model, tier)
+            return output
+    raise CascadeExhausted(stage, errors, last_text)
@@ -0,0 +1,207 @@
+"""
+Per-run stage instrumentation.
+
+A PipelineMetrics recorder is bound to the current context with
+start_run(); the API, the crew driver and the tools then record into it
+without passing it around. Starlette's run_in_threadpool copies the
+context into the worker thread, so tools executed by the crew see the
+recorder of the request that started them. Outside a run every call is
+a no-op.
+
+    metrics = start_run(evaluation_id)
+    with stage("vision"):
+        started = time.perf_counter()
+        response = client.models.generate_content(...)
+        record_model_call("vision", model_name, time.perf_counter() - started, response)
+    metrics.to_dict()   # stored on the evaluation as `metrics`
+
+With a model cascade (src.utils.model_cascade), `served_by` names the
+model and tier that produced each stage's output, and `escalations` counts
+the moves to a larger tier.
+
+Costs use MODEL_PRICES, a JSON object of USD per 1M tokens:
+    MODEL_PRICES='{"gemini-2.5-flash": [0.30, 2.50]}'
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from src.utils import tracing
+
+STAGES = ("upload", "queue", "vision", "heuristic", "feedback", "wireframe", "agent", "db")
+TOOL_STAGES = ("vision", "heuristic", "feedback", "wireframe")
+
+_current: ContextVar[Optional["PipelineMetrics"]] = ContextVar("pipeline_metrics", default=None)
+
+
+def _load_prices() -> dict:
+    try:
+        return {model: tuple(price) for model, price in json.loads(os.getenv("MODEL_PRICES", "{}")).items()}
+    except (ValueError, TypeError):
+        return {}
+
+
+MODEL_PRICES = _load_prices()
+
+
+def _empty_stage() -> dict:
+    return {
+        "wall_seconds": 0.0,
+        "model_seconds": 0.0,
+        "model_calls": 0,
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "retries": 0,
+        "escalations": 0,
+        "cache_hits": 0,
+        "cost_usd": 0.0,
+    }
+
+
+class PipelineMetrics:
+    def __init__(self, evaluation_id: str = ""):
+        self.evaluation_id = evaluation_id
+        self.stages: dict[str, dict] = {}
+        self.served_by: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _stage(self, name: str) -> dict:
+        return self.stages.setdefault(name, _empty_stage())
+
+    def add(self, name: str, **values):
+        with self._lock:
+            entry = self._stage(name)
+            for key, value in values.items():
+                entry[key] += value
+
+    def merge(self, snapshot: dict):
+        """Adds the stages of another run's to_dict() (e.g. recorded in a worker process)."""
+        for name, values in (snapshot or {}).get("stages", {}).items():
+            self.add(name, **values)
+        with self._lock:
+            self.served_by.update((snapshot or {}).get("served_by", {}))
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            stages = {
+                name: {k: round(v, 4) if isinstance(v, float) else v for k, v in entry.items()}
+                for name, entry in self.stages.items()
+            }
+            served_by = {name: dict(served) for name, served in self.served_by.items()}
+        totals = {key: sum(s[key] for s in stages.values()) for key in ("input_tokens", "output_tokens", "model_calls")}
+        totals["cost_usd"] = round(sum(s["cost_usd"] for s in stages.values()), 6)
+        return {"stages": stages, "totals": totals, "served_by": served_by}
+
+
+def start_run(evaluation_id: str = "") -> PipelineMetrics:
+    """Binds a fresh recorder to the current context and returns it."""
+    metrics = PipelineMetrics(evaluation_id)
+    _current.set(metrics)
+    return metrics
+
+
+def current() -> Optional[PipelineMetrics]:
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str):
+    """Adds the block's wall time to `name`, also when it raises. Traced as span `stage.<name>`."""
+    started = time.perf_counter()
+    try:
+        with tracing.span(f"stage.{name}"):
+            yield
+    finally:
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.add(name, wall_seconds=time.perf_counter() - started)
+
+
+def _token_counts(response) -> tuple[int, int]:
+    """(input, output) tokens from a genai / vertexai response's usage_metadata."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return 0, 0
+    return (getattr(usage, "prompt_token_count", 0) or 0,
+            getattr(usage, "candidates_token_count", 0) or 0)
+
+
+def record_model_call(stage_name: str, model: str, seconds: float, response=None,
+                      input_tokens: int = None, output_tokens: int = None, tier: int = 0):
+    """One model round trip. Tokens come from the response unless given explicitly."""
+    if input_tokens is None or output_tokens is None:
+        input_tokens, output_tokens = _token_counts(response)
+    tracing.record_span(f"model.{stage_name}", seconds, **{
+        "gen_ai.request.model": model or "",
+        "gen_ai.usage.input_tokens": input_tokens,
+        "gen_ai.usage.output_tokens": output_tokens,
+        "heuruxagent.model.tier": tier,
+    })
+    metrics = _current.get()
+    if metrics is None:
+        return
+    price_in, price_out = MODEL_PRICES.get(model or "", (0.0, 0.0))
+    metrics.add(
+        stage_name,
+        model_seconds=seconds,
+        model_calls=1,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cost_usd=(input_tokens * price_in + output_tokens * price_out) / 1_000_000,
+    )
+
+
+def record_retry(stage_name: str):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add(stage_name, retries=1)
+
+
+def record_escalation(stage_name: str):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add(stage_name, escalations=1)
+
+
+def record_served(stage_name: str, model: str, tier: int):
+    """The cascade tier whose output the stage kept."""
+    metrics = _current.get()
+    if metrics is not None:
+        with metrics._lock:
+            metrics.served_by[stage_name] = {"model": model or "", "tier": tier}
+
+
+def record_cache_hit(stage_name: str):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.add(stage_name, cache_hits=1)
+
+
+def tool_seconds() -> float:
+    """Wall time recorded so far by the tool stages of the current run."""
+    metrics = _current.get()
+    if metrics is None:
+        return 0.0
+    with metrics._lock:
+        return sum(metrics.stages[s]["wall_seconds"] for s in TOOL_STAGES if s in metrics.stages)
+
+
+def record_agent_overhead(kickoff_seconds: float, tool_seconds_during: float, usage=None):
+    """
+    Agent reasoning around the tools: kickoff wall time minus the tool time
+    inside it, plus the crew's own LLM usage (crewai UsageMetrics).
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return
+    metrics.add(
+        "agent",
+        wall_seconds=max(0.0, kickoff_seconds - tool_seconds_during),
+        model_calls=getattr(usage, "successful_requests", 0) or 0,
+        input_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+        output_tokens=getattr(usage, "completion_tokens", 0) or 0,
+    )
@@ -0,0 +1,212 @@
+"""
+OpenTelemetry tracing for the API, the crew and its tools.
+
+Spans: one per HTTP request (app.main middleware), one per crew Task
+(crew.TracedTask), one per pipeline stage (stage_metrics.stage), one per model
+call, Mongo command (MongoTracingListener) and S3 call. Every span started
+while an evaluation is bound carries its `evaluation_id`; OTel context
+lives in contextvars, so it follows run_in_threadpool into the crew thread.
+
+Configured from the environment:
+    TRACING_EXPORTER=console | file | otlp    (unset → tracing off, no-op spans)
+    TRACING_FILE=data/outputs/traces.jsonl    (file exporter, one span per line)
+    OTEL_EXPORTER_OTLP_ENDPOINT=http://localhost:4318   (otlp, standard OTel env)
+    OTEL_SERVICE_NAME=heuruxagent-api
+
+A private TracerProvider is used instead of the global one: crewai installs
+its own global provider for its telemetry.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+from opentelemetry import context as otel_context
+from opentelemetry import propagate, trace
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+TRACING_EXPORTER = (os.getenv("TRACING_EXPORTER") or "").lower()
+TRACING_FILE = Path(os.getenv("TRACING_FILE", "data/outputs/traces.jsonl"))
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "heuruxagent-api")
+
+_evaluation_id: ContextVar[Optional[str]] = ContextVar("trace_evaluation_id", default=None)
+_tracer = trace.NoOpTracer()
+_provider = None
+_setup_lock = threading.Lock()
+
+
+def _file_exporter(path: Path):
+    from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+    class JsonLinesSpanExporter(SpanExporter):
+        def __init__(self):
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(path, "a", encoding="utf-8")
+            self._lock = threading.Lock()
+
+        def export(self, spans):
+            lines = [span.to_json(indent=None) + "\n" for span in spans]
+            with self._lock:
+                self._file.writelines(lines)
+                self._file.flush()
+            return SpanExportResult.SUCCESS
+
+        def shutdown(self):
+            self._file.close()
+
+    return JsonLinesSpanExporter()
+
+
+def _exporter(kind: str):
+    if kind == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+        return ConsoleSpanExporter()
+    if kind == "file":
+        return _file_exporter(TRACING_FILE)
+    if kind == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    raise ValueError(f"Unknown TRACING_EXPORTER '{kind}' (expected: console | file | otlp)")
+
+
+def setup_tracing(exporter: str = TRACING_EXPORTER) -> bool:
+    """Installs the tracer once per process. Returns False when tracing stays off."""
+    global _tracer, _provider
+    if not exporter or _provider is not None:
+        return _provider is not None
+    with _setup_lock:
+        if _provider is not None:
+            return True
+        try:
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import SpanProcessor, TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+            class EvaluationIdProcessor(SpanProcessor):
+                def on_start(self, span, parent_context=None):
+                    evaluation_id = _evaluation_id.get()
+                    if evaluation_id:
+                        span.set_attribute("evaluation_id", evaluation_id)
+
+            provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+            provider.add_span_processor(EvaluationIdProcessor())
+            provider.add_span_processor(BatchSpanProcessor(_exporter(exporter)))
+        except ImportError as e:
+            logger.warning("[TRACING] Disabled, OpenTelemetry SDK/exporter missing: %s", e)
+            return False
+        _provider = provider
+        _tracer = provider.get_tracer("heuruxagent")
+        if os.getenv("OTEL_SDK_DISABLED", "").lower() == "true":
+            logger.warning("[TRACING] OTEL_SDK_DISABLED=true, no spans will be exported")
+        else:
+            logger.info("[TRACING] Exporting spans via %s", exporter)
+        return True
+
+
+def shutdown_tracing():
+    if _provider is not None:
+        _provider.shutdown()
+
+
+def bind_evaluation(evaluation_id: str):
+    """Tags the current span and every span started after it in this context."""
+    _evaluation_id.set(evaluation_id)
+    trace.get_current_span().set_attribute("evaluation_id", evaluation_id)
+
+
+def log_context() -> dict:
+    """evaluation_id and trace/span ids of the current context, for log records."""
+    context = {}
+    evaluation_id = _evaluation_id.get()
+    if evaluation_id:
+        context["evaluation_id"] = evaluation_id
+    span_context = trace.get_current_span().get_span_context()
+    if span_context.is_valid:
+        context["trace_id"] = format(span_context.trace_id, "032x")
+        context["span_id"] = format(span_context.span_id, "016x")
+    return context
+
+
+@contextmanager
+def span(name: str, kind: SpanKind = SpanKind.INTERNAL, **attributes):
+    """Current-context span; exceptions are recorded and re-raised."""
+    with _tracer.start_as_current_span(name, kind=kind, attributes=attributes or None) as current:
+        yield current
+
+
+def record_span(name: str, seconds: float, **attributes):
+    """A child span for work that has already finished (e.g. a timed model call)."""
+    end = time.time_ns()
+    finished = _tracer.start_span(name, start_time=end - int(seconds * 1e9), attributes=attributes or None)
+    finished.end(end_time=end)
+
+
+@contextmanager
+def server_span(method: str, path: str, headers):
+    """Request span continuing any incoming W3C traceparent."""
+    token = otel_context.attach(propagate.extract(headers))
+    try:
+        with span(f"{method} {path}", kind=SpanKind.SERVER,
+                  **{"http.request.method": method, "url.path": path}) as current:
+            yield current
+    finally:
+        otel_context.detach(token)
+
+
+class MongoTracingListener:
+    """pymongo CommandListener: one CLIENT span per command, parented to the caller's span."""
+
+    def __init__(self):
+        self._spans = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        current = _tracer.start_span(
+            f"mongo.{event.command_name}",
+            kind=SpanKind.CLIENT,
+            attributes={
+                "db.system": "mongodb",
+                "db.name": event.database_name,
+                "db.operation": event.command_name,
+                "db.mongodb.collection": str(event.command.get(event.command_name, "")),
+            },
+        )
+        with self._lock:
+            self._spans[(event.request_id, event.connection_id)] = current
+
+    def _finish(self, event, error: str = None):
+        with self._lock:
+            current = self._spans.pop((event.request_id, event.connection_id), None)
+        if current is None:
+            return
+        if error:
+            current.set_status(Status(StatusCode.ERROR, error))
+        current.end()
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event, json.dumps(event.failure, default=str)[:500])
+
+
+def mongo_listeners() -> list:
+    """event_listeners for MongoClient; empty when tracing is off."""
+    if not setup_tracing():
+        return []
+    from pymongo import monitoring
+
+    class MongoCommandTracer(MongoTracingListener, monitoring.CommandListener):
+        pass
+
+    return [MongoCommandTracer()]
@@ -1,6 +1,13 @@
 from crewai import Agent, Crew, Process, Task, LLM
 from crewai.project import CrewBase, agent, crew, task
+from crewai.tasks.output_format import OutputFormat
+from crewai.tasks.task_output import TaskOutput
+from typing import Optional
 from src.ws_manager import safe_emit
+from src.utils.tracing import span
+from src.utils import cancellation, checkpoint
+from src.utils.stage_metrics import record_cache_hit
+from src.utils.log_config import CREW_VERBOSE
 import os
 from dotenv import load_dotenv 
 from .tools import (
@@ -12,14 +19,51 @@ from .tools import (
 
 load_dotenv()
 
+
+class TracedTask(Task):
+    """
+    Task with one tracing span per execution, skipped once the run is cancelled.
+    With `restored` set (the stage's checkpoint from an earlier attempt) it
+    returns that output without calling the agent; later tasks get it as context.
+    """
+    stage: str = ""
+    restored: Optional[str] = None
+
+    def execute_sync(self, agent=None, context=None, tools=None):
+        cancellation.check()
+        if self.restored is not None:
+            return self._restore(agent)
+        with span(f"task {self.name or 'unnamed'}", **{"crewai.agent": getattr(agent, "role", "") or ""}):
+            return super().execute_sync(agent=agent, context=context, tools=tools)
+
+    def _restore(self, agent) -> TaskOutput:
+        output = TaskOutput(
+            name=self.name,
+            description=self.description,
+            expected_output=self.expected_output,
+            raw=self.restored,
+            agent=getattr(agent, "role", "") or "",
+            output_format=OutputFormat.RAW,
+        )
+        self.output = output
+        record_cache_hit(self.stage)
+        if self.callback:
+            self.callback(output)
+        return output
+
+
 @CrewBase
 class UxFeedbackCrew():
     agents_config = 'config/agents.yaml'
     tasks_config  = 'config/tasks.yaml'
 
-    def __init__(self, client_id: str, evaluation_id: str = ""):
+    def __init__(self, client_id: str, evaluation_id: str = "",
+                 restored: Optional[dict] = None, save_checkpoints: bool = True):
         self.client_id     = client_id
         self.evaluation_id = evaluation_id
+        # stage → output of an earlier attempt (see src.utils.checkpoint)
+        self.restored         = restored or {}
+        self.save_checkpoints = save_checkpoints
 
         # Load LLMs from .env once, reuse across agents
         self.llm_vision     = LLM(model=f"gemini/{os.getenv('GEMINI_VISION_MODEL')}")
@@ -27,10 +71,16 @@ class UxFeedbackCrew():
         self.llm_feedback   = LLM(model=f"gemini/{os.getenv('GENERIC_FEEDBACK_MODEL')}")  
         self.llm_wireframe  = LLM(model=f"gemini/{os.getenv('GEMINI_WIREFRAME_MODEL')}")
 
-    def _progress(self, label: str, step: int):
-        def callback(_output):
-            safe_emit(self.client_id, f"Completed: {label}", step)
+    def _completed(self, stage: str, label: str, step: int):
+        def callback(output):
+            if self.save_checkpoints and stage not in self.restored:
+                checkpoint.save(self.evaluation_id, stage, str(output.raw))
+            safe_emit(self.client_id, f"Completed: {label}", step, evaluation_id=self.evaluation_id or None)
         return callback
+
+    def _task(self, name: str, stage: str, label: str, step: int, **kwargs) -> Task:
+        return TracedTask(config=self.tasks_config[name], stage=stage, restored=self.restored.get(stage),
+                          callback=self._completed(stage, label, step), **kwargs)
     
     # Agents 
 
@@ -39,13 +89,13 @@ class UxFeedbackCrew():
         return Agent(config=self.agents_config['vision_analyst'],
                      tools=[analyze_ui_screenshot], 
                      llm=self.llm_vision,
-                     verbose=True, allow_delegation=False)
+                     verbose=CREW_VERBOSE, allow_delegation=False)
 
     @agent
     def heuristic_evaluator(self) -> Agent:
         return Agent(config=self.agents_config['heuristic_evaluator'],
                      llm=self.llm_heuristic,
-                     tools=[evaluate_heuristics], verbose=True, allow_delegation=False)
+                     tools=[evaluate_heuristics], verbose=CREW_VERBOSE, allow_delegation=False)
 
     @agent
     def feedback_specialist(self) -> Agent:
@@ -54,36 +104,32 @@ class UxFeedbackCrew():
                         temperature=0.2,
                     max_tokens=2048,
                     output_format="",
-                     tools=[generate_feedback], verbose=True, allow_delegation=False)
+                     tools=[generate_feedback], verbose=CREW_VERBOSE, allow_delegation=False)
 
     @agent
     def wireframe_designer(self) -> Agent:
         return Agent(config=self.agents_config['wireframe_designer'],
                      llm=self.llm_wireframe,
-                     tools=[create_wireframe], verbose=True, allow_delegation=False)
+                     tools=[create_wireframe], verbose=CREW_VERBOSE, allow_delegation=False)
 
     # Tasks
 
     @task
     def analyze_ui(self) -> Task:
-        return Task(config=self.tasks_config['analyze_ui'],
-                    callback=self._progress("Vision Analysis", 25))
+        return self._task('analyze_ui', "vision", "Vision Analysis", 25)
 
     @task
     def evaluate_heuristics(self) -> Task:
-        return Task(config=self.tasks_config['evaluate_heuristics'],
-                    callback=self._progress("Heuristic Evaluation", 50))
+        return self._task('evaluate_heuristics', "heuristic", "Heuristic Evaluation", 50)
 
     @task
     def generate_feedback(self) -> Task:
-        return Task(config=self.tasks_config['generate_feedback'],
-                    callback=self._progress("Feedback Generation", 75),
-                    human_input=False)
+        return self._task('generate_feedback', "feedback", "Feedback Generation", 75,
+                          human_input=False)
 
     @task
     def create_wireframe(self) -> Task:
-        return Task(config=self.tasks_config['create_wireframe'],
-                    callback=self._progress("Wireframe Creation", 90))
+        return self._task('create_wireframe', "wireframe", "Wireframe Creation", 90)
 
     # Full pipeline
 
@@ -95,7 +141,7 @@ class UxFeedbackCrew():
             tasks=[self.analyze_ui(), self.evaluate_heuristics(),
                    self.generate_feedback(), self.create_wireframe()],
             process=Process.sequential,
-            verbose=True,
+            verbose=CREW_VERBOSE,
         )
 
     def wireframe_regen_crew(self) -> Crew:
@@ -103,5 +149,5 @@ class UxFeedbackCrew():
             agents=[self.wireframe_designer()],
             tasks=[self.create_wireframe()],
             process=Process.sequential,
-            verbose=True,
+            verbose=CREW_VERBOSE,
         )
\ No newline at end of file
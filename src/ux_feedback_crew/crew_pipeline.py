@@ -1,13 +1,33 @@
+import time
 from ux_feedback_crew.crew import UxFeedbackCrew
+from src.utils.stage_metrics import tool_seconds, record_agent_overhead
+from src.utils import cancellation
 
-def run_full_ux_pipeline_raw(image_path: str, client_id: str, evaluation_id: str = ""):
-    """Full pipeline: Vision → Heuristics → Feedback → Wireframe."""
-    crew_instance = UxFeedbackCrew(client_id=client_id, evaluation_id=evaluation_id)
-    result = crew_instance.full_flow_crew().kickoff(
-        inputs={"screenshot_path": image_path}
+
+def _kickoff(crew, inputs: dict):
+    """Runs the crew and attributes the time outside the tools to agent overhead."""
+    cancellation.check()
+    tools_before = tool_seconds()
+    started = time.perf_counter()
+    result = crew.kickoff(inputs=inputs)
+    record_agent_overhead(
+        time.perf_counter() - started,
+        tool_seconds() - tools_before,
+        getattr(result, "token_usage", None),
     )
     return result
 
+def run_full_ux_pipeline_raw(image_path: str, client_id: str, evaluation_id: str = "",
+                             restored: dict | None = None):
+    """
+    Full pipeline: Vision → Heuristics → Feedback → Wireframe.
+    `restored` (stage → output, from the evaluation's checkpoints) resumes
+    an earlier attempt: those stages are not run again.
+    """
+    crew_instance = UxFeedbackCrew(client_id=client_id, evaluation_id=evaluation_id, restored=restored)
+    result = _kickoff(crew_instance.full_flow_crew(), {"screenshot_path": image_path})
+    return result
+
 
 def run_wireframe_regen_raw(
     client_id: str,
@@ -24,8 +44,9 @@ def run_wireframe_regen_raw(
     Passes all context to the wireframe agent so it can produce
     an improved design incorporating the user's specific comments.
     """
-    crew_instance = UxFeedbackCrew(client_id=client_id, evaluation_id=evaluation_id)
-    result = crew_instance.wireframe_regen_crew().kickoff(inputs={
+    # The evaluation is complete: a regenerated wireframe is not a checkpoint
+    crew_instance = UxFeedbackCrew(client_id=client_id, evaluation_id=evaluation_id, save_checkpoints=False)
+    result = _kickoff(crew_instance.wireframe_regen_crew(), {
         "screenshot_path": image_path,
         "vision_analysis": vision_analysis,
         "heuristic_evaluation": heuristic_evaluation,
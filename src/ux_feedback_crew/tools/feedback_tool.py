@@ -1,23 +1,21 @@
-import os
 import json
+import logging
 import re
 from pathlib import Path
 from dotenv import load_dotenv
 from crewai.tools import tool
 from src.utils.context_guard import truncate_text
+from src.utils import model_backends, model_cascade
+from src.utils.stage_metrics import stage
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 OUTPUT_DIR = Path("data/outputs")
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
-# model_name = os.getenv("FINETUNED_FEEDBACK_MODEL") or os.getenv("GENERIC_FEEDBACK_MODEL") or "gemini-2.5-flash"
-model_name = "projects/75094798515/locations/us-central1/endpoints/1191994299567308800"
-
-import vertexai
-from vertexai.generative_models import GenerativeModel
-
-vertexai.init(project="heuruxagent", location="us-central1")
+models = model_cascade.tiers("feedback")
 
 
 # Helpers
@@ -244,6 +242,7 @@ def convert_feedback_to_markdown(feedback_data: dict) -> str:
 
 # Tool
 @tool("generate_feedback")
+@stage("feedback")
 def generate_feedback(vision_analysis: str, heuristic_evaluation: str, evaluation_id: str = "") -> str:
     """
     Convert UX violations into developer-friendly feedback JSON and save report.
@@ -335,30 +334,27 @@ STRICT RULES:
 RETURN ONLY JSON.
 """
 
-    model = GenerativeModel(model_name)
-    try:
-        response = model.generate_content(
-            prompt,
-            generation_config={
-                "temperature": 0.1
-            }
-        )
-    except Exception as e:
-        return f"Error calling model: {e}"
-
-    raw_text = (response.text or "").strip()
+    def parse(raw: str) -> dict:
+        # Any JSON object: _normalize_feedback fills in whatever the model left out
+        return model_cascade.require_keys(_extract_json(raw))
 
     try:
-        parsed_data = _extract_json(raw_text)
-    except Exception as e:
-        print(f"JSON parse error: {e}")
+        parsed_data = model_cascade.run(
+            "feedback", models,
+            model_backends.caller("feedback", prompt, temperature=0.1),
+            parse,
+        )
+    except model_cascade.CascadeExhausted as e:
+        if not e.last_text:
+            return f"Error calling model: {e}"
+        logger.warning("[FEEDBACK] JSON parse error: %s", e)
 
         file_id = evaluation_id if evaluation_id else "latest"
         raw_path = OUTPUT_DIR / f"feedback_raw_{file_id}.txt"
         with open(raw_path, "w", encoding="utf-8") as f:
-            f.write(raw_text)
+            f.write(e.last_text)
 
-        return raw_text
+        return e.last_text
 
     parsed_data = _normalize_feedback(parsed_data)
 
@@ -374,6 +370,6 @@ RETURN ONLY JSON.
     with open(md_path, "w", encoding="utf-8") as f:
         f.write(md_content)
 
-    print(f"✓ Saved → {json_path} | {md_path}")
+    logger.info("[FEEDBACK] Saved %s | %s", json_path, md_path)
 
     return json.dumps(parsed_data, ensure_ascii=False)
\ No newline at end of file
@@ -1,17 +1,20 @@
 from crewai.tools import tool
-from google import genai
 import json
-import os
+import logging
 import re
 from pathlib import Path
 from dotenv import load_dotenv
 from src.utils.context_guard import compress_vision, compress_heuristics, truncate_text
+from src.utils import model_backends, model_cascade
+from src.utils.stage_metrics import stage
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 OUTPUT_DIR = Path("data/outputs")
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-model_name = os.getenv("GEMINI_HEURISTIC_MODEL")
+models = model_cascade.tiers("heuristic")
 
 
 def _extract_json(text: str) -> dict:
@@ -35,6 +38,7 @@ def _extract_json(text: str) -> dict:
 
 
 @tool("evaluate_heuristics")
+@stage("heuristic")
 def evaluate_heuristics(vision_analysis: str) -> str:
     """
     Evaluate UI design against Nielsen's heuristics and return structured JSON.
@@ -45,12 +49,6 @@ def evaluate_heuristics(vision_analysis: str) -> str:
     Returns:
         JSON string containing violations, strengths, and overall UX score.
     """
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY not set")
-
-    client = genai.Client(api_key=api_key)
-
     # compress vision input
     vision_data = json.loads(vision_analysis)
     vision_data = compress_vision(vision_data)
@@ -81,26 +79,20 @@ Return ONLY JSON:
 }}
 """
 
-    last_error = None
+    def parse(raw: str) -> dict:
+        return model_cascade.require_keys(_extract_json(raw), "violations")
 
-    for _ in range(2):
-        response = client.models.generate_content(
-            model=model_name,
-            contents=prompt
+    try:
+        parsed = model_cascade.run(
+            "heuristic", models,
+            model_backends.caller("heuristic", prompt),
+            parse,
         )
-        raw = response.text.strip()
-
-        try:
-            parsed = _extract_json(raw)
-            break
-        except Exception as e:
-            last_error = e
-            print("⚠ Heuristic parsing failed — retrying once...")
-    else:
-        raise ValueError("Heuristic model did not return valid JSON")
+    except model_cascade.CascadeExhausted as e:
+        raise ValueError(f"Heuristic model did not return valid JSON: {e}") from None
 
     path = OUTPUT_DIR / "heuristics.json"
     path.write_text(json.dumps(parsed, indent=2, ensure_ascii=False))
-    print(f"✓ Heuristics saved → {path}")
+    logger.info("[HEURISTIC] Saved %s", path)
 
     return json.dumps(parsed)
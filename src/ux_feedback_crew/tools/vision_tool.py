@@ -1,19 +1,21 @@
 from crewai.tools import tool
-from google import genai
 from dotenv import load_dotenv
 from PIL import Image
 from pathlib import Path
-import os
-import io
+import logging
 import json
 import re
-import requests
+from src.utils.http_client import fetch_to_cache
+from src.utils import model_backends, model_cascade
+from src.utils.stage_metrics import stage, record_cache_hit
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 OUTPUT_DIR = Path("data/outputs")
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-model_name = os.getenv("GEMINI_VISION_MODEL")
+models = model_cascade.tiers("vision")
 
 
 def _extract_json(text: str) -> dict:
@@ -41,6 +43,7 @@ def _extract_json(text: str) -> dict:
 
 
 @tool("analyze_ui_screenshot")
+@stage("vision")
 def analyze_ui_screenshot(image_path: str) -> str:
     """
     Analyze a mobile UI screenshot and extract structured UX information.
@@ -51,21 +54,17 @@ def analyze_ui_screenshot(image_path: str) -> str:
     Returns:
         JSON string describing UI components, layout, colors, typography, and UX patterns.
     """
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY not set in .env")
-
-    client = genai.Client(api_key=api_key)
-
     if image_path.startswith("http"):
-        response = requests.get(image_path)
-        response.raise_for_status()
-        img = Image.open(io.BytesIO(response.content))
+        # Pooled, size-limited, streamed to disk; unchanged images are revalidated, not refetched
+        local_path, cached = fetch_to_cache(image_path)
+        if cached:
+            record_cache_hit("vision")
     else:
-        img = Image.open(image_path)
-
-    img_bytes = io.BytesIO()
-    img.save(img_bytes, format=img.format or "PNG")
+        local_path = image_path
+    # Decode fully and close the file now; Image.open alone keeps the handle until the image is collected
+    with open(local_path, "rb") as f:
+        img = Image.open(f)
+        img.load()
 
     prompt = """
 Analyze this mobile UI screenshot and extract detailed information.
@@ -84,28 +83,21 @@ Return ONLY valid JSON in this structure:
 }
 """
 
-    last_error = None
+    def parse(raw: str) -> dict:
+        return model_cascade.require_keys(_extract_json(raw), "components")
 
-    for attempt in range(2): 
-        response = client.models.generate_content(
-            model=model_name,
-            contents=[prompt, img]
+    try:
+        parsed = model_cascade.run(
+            "vision", models,
+            model_backends.caller("vision", [prompt, img]),
+            parse,
         )
-
-        raw = response.text.strip()
-
-        try:
-            parsed = _extract_json(raw)
-            break
-        except Exception as e:
-            last_error = e
-            print("⚠ Vision output parsing failed — retrying once...")
-    else:
-        raise ValueError("Vision model did not return valid JSON after retry")
+    except model_cascade.CascadeExhausted as e:
+        raise ValueError(f"Vision model did not return valid JSON: {e}") from None
 
     path = OUTPUT_DIR / "vision.json"
     with open(path, "w", encoding="utf-8") as f:
         json.dump(parsed, f, indent=2, ensure_ascii=False)
 
-    print(f"✓ Vision analysis saved → {path}")
+    logger.info("[VISION] Saved %s", path)
     return json.dumps(parsed)
@@ -1,16 +1,38 @@
 from crewai.tools import tool
-from google import genai
-import os
+import logging
 from pathlib import Path
 from dotenv import load_dotenv
+from src.utils import model_backends, model_cascade
+from src.utils.stage_metrics import stage
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 OUTPUT_DIR = Path("data/outputs")
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-model_name = os.getenv("GEMINI_WIREFRAME_MODEL")
+models = model_cascade.tiers("wireframe")
+
+
+def _strip_fences(text: str) -> str:
+    html = text.strip()
+    if "```" in html:
+        html = html.split("```")[1].strip()
+        if html[:4].lower() == "html":
+            html = html[4:].strip()
+    return html
+
+
+def _extract_html(text: str) -> str:
+    html = _strip_fences(text)
+    lowered = html.lower()
+    if "<html" not in lowered and "<body" not in lowered:
+        raise ValueError("no HTML document in model output")
+    return html
+
 
 @tool("create_wireframe")
+@stage("wireframe")
 def create_wireframe(vision_analysis: str, 
     feedback_result: str, 
     feedback_user_comment: str = "", 
@@ -29,12 +51,6 @@ def create_wireframe(vision_analysis: str,
     if not feedback_result or len(feedback_result.strip()) < 50:
         raise ValueError("Wireframe generation blocked — feedback missing or invalid")
 
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY not set")
-
-    client = genai.Client(api_key=api_key)
-
     prompt = f"""
 You are an expert UI/UX designer.
 
@@ -78,18 +94,22 @@ USER REQUESTS FOR WIREFRAME CHANGES:
 Return ONLY a single HTML document (no markdown).
 """
 
-    response = client.models.generate_content(
-        model=model_name,
-        contents=prompt
-    )
-
-    html = response.text.strip()
-    if "```" in html:
-        html = html.split("```")[1].strip()
+    try:
+        html = model_cascade.run(
+            "wireframe", models,
+            model_backends.caller("wireframe", prompt),
+            _extract_html,
+        )
+    except model_cascade.CascadeExhausted as e:
+        if not e.last_text:
+            raise
+        # Unchecked output is what this stage always returned; better than failing the run
+        logger.warning("[WIREFRAME] %s", e)
+        html = _strip_fences(e.last_text)
 
     path = OUTPUT_DIR / "wireframe.html"
     with open(path, "w", encoding="utf-8") as f:
         f.write(html)
 
-    print(f"✓ Wireframe saved → {path}")
+    logger.info("[WIREFRAME] Saved %s", path)
     return html
@@ -1,66 +1,308 @@
 from fastapi import WebSocket
+from collections import OrderedDict, deque
 import asyncio
 import logging
 import json
+import os
+import threading
+import uuid
+
+from src.progress_bus import create_bus
 
 logger = logging.getLogger("ws_manager")
 
+# Events kept per evaluation for resuming clients, and evaluations kept overall
+WS_BUFFER_SIZE   = int(os.getenv("WS_BUFFER_SIZE", "100"))
+WS_MAX_STREAMS   = int(os.getenv("WS_MAX_STREAMS", "1000"))
+# A socket that can't take a frame within this many seconds is dropped
+WS_SEND_TIMEOUT  = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+
+
+class _Stream:
+    """Bounded, sequence-numbered event history of one evaluation."""
+
+    def __init__(self, client_id: str):
+        self.client_id = client_id
+        self.seq = 0
+        self.events = deque(maxlen=WS_BUFFER_SIZE)
+
+    def append(self, payload: dict) -> dict:
+        if payload.get("seq"):
+            # Assigned by the bus (shared across workers)
+            self.seq = max(self.seq, payload["seq"])
+        else:
+            self.seq += 1
+            payload["seq"] = self.seq
+        self.events.append(payload)
+        return payload
+
+    def after(self, last_seq: int) -> list[dict]:
+        return [event for event in self.events if event["seq"] > last_seq]
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: dict[str, WebSocket] = {}
+    """
+    client_id → set of sockets (tabs, reconnects), plus a ring buffer of
+    recent events per evaluation so a reconnecting client can resume from
+    the last `seq` it saw. Sends to a client's sockets run concurrently,
+    each with a timeout, so one slow socket can't stall the others.
 
-    async def connect(self, client_id: str, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections[client_id] = websocket
-        logger.info(f"[WS] Client connected: {client_id}")
+    Once started, events go through the progress bus: every worker receives
+    every event, buffers it and delivers it to the sockets it holds. Control
+    events (publish_control) ride the same bus to handlers registered with
+    on_control, e.g. cancelling a run owned by another worker.
+
+    Presence is shared the same way: a worker announces a client's first
+    socket and its last one going, so is_connected() sees sockets held by
+    any worker. A worker that dies without announcing leaves its clients
+    marked connected, which only means their runs aren't cancelled.
+    """
+
+    def __init__(self, bus=None):
+        self.active_connections: dict[str, set[WebSocket]] = {}
+        self.streams: OrderedDict[str, _Stream] = OrderedDict()
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.bus = bus or create_bus()
+        self._started = False
+        self._control: dict = {"presence": self._on_presence, "presence_query": self._on_presence_query}
+        self._lock = threading.Lock()   # streams are appended from crew threads via safe_emit
+        self.worker_id = uuid.uuid4().hex
+        # client_id → other workers holding a socket of it
+        self.remote_clients: dict[str, set[str]] = {}
+        self._connect_listeners: list = []
+        self._announcements: set[asyncio.Task] = set()
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop | None = None):
+        """Remembers the server's event loop so worker threads can schedule sends on it."""
+        self.loop = loop or asyncio.get_running_loop()
 
-    def disconnect(self, client_id: str):
-        if client_id in self.active_connections:
-            self.active_connections.pop(client_id)
-            logger.info(f"[WS] Client disconnected: {client_id}")
+    async def start(self):
+        """Binds the loop and subscribes to the progress bus (app startup)."""
+        self.bind_loop()
+        await self.bus.start(self._deliver)
+        self._started = True
+        # Workers already running re-announce their clients
+        await self.publish_control("presence_query", worker=self.worker_id)
 
-    async def send_progress(self, client_id: str, message: str | dict, step: int):
+    async def stop(self):
+        self._started = False
+        await self.bus.stop()
 
-        ws = self.active_connections.get(client_id)
+    def on_control(self, name: str, handler):
+        """handler(event) runs in every worker for each publish_control(name, ...)."""
+        self._control[name] = handler
 
-        if not ws:
-            logger.warning(f"[WS] No active websocket for client {client_id}")
+    def on_client_connected(self, handler):
+        """handler(client_id) runs in every worker whenever a socket of the client connects to any worker."""
+        self._connect_listeners.append(handler)
+
+    def is_connected(self, client_id: str) -> bool:
+        """True if this or any other worker holds a socket of the client."""
+        return bool(self.active_connections.get(client_id) or self.remote_clients.get(client_id))
+
+    def _announce(self, client_id: str, connected: bool):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(self.publish_control(
+            "presence", client_id=client_id, worker=self.worker_id, connected=connected,
+        ))
+        self._announcements.add(task)
+        task.add_done_callback(self._announcements.discard)
+
+    def _on_presence(self, event: dict):
+        client_id = event["client_id"]
+        if event["worker"] != self.worker_id:
+            workers = self.remote_clients.setdefault(client_id, set())
+            if event["connected"]:
+                workers.add(event["worker"])
+            else:
+                workers.discard(event["worker"])
+            if not workers:
+                self.remote_clients.pop(client_id, None)
+        if event["connected"]:
+            for handler in self._connect_listeners:
+                handler(client_id)
+
+    def _on_presence_query(self, event: dict):
+        if event["worker"] != self.worker_id:
+            for client_id in list(self.active_connections):
+                self._announce(client_id, True)
+
+    async def publish_control(self, name: str, **data):
+        event = {"control": name, **data}
+        if not self._started:
+            await self._deliver(event)
             return
+        try:
+            await self.bus.publish(event)
+        except Exception as e:
+            logger.error("[BUS] Publish failed, handling control event locally: %s", e)
+            await self._deliver(event)
+
+    async def connect(self, client_id: str, websocket: WebSocket,
+                      evaluation_id: str | None = None, last_seq: int | None = None):
+        await websocket.accept()
+        if self.loop is None:
+            self.bind_loop()
+        if evaluation_id and last_seq is not None:
+            await self.replay(websocket, evaluation_id, last_seq)
+        # No await since replay's last check: live events start exactly after the replayed ones
+        self.active_connections.setdefault(client_id, set()).add(websocket)
+        logger.info("[WS] Client connected: %s (%d sockets)", client_id, len(self.active_connections[client_id]))
+        # Every connect, not just the first: it resets disconnect timers on all workers
+        self._announce(client_id, True)
+
+    def disconnect(self, client_id: str, websocket: WebSocket | None = None):
+        sockets = self.active_connections.get(client_id)
+        if not sockets:
+            return
+        if websocket is None:
+            sockets.clear()
+        else:
+            sockets.discard(websocket)
+        if not sockets:
+            self.active_connections.pop(client_id, None)
+            self._announce(client_id, False)
+        logger.info("[WS] Client disconnected: %s", client_id)
+
+    def _events_after(self, evaluation_id: str, last_seq: int) -> list[dict]:
+        with self._lock:
+            stream = self.streams.get(evaluation_id)
+            return stream.after(last_seq) if stream else []
+
+    async def replay(self, websocket: WebSocket, evaluation_id: str, last_seq: int):
+        """
+        Sends the buffered events of `evaluation_id` after `last_seq` to one
+        socket, repeating until no event arrived during the sends.
+        """
+        replayed = 0
+        while missed := self._events_after(evaluation_id, last_seq):
+            for payload in missed:
+                if not await self._send(websocket, payload):
+                    return
+                last_seq = payload["seq"]
+                replayed += 1
+        logger.debug("[WS] Replayed %d events of %s", replayed, evaluation_id)
+
+    def _record(self, client_id: str, evaluation_id: str | None, payload: dict) -> dict:
+        if not evaluation_id:
+            return payload
+        with self._lock:
+            stream = self.streams.get(evaluation_id)
+            if stream is None:
+                stream = self.streams[evaluation_id] = _Stream(client_id)
+                while len(self.streams) > WS_MAX_STREAMS:
+                    self.streams.popitem(last=False)
+            else:
+                self.streams.move_to_end(evaluation_id)
+            return stream.append(payload)
+
+    async def _send(self, websocket: WebSocket, payload: dict) -> bool:
+        try:
+            await asyncio.wait_for(websocket.send_json(payload), WS_SEND_TIMEOUT)
+            return True
+        except Exception as e:
+            logger.warning("[WS ERROR] send failed (%s): %s", type(e).__name__, e)
+            return False
+
+    async def _close(self, websocket: WebSocket):
+        """Best-effort close of a dropped socket, so the client sees it go and can reconnect."""
+        try:
+            await asyncio.wait_for(websocket.close(code=1011), WS_SEND_TIMEOUT)
+        except Exception as e:
+            logger.debug("[WS] close failed (%s): %s", type(e).__name__, e)
+
+    async def send_progress(self, client_id: str, message: str | dict, step: int,
+                            evaluation_id: str | None = None, status: str = "processing"):
 
         payload = {
             "message": message,
             "step": step,
-            "status": "processing"
+            "status": status,
         }
+        if evaluation_id:
+            payload["evaluation_id"] = evaluation_id
+        event = {"client_id": client_id, "payload": payload}
 
+        if not self._started:
+            # No bus subscription (scripts, tests): this process is the only receiver
+            await self._deliver(event)
+            return
         try:
-            logger.info(f"[WS SEND] -> {json.dumps(payload)[:200]}")
-            await ws.send_json(payload)
-            logger.info(f"[WS] Sent successfully to {client_id}")
-
+            if evaluation_id:
+                seq = await self.bus.next_seq(evaluation_id)
+                if seq is not None:
+                    payload["seq"] = seq
+            await self.bus.publish(event)
         except Exception as e:
-            logger.error(f"[WS ERROR] sending to {client_id}: {e}")
+            # Progress is best effort; still reach the sockets held by this worker
+            # (if the bus couldn't number the event, its local stream does)
+            logger.error("[BUS] Publish failed, delivering locally: %s", e)
+            await self._deliver(event)
+
+    async def _deliver(self, event: dict):
+        """Bus handler: buffer the event and send it to this worker's sockets of its client."""
+        if "control" in event:
+            handler = self._control.get(event["control"])
+            if handler is not None:
+                handler(event)
+            return
+        client_id, payload = event["client_id"], event["payload"]
+        # Buffered even with no socket attached, so a client connecting late can replay it
+        payload = self._record(client_id, payload.get("evaluation_id"), payload)
+
+        sockets = list(self.active_connections.get(client_id, ()))
+        if not sockets:
+            # Expected for API clients without a socket; one line per event is too much at INFO
+            logger.debug("[WS] No active websocket for client %s", client_id)
+            return
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[WS SEND] %s -> %s", client_id, json.dumps(payload)[:200])
+        results = await asyncio.gather(*(self._send(ws, payload) for ws in sockets))
+        dropped = [ws for ws, ok in zip(sockets, results) if not ok]
+        for ws in dropped:
+            self.disconnect(client_id, ws)
+        if dropped:
+            await asyncio.gather(*(self._close(ws) for ws in dropped))
 
 
 manager = ConnectionManager()
 
+# Set in pipeline worker processes: events go to the API process instead of a local loop
+_emit_sink = None
 
-def safe_emit(client_id: str, message: str | dict, step: int):
+
+def set_emit_sink(sink):
+    """sink(client_id, message, step, evaluation_id) receives every safe_emit in this process."""
+    global _emit_sink
+    _emit_sink = sink
+
+
+def safe_emit(client_id: str, message: str | dict, step: int, evaluation_id: str | None = None):
     """
-    Safe websocket emitter from any thread (CrewAI runs in worker threads)
+    Safe websocket emitter from any thread (CrewAI runs in worker threads).
+    Schedules the send on the server loop captured by bind_loop/connect.
     """
 
-    logger.info(f"[WS EMIT] client={client_id} step={step}")
+    logger.debug("[WS EMIT] client=%s step=%s", client_id, step)
+    if _emit_sink is not None:
+        _emit_sink(client_id, message, step, evaluation_id)
+        return
+    coroutine = manager.send_progress(client_id, message, step, evaluation_id=evaluation_id)
 
     try:
-        loop = asyncio.get_running_loop()
-
-        asyncio.run_coroutine_threadsafe(
-            manager.send_progress(client_id, message, step),
-            loop,
-        )
-
+        running = asyncio.get_running_loop()
     except RuntimeError:
-        # If no running loop, fallback
-        asyncio.run(manager.send_progress(client_id, message, step))
\ No newline at end of file
+        running = None
+
+    if running is not None:
+        # Already on a loop (called from async code): just schedule it
+        running.create_task(coroutine)
+    elif manager.loop is not None and manager.loop.is_running():
+        asyncio.run_coroutine_threadsafe(coroutine, manager.loop)
+    else:
+        # No server loop (scripts, benchmarks without a server): nobody can be connected
+        coroutine.close()